@@ -1,80 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, Request
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, Query
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.auth.api_key import verify_api_key
-from app.auth.rate_limiter import limiter
-from app.models.record_schema import DNSRecordInput
+from app.auth.api_key import require_write, verify_api_key
+from app.auth.rate_limiter import read_limit, write_limit
+from app.models.record_schema import DNSRecordInput, BatchResolveInput, BatchWriteInput
 from app.models.record_db import RecordType
 from app.models.response_schema import GroupedRecordsResponse
-from app.services.resolver import resolve_hostname
+from app.services.resolver import NO_DATA, resolve_hostname_status, resolve_hostnames, resolve_type
 from app.services.bulk_handler import bulk_import,export_dns_records
-from app.storage.db import get_db
-from app.storage.redis import get_cached_hostname,invalidate_cache
+from app.storage.db import get_db, get_read_db
+from app.storage.snapshot import zone_snapshot
 import json
-from app.services.CRUD import validate_hostname,fetch_by_hostname,insert_new_record,delete_record_by_value
-from app.utils.record_utils import (
-    check_for_duplicate_records,
-    has_cname_cycle
-)
-from app.core.errors import ErrorCode, raise_error
+from app.services.CRUD import UnitOfWork, apply_batch, fetch_by_hostname, delete_record_by_value
+from app.utils.hostname_utils import normalize_hostname
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.post("/", dependencies=[Depends(verify_api_key)])
-@limiter.limit("10/minute")
-async def add_dns_record(request: Request, record: DNSRecordInput, db: AsyncSession = Depends(get_db)):
-    hostname = record.hostname.lower()
-    logger.debug(f"Received request to add record for hostname: {hostname}")
-    # Check if the record exists in cache
-    cached_result = await get_cached_hostname(hostname)
-    if cached_result:
-        logger.info(f"Cache hit for {hostname}, returning cached result.")
-        return {"message": "Record added", "hostname": hostname, "cached": True}
-
-    existing_records = await validate_hostname(hostname, db)
-
-    if existing_records:
-        await check_for_duplicate_records(existing_records, record)
-
-    if record.type == RecordType.CNAME.value:
-        logger.info(f"Checking CNAME cycle for {record.hostname}")
-        has_cycle = await has_cname_cycle(record.hostname, record.value.strip('"').lower(), db)
-        if has_cycle:
-            logger.error(f"CNAME loop detected for {record.hostname}")
-            raise_error(ErrorCode.CNAME_LOOP, status_code=400)
-
-    new_record = await insert_new_record(record, db)
-    logger.info(f"New Record inserted {new_record.hostname}")
+@router.post("/", dependencies=[Depends(write_limit), Depends(require_write)])
+async def add_dns_record(record: DNSRecordInput, db: AsyncSession = Depends(get_db)):
+    hostname = normalize_hostname(record.hostname)
+    logger.debug("Received request to add record for hostname: %s", hostname)
+    async with UnitOfWork(db) as uow:
+        await uow.add(record)
+    logger.info("New Record inserted %s", record.hostname)
     return {"message": "Record added", "hostname": hostname}
 
-@router.get("/{hostname}/records", dependencies=[Depends(verify_api_key)],response_model=GroupedRecordsResponse)
-async def list_records_for_hostname(hostname: str, db: AsyncSession = Depends(get_db)):
-    cached_result = await get_cached_hostname(hostname)
-    if cached_result:
-        logger.info(f"Cache hit for {hostname}, returning cached result.")
-        return {"hostname": hostname, "records": cached_result, "cached": True}
-    
-    records = await fetch_by_hostname(db, hostname)
+@router.get("/{hostname}/records", dependencies=[Depends(read_limit), Depends(verify_api_key)],response_model=GroupedRecordsResponse)
+async def list_records_for_hostname(hostname: str, db: AsyncSession = Depends(get_read_db)):
+    if zone_snapshot.ready:
+        records = zone_snapshot.records(normalize_hostname(hostname))
+    else:
+        records = await fetch_by_hostname(db, hostname)
     if not records:
         raise HTTPException(status_code=404, detail="No records found for hostname")
     formatted = {
-        "hostname": hostname.lower(),
+        "hostname": normalize_hostname(hostname),
         "records": []
     }
 
     for record in records:
         value = record.value
-        if isinstance(value, str):
-            try:
-                parsed = json.loads(value)
-                if isinstance(parsed, list) and len(parsed) == 1:
-                    value = parsed[0]
-                else:
-                    value = parsed
-            except json.JSONDecodeError:
-                pass
+        if isinstance(value, list) and len(value) == 1:
+            value = value[0]
 
         formatted["records"].append({
             "type": record.type,
@@ -84,30 +55,56 @@ async def list_records_for_hostname(hostname: str, db: AsyncSession = Depends(ge
     return formatted
 
 
-@router.get("/{hostname}",dependencies=[Depends(verify_api_key)])
-async def resolve_dns(hostname: str, db: AsyncSession = Depends(get_db)):
-    result = await resolve_hostname(hostname, db)
+@router.post("/resolve", dependencies=[Depends(read_limit), Depends(verify_api_key)])
+async def resolve_dns_batch(batch: BatchResolveInput, db: AsyncSession = Depends(get_read_db)):
+    return {"results": await resolve_hostnames(batch.hostnames, db)}
+
+
+@router.get("/{hostname}",dependencies=[Depends(read_limit), Depends(verify_api_key)])
+async def resolve_dns(
+    hostname: str,
+    type: Optional[RecordType] = Query(None, description="Return only records of this type, following CNAMEs"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    if type is None:
+        status, result = await resolve_hostname_status(hostname, db)
+    else:
+        status, result = await resolve_type(hostname, type, db)
+    if status == NO_DATA:
+        raise HTTPException(status_code=404, detail=f"Hostname has no {type.value if type else 'A/AAAA'} records")
     if result is None:
         raise HTTPException(status_code=404, detail="Record not found or expired")
     return result
 
 
-@router.delete("/{hostname}", dependencies=[Depends(verify_api_key)])
+@router.delete("/{hostname}", dependencies=[Depends(write_limit), Depends(require_write)])
 async def delete_dns_record(hostname: str,type: RecordType,value: str,db: AsyncSession = Depends(get_db)
 ):
-    hostname = hostname.lower()
+    hostname = normalize_hostname(hostname)
     value = value.strip('"')  
-    # Invalidate cache before deleting the record
-    await invalidate_cache(hostname)
     response = await delete_record_by_value(hostname, type, value, db)
     return response
 
 
-@router.post("/bulk/import", dependencies=[Depends(verify_api_key)])
+@router.post("/batch", dependencies=[Depends(write_limit), Depends(require_write)])
+async def batch_write(batch: BatchWriteInput, db: AsyncSession = Depends(get_db)):
+    return await apply_batch(batch.operations, db)
+
+
+@router.post("/bulk/import", dependencies=[Depends(write_limit), Depends(require_write)])
 async def bulk_import_handler(file: UploadFile, db: AsyncSession = Depends(get_db)):
     return await bulk_import(file, db)
 
 
-@router.get("/bulk/export",dependencies=[Depends(verify_api_key)], response_model=list)
-async def bulk_export(db: AsyncSession = Depends(get_db)):
-    return await export_dns_records(db)
+@router.get("/bulk/export",dependencies=[Depends(read_limit), Depends(verify_api_key)])
+async def bulk_export(
+    format: Literal["json", "ndjson"] = "json",
+    after: Optional[int] = Query(None, description="Return records with an id greater than this"),
+    limit: Optional[int] = Query(None, ge=1),
+    prefix: Optional[str] = Query(None, description="Only export hostnames starting with this"),
+):
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(
+        export_dns_records(format=format, after_id=after, limit=limit, hostname_prefix=prefix),
+        media_type=media_type,
+    )
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+from app.auth.api_key import verify_api_key
+from app.core.config import settings
+from app.storage.db import engine, read_replicas
+from app.storage.pool import pool_status
+from app.storage.snapshot import zone_snapshot
+
+router = APIRouter()
+
+@router.get("/pool", dependencies=[Depends(verify_api_key)])
+async def database_pool_status():
+    return {
+        **pool_status(engine),
+        "replicas": [
+            {
+                "url": replica.url.render_as_string(),
+                "healthy": replica in read_replicas.healthy,
+                **pool_status(replica),
+            }
+            for replica in read_replicas.replicas
+        ],
+    }
+
+@router.get("/snapshot", dependencies=[Depends(verify_api_key)])
+async def snapshot_status():
+    return {"serving_mode": settings.SERVING_MODE, **zone_snapshot.stats()}
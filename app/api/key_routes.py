@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth.api_key import require_admin
+from app.auth.rate_limiter import read_limit, write_limit
+from app.models.api_key_schema import ApiKeyInput
+from app.services.api_keys import create_api_key, list_api_keys, revoke_api_key
+from app.storage.db import get_db
+
+router = APIRouter()
+
+@router.post("/", dependencies=[Depends(write_limit), Depends(require_admin)])
+async def add_api_key(api_key: ApiKeyInput, db: AsyncSession = Depends(get_db)):
+    return await create_api_key(api_key.name, api_key.scopes, db)
+
+@router.get("/", dependencies=[Depends(read_limit), Depends(require_admin)])
+async def get_api_keys(db: AsyncSession = Depends(get_db)):
+    return {"keys": await list_api_keys(db)}
+
+@router.delete("/{key_id}", dependencies=[Depends(write_limit), Depends(require_admin)])
+async def delete_api_key(key_id: int, db: AsyncSession = Depends(get_db)):
+    return await revoke_api_key(key_id, db)
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from app.core.metrics import render_metrics
+
+router = APIRouter()
+
+# Left unauthenticated for Prometheus scrapers; it exposes timings and counts, no record data
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
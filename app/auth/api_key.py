@@ -1,8 +1,146 @@
-from fastapi import Header, HTTPException, Depends
+import hmac
+import time
+import hashlib
+from collections import OrderedDict
+from fastapi import Header, HTTPException, Request
+from sqlalchemy import select
 from app.core.config import settings
+from app.core.metrics import observe_caller
+from app.models.api_key_db import ApiKey
+from app.storage.db import AsyncSessionLocal
+from app.storage.invalidation import InvalidationBus, default_transport
 
 API_KEY_NAME = "Enter API-Key"
+# Ordered: each scope includes the ones before it, so admin keys can also write and read
+SCOPES = ("read", "write", "admin")
 
-async def verify_api_key(x_api_key: str = Header(...)):
-    if x_api_key != settings.API_KEY:
-        raise HTTPException(status_code=403, detail="Invalid API Key")
+def implied_scopes(scopes) -> frozenset:
+    """Every scope a key holding `scopes` is granted."""
+    rank = max((SCOPES.index(scope) for scope in scopes if scope in SCOPES), default=-1)
+    return frozenset(SCOPES[:rank + 1])
+
+class Caller:
+    __slots__ = ("key_id", "name", "scopes")
+
+    def __init__(self, key_id, name: str, scopes):
+        self.key_id = key_id
+        self.name = name
+        self.scopes = implied_scopes(scopes)
+
+# settings.API_KEY keeps working alongside the database keys, with every scope
+LEGACY_CALLER = Caller(None, "legacy", SCOPES)
+
+def hash_key(key: str) -> str:
+    # Keys are random 256-bit tokens, so a fast unsalted hash is enough and keeps misses cheap
+    return hashlib.sha256(key.encode()).hexdigest()
+
+_legacy_hash = hash_key(settings.API_KEY) if settings.API_KEY else None
+
+class ApiKeyCache:
+    """Key hash -> Caller for recently verified keys, or None for keys that were not found.
+
+    Entries live for `ttl` seconds, so a key revoked on another worker stops working
+    within that time even if its invalidation message is lost. Unknown keys go in a
+    separate, smaller LRU, so a stream of garbage keys cannot push out valid ones."""
+
+    def __init__(self, ttl: float, max_entries: int, max_missing: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_missing = max_missing
+        self._entries = OrderedDict()  # key hash -> (caller, expires_at)
+        self._missing = OrderedDict()  # key hash -> expires_at
+
+    def get(self, key_hash: str):
+        """Returns (found, caller)."""
+        now = time.monotonic()
+        entry = self._entries.get(key_hash)
+        if entry is not None and entry[1] > now:
+            self._entries.move_to_end(key_hash)
+            return True, entry[0]
+        expires_at = self._missing.get(key_hash)
+        if expires_at is not None and expires_at > now:
+            return True, None
+        return False, None
+
+    def put(self, key_hash: str, caller):
+        expires_at = time.monotonic() + self.ttl
+        if caller is None:
+            self._missing.pop(key_hash, None)
+            self._missing[key_hash] = expires_at
+            while len(self._missing) > self.max_missing:
+                self._missing.popitem(last=False)
+        else:
+            self._entries.pop(key_hash, None)
+            self._entries[key_hash] = (caller, expires_at)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key_hashes):
+        for key_hash in key_hashes:
+            self._entries.pop(key_hash, None)
+            self._missing.pop(key_hash, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._missing.clear()
+
+api_key_cache = ApiKeyCache(
+    settings.API_KEY_CACHE_TTL, settings.API_KEY_CACHE_SIZE, settings.API_KEY_NEGATIVE_CACHE_SIZE,
+)
+api_key_bus = InvalidationBus(
+    default_transport(settings.API_KEY_INVALIDATION_CHANNEL),
+    api_key_cache,
+    settings.INVALIDATION_FLUSH_INTERVAL,
+    settings.INVALIDATION_MAX_BATCH,
+)
+
+def cached_caller(key: str):
+    """The Caller for `key` if it is the legacy key or already verified by this worker, else None.
+
+    Never touches the database."""
+    key_hash = hash_key(key)
+    if _legacy_hash is not None and hmac.compare_digest(key_hash, _legacy_hash):
+        return LEGACY_CALLER
+    return api_key_cache.get(key_hash)[1]
+
+async def authenticate(key: str):
+    """The Caller for `key`, or None. Only a cache miss touches the database."""
+    key_hash = hash_key(key)
+    if _legacy_hash is not None and hmac.compare_digest(key_hash, _legacy_hash):
+        return LEGACY_CALLER
+    found, caller = api_key_cache.get(key_hash)
+    if found:
+        return caller
+
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(ApiKey).where(ApiKey.key_hash == key_hash, ApiKey.revoked_at.is_(None))
+        )).scalar_one_or_none()
+    caller = Caller(row.id, row.name, row.scope_list) if row is not None else None
+    api_key_cache.put(key_hash, caller)
+    return caller
+
+async def invalidate_api_keys(key_hashes: list[str]):
+    """Drop keys from this worker's cache and tell the other workers to do the same."""
+    api_key_cache.invalidate(key_hashes)
+    await api_key_bus.publish(key_hashes)
+
+class ApiKeyAuth:
+    """Route dependency that accepts keys holding `scope` and returns the Caller."""
+
+    def __init__(self, scope: str):
+        self.scope = scope
+
+    async def __call__(self, request: Request, x_api_key: str = Header(...)) -> Caller:
+        caller = await authenticate(x_api_key)
+        if caller is None:
+            raise HTTPException(status_code=403, detail="Invalid API Key")
+        if self.scope not in caller.scopes:
+            raise HTTPException(status_code=403, detail=f"API key lacks the {self.scope} scope")
+        request.state.caller = caller
+        observe_caller(caller.name)
+        return caller
+
+verify_api_key = ApiKeyAuth("read")
+require_write = ApiKeyAuth("write")
+require_admin = ApiKeyAuth("admin")
@@ -1,10 +1,152 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+import math
+import time
+import logging
 from fastapi import Request
+from redis.exceptions import RedisError
+from app.auth.api_key import cached_caller
+from app.core.config import settings
+from app.core.metrics import rate_limit_duration, rate_limit_rejections
+from app.storage.redis import take_tokens
 
-# 100 requestsper minute per IP
-limiter = Limiter(key_func=get_remote_address, default_limits=["100/minute"])
+logger = logging.getLogger(__name__)
 
-@limiter.limit
-def exempt_health_check(request: Request):
-    return request.url.path == "/health"
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+class Rate:
+    """A limit like "100/minute": a bucket of `capacity` tokens refilled at `per_second`."""
+
+    __slots__ = ("capacity", "per_second")
+
+    def __init__(self, value: str):
+        count, period = value.split("/")
+        self.capacity = int(count)
+        self.per_second = self.capacity / PERIODS[period.strip().rstrip("s")]
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+
+class LocalBucketStore:
+    """In-process token buckets with the same semantics as the Redis script.
+
+    Limits are per worker, so this is for tests, single-worker runs and as the
+    fallback while Redis is unavailable."""
+
+    def __init__(self, max_buckets: int = 100_000):
+        self.max_buckets = max_buckets
+        self._buckets = {}  # key -> [tokens, updated]
+
+    async def take(self, key: str, rate: Rate, requested: int) -> tuple[int, float]:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_buckets:
+                self._prune(now)
+            bucket = self._buckets[key] = [rate.capacity, now]
+        tokens = min(rate.capacity, bucket[0] + (now - bucket[1]) * rate.per_second)
+        granted = min(requested, int(tokens))
+        bucket[0], bucket[1] = tokens - granted, now
+        return granted, 0.0 if granted else (1 - bucket[0]) / rate.per_second
+
+    def _prune(self, now: float):
+        # Buckets idle for over an hour have refilled under any limit we configure
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if now - bucket[1] < 3600}
+
+class RedisBucketStore:
+    """Token buckets shared by every worker, updated atomically by a Lua script."""
+
+    async def take(self, key: str, rate: Rate, requested: int) -> tuple[int, float]:
+        return await take_tokens(key, rate.capacity, rate.per_second, requested)
+
+class RateLimiter:
+    """Token-bucket limiter with a per-worker pre-budget.
+
+    Rather than one token per request, a worker takes `prebudget` of the bucket's
+    capacity at once and spends it locally for up to `lease_seconds`, so most
+    requests never wait on Redis. A lease that runs out unspent is lost, so a
+    client can come in slightly under its limit, never over it."""
+
+    def __init__(self, store, prebudget: float, lease_seconds: float, fallback=None, max_leases: int = 100_000):
+        self.enabled = settings.RATE_LIMIT_ENABLED
+        self.store = store
+        self.fallback = fallback or LocalBucketStore()
+        self.prebudget = prebudget
+        self.lease_seconds = lease_seconds
+        self.max_leases = max_leases
+        self._leases = {}  # key -> [tokens, expires]
+
+    async def hit(self, key: str, rate: Rate):
+        """Take one token; returns None when allowed, otherwise seconds until a token is available."""
+        now = time.monotonic()
+        lease = self._leases.get(key)
+        if lease is not None and lease[0] > 0 and lease[1] > now:
+            lease[0] -= 1
+            return None
+
+        requested = max(1, int(rate.capacity * self.prebudget))
+        try:
+            granted, retry_after = await self.store.take(key, rate, requested)
+        except RedisError as e:
+            logger.warning("Rate limit store failed, limiting per worker: %s", e)
+            granted, retry_after = await self.fallback.take(key, rate, requested)
+        if not granted:
+            return retry_after
+        if granted > 1:
+            if len(self._leases) >= self.max_leases:
+                self._leases = {k: v for k, v in self._leases.items() if v[1] > now}
+            self._leases[key] = [granted - 1, now + self.lease_seconds]
+        return None
+
+def client_ip(request: Request) -> str:
+    """The caller's address; behind RATE_LIMIT_PROXY_HOPS proxies it is read from X-Forwarded-For."""
+    hops = settings.RATE_LIMIT_PROXY_HOPS
+    if hops:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            addresses = forwarded.split(",")
+            return addresses[-min(hops, len(addresses))].strip()
+    return request.client.host if request.client else "unknown"
+
+def client_key(request: Request) -> str:
+    """The bucket a request is charged to.
+
+    With RATE_LIMIT_KEY=api_key, only keys this worker has already verified get a
+    bucket of their own, named by key id so keys never end up in Redis. Anything
+    else, including unknown keys, is charged to the client IP, so random keys
+    cannot each get a fresh bucket and a free database lookup."""
+    if settings.RATE_LIMIT_KEY == "api_key":
+        api_key = request.headers.get("x-api-key")
+        caller = cached_caller(api_key) if api_key else None
+        if caller is not None:
+            return f"key:{'legacy' if caller.key_id is None else caller.key_id}"
+    return "ip:" + client_ip(request)
+
+limiter = RateLimiter(
+    LocalBucketStore() if settings.RATE_LIMIT_STORAGE == "local" else RedisBucketStore(),
+    settings.RATE_LIMIT_PREBUDGET,
+    settings.RATE_LIMIT_LEASE_SECONDS,
+)
+
+class RateLimit:
+    """Route dependency charging one token from the caller's bucket for `scope`."""
+
+    def __init__(self, scope: str, rate: str):
+        self.scope = scope
+        self.rate = Rate(rate)
+        self._duration = rate_limit_duration.labels(scope) if settings.METRICS_ENABLED else None
+        self._rejections = rate_limit_rejections.labels(scope) if settings.METRICS_ENABLED else None
+
+    async def __call__(self, request: Request):
+        if not limiter.enabled:
+            return
+        started = time.perf_counter()
+        retry_after = await limiter.hit(f"{self.scope}:{client_key(request)}", self.rate)
+        if self._duration is not None:
+            self._duration.observe(time.perf_counter() - started)
+        if retry_after is not None:
+            if self._rejections is not None:
+                self._rejections.inc()
+            raise RateLimitExceeded(math.ceil(retry_after))
+
+read_limit = RateLimit("read", settings.RATE_LIMIT_READ)
+write_limit = RateLimit("write", settings.RATE_LIMIT_WRITE)
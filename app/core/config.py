@@ -2,12 +2,91 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # Legacy shared key with every scope; set it empty once all callers use keys from the api_keys table
     API_KEY: str = "supersecret"
+    API_KEY_CACHE_TTL: float = 30.0
+    API_KEY_CACHE_SIZE: int = 10000
+    API_KEY_NEGATIVE_CACHE_SIZE: int = 1000
+    API_KEY_INVALIDATION_CHANNEL: str = "api_key_invalidations"
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Comma-separated URLs of read replicas used by the read-only routes
+    DATABASE_REPLICA_URLS: str = ""
+    REPLICA_HEALTH_CHECK_INTERVAL: int = 10
+    REPLICA_HEALTH_CHECK_TIMEOUT: float = 2.0
+    # Longest replication delay to allow for: answers read from a replica this soon
+    # after an invalidation are not cached, and invalidations are repeated after it
+    REPLICA_MAX_LAG: float = 2.0
     MAX_CNAME_DEPTH: int = 10
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_STORAGE: str = "redis"  # "redis" or "local" (per worker)
+    RATE_LIMIT_READ: str = "100/minute"
+    RATE_LIMIT_WRITE: str = "10/minute"
+    RATE_LIMIT_KEY: str = "ip"  # "ip" or "api_key"
+    # Number of proxies in front of the app that append to X-Forwarded-For
+    RATE_LIMIT_PROXY_HOPS: int = 0
+    # Share of a bucket a worker takes per Redis call and spends locally for up to RATE_LIMIT_LEASE_SECONDS
+    RATE_LIMIT_PREBUDGET: float = 0.1
+    RATE_LIMIT_LEASE_SECONDS: float = 1.0
     TTL_CLEANUP_INTERVAL: int = 60
+    TTL_PURGE_BATCH_SIZE: int = 1000
+    BULK_IMPORT_CHUNK_SIZE: int = 500
+    EXPORT_BATCH_SIZE: int = 1000
+    DNS_SERVER_ENABLED: bool = False
+    DNS_SERVER_HOST: str = "0.0.0.0"
+    DNS_SERVER_PORT: int = 5353
+    # Zones the DNS server is authoritative for (comma-separated), required when it is
+    # enabled; other names are refused. Negative answers carry the closest zone's SOA,
+    # with ns.<zone> and hostmaster.<zone> unless MNAME/RNAME are set
+    DNS_SOA_ZONE: str = ""
+    DNS_SOA_MNAME: str = ""
+    DNS_SOA_RNAME: str = ""
+    METRICS_ENABLED: bool = True
+    # "database" answers reads from the database; "snapshot" keeps every record in
+    # memory in each worker and follows a change feed ("redis" stream or "local")
+    SERVING_MODE: str = "database"
+    SNAPSHOT_CHANGE_FEED: str = "redis"
+    SNAPSHOT_STREAM: str = "dns_record_changes"
+    SNAPSHOT_STREAM_MAXLEN: int = 100000
+    SNAPSHOT_LOAD_BATCH_SIZE: int = 10000
+    SNAPSHOT_RETRY_INTERVAL: int = 5
+    # Changed hostnames are broadcast to every worker on this channel ("redis" or "local" bus)
+    INVALIDATION_BUS: str = "redis"
+    INVALIDATION_CHANNEL: str = "dns_invalidations"
+    INVALIDATION_FLUSH_INTERVAL: float = 0.25
+    INVALIDATION_MAX_BATCH: int = 5000
+    INVALIDATION_RETRY_INTERVAL: int = 5
     REDIS_URL: str = "redis://localhost:6379"
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 0.5
+    REDIS_CONNECT_TIMEOUT: float = 1.0
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    # Deadline for each cache helper call; past it the caller falls back to the database
+    REDIS_COMMAND_TIMEOUT: float = 0.25
+    REDIS_BREAKER_THRESHOLD: int = 5
+    REDIS_BREAKER_RESET_SECONDS: float = 10.0
+    RESOLUTION_CACHE_SIZE: int = 10000
+    RESOLUTION_CACHE_REDIS: bool = True
+    # How long a "does not exist" or "no address records" answer is cached; 0 disables negative caching
+    NEGATIVE_TTL: int = 60
+    LOG_LEVEL: str = "INFO"
+    # Comma-separated logger=LEVEL overrides, e.g. "app.services.CRUD=DEBUG,sqlalchemy.engine=WARNING"
+    LOG_LEVELS: str = ""
+    # Comma-separated logger=fraction of DEBUG/INFO records to keep, e.g. "app.api.dns_routes=0.1"
+    LOG_SAMPLING: str = ""
+    LOG_FORMAT: str = "text"  # "text" or "json"
+    LOG_FILE: str = "main-app.log"
+    LOG_QUEUE_SIZE: int = 10000
     TESTING: bool = False 
 
+    @property
+    def replica_urls(self) -> list[str]:
+        return [url.strip() for url in self.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+
     class Config:
         env_file = ".env"
 
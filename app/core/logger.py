@@ -1,20 +1,125 @@
+import atexit
+import copy
+import json
 import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from app.core.config import settings
 
-# Setting up logging
-logging.basicConfig(
-    level=logging.DEBUG,  
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("main-app.log"), 
-        logging.StreamHandler()  
-    ]
-)
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
 
-logger = logging.getLogger(__name__)
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the records below WARNING from the configured loggers.
+
+    `rates` maps logger name prefixes to the fraction kept; the longest matching
+    prefix wins and loggers without a match are not sampled."""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._rate_by_logger = {}
+
+    def rate_for(self, name: str) -> float:
+        rate = self._rate_by_logger.get(name)
+        if rate is None:
+            matches = [p for p in self.rates if name == p or name.startswith(p + ".")]
+            rate = self.rates[max(matches, key=len)] if matches else 1.0
+            self._rate_by_logger[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+class DroppingQueueHandler(QueueHandler):
+    """Hands records to the listener thread without ever blocking the caller.
+
+    When the queue is full the record is dropped and counted instead."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the arguments here, since they may change once the caller moves on;
+        # timestamps, tracebacks and the output format are left to the listener thread.
+        # The record is copied so other handlers (e.g. pytest's caplog) see it unchanged.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
-# Checking logging activities:
-logger.debug("This is a debug message")
-logger.info("This is an info message")
-logger.warning("This is a warning message")
-logger.error("This is an error message")
-logger.critical("This is a critical message")
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def parse_mapping(value: str, convert) -> dict:
+    """Parse "name=value,name=value" settings such as LOG_LEVELS and LOG_SAMPLING."""
+    mapping = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, setting = item.partition("=")
+        mapping[name.strip()] = convert(setting.strip())
+    return mapping
+
+def build_formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+def setup_logging() -> QueueListener:
+    """Route all logging through a bounded queue drained by a background thread.
+
+    The event loop only pays for level checks, sampling and merging the message
+    arguments; formatting and the blocking file and stream writes happen on the
+    listener thread."""
+    formatter = build_formatter()
+    handlers = [logging.StreamHandler()]
+    if settings.LOG_FILE:
+        handlers.append(logging.FileHandler(settings.LOG_FILE))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    sampling = parse_mapping(settings.LOG_SAMPLING, float)
+    if sampling:
+        queue_handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name, level in parse_mapping(settings.LOG_LEVELS, str.upper).items():
+        logging.getLogger(name).setLevel(level)
+
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+listener = setup_logging()
+
+logger = logging.getLogger(__name__)
@@ -0,0 +1,213 @@
+import time
+import functools
+from contextvars import ContextVar
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy import event
+from app.core.config import settings
+
+# Everything is registered on our own registry so /metrics only exposes this app
+registry = CollectorRegistry()
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+http_request_duration = Histogram(
+    "dns_http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+db_query_duration = Histogram(
+    "dns_db_query_duration_seconds", "Duration of each database statement",
+    buckets=LATENCY_BUCKETS, registry=registry,
+)
+db_queries_per_request = Histogram(
+    "dns_db_queries_per_request", "Database statements executed per HTTP request",
+    ["route"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100), registry=registry,
+)
+db_seconds_per_request = Histogram(
+    "dns_db_seconds_per_request", "Time spent in the database per HTTP request",
+    ["route"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+redis_command_duration = Histogram(
+    "dns_redis_command_duration_seconds", "Latency of the Redis cache helpers",
+    ["operation"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+redis_lookups = Counter(
+    "dns_redis_lookups_total", "Redis cache lookups by result (hit or miss)",
+    ["operation", "result"], registry=registry,
+)
+redis_errors = Counter(
+    "dns_redis_errors_total", "Redis cache helper calls that raised",
+    ["operation"], registry=registry,
+)
+circuit_open = Gauge(
+    "dns_circuit_open", "1 while the circuit breaker in front of a dependency is open",
+    ["dependency"], registry=registry,
+)
+rate_limit_duration = Histogram(
+    "dns_rate_limit_seconds", "Time spent in the rate limiter per request",
+    ["scope"], buckets=(0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01),
+    registry=registry,
+)
+rate_limit_rejections = Counter(
+    "dns_rate_limit_rejections_total", "Requests rejected by the rate limiter",
+    ["scope"], registry=registry,
+)
+api_key_requests = Counter(
+    "dns_api_key_requests_total", "Authenticated requests by API key name",
+    ["key"], registry=registry,
+)
+resolution_lookups = Counter(
+    "dns_resolution_cache_lookups_total",
+    "Resolution cache lookups by result: hit, negative_hit (a cached NXDOMAIN or NODATA) or miss",
+    ["result"], registry=registry,
+)
+cname_chain_depth = Histogram(
+    "dns_cname_chain_depth", "CNAME hops followed per uncached resolution",
+    ["status"], buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20), registry=registry,
+)
+ttl_purge_runs = Counter("dns_ttl_purge_runs_total", "TTL purge passes", registry=registry)
+ttl_purge_deleted = Counter("dns_ttl_purge_deleted_records_total", "Expired records deleted", registry=registry)
+ttl_purge_batches = Counter("dns_ttl_purge_batches_total", "Delete batches run by the TTL purge", registry=registry)
+ttl_purge_duration = Histogram(
+    "dns_ttl_purge_duration_seconds", "Duration of each TTL purge pass",
+    buckets=LATENCY_BUCKETS, registry=registry,
+)
+
+class RequestStats:
+    __slots__ = ("db_queries", "db_seconds")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+# Set by MetricsMiddleware for the duration of a request; the engine listeners add to it
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+def current_request_stats() -> RequestStats | None:
+    return _request_stats.get()
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each request against its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(token)
+            # The router stores the matched route in the scope; unmatched paths share one
+            # label so arbitrary URLs can't blow up the series count.
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            http_request_duration.labels(scope["method"], route, str(status)).observe(elapsed)
+            db_queries_per_request.labels(route).observe(stats.db_queries)
+            db_seconds_per_request.labels(route).observe(stats.db_seconds)
+
+def instrument_engine(engine):
+    """Time every statement run through `engine` and attribute it to the current request."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_query_duration.observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += elapsed
+
+    # A failed statement never reaches after_cursor_execute
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+def redis_timed(operation: str, lookup: bool = False, batch: bool = False):
+    """Time a Redis helper; with `lookup`, a None result counts as a miss and anything else a hit.
+
+    With `batch` the helper returns a list with one result per key, each counted.
+
+    Applied at import time, so with metrics disabled the helper is left untouched."""
+    def decorator(func):
+        if not settings.METRICS_ENABLED:
+            return func
+
+        duration = redis_command_duration.labels(operation)
+        errors = redis_errors.labels(operation)
+        hits = redis_lookups.labels(operation, "hit")
+        misses = redis_lookups.labels(operation, "miss")
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                duration.observe(time.perf_counter() - started)
+            if lookup and batch:
+                found = sum(value is not None for value in result)
+                hits.inc(found)
+                misses.inc(len(result) - found)
+            elif lookup:
+                (misses if result is None else hits).inc()
+            return result
+        return wrapper
+    return decorator
+
+_lookup_hits = resolution_lookups.labels("hit")
+_lookup_negative_hits = resolution_lookups.labels("negative_hit")
+_lookup_misses = resolution_lookups.labels("miss")
+
+def observe_resolution_lookups(hits: int = 0, negative_hits: int = 0, misses: int = 0):
+    if settings.METRICS_ENABLED:
+        _lookup_hits.inc(hits)
+        _lookup_negative_hits.inc(negative_hits)
+        _lookup_misses.inc(misses)
+
+def observe_caller(key_name: str):
+    if settings.METRICS_ENABLED:
+        api_key_requests.labels(key_name).inc()
+
+def observe_circuit(dependency: str, is_open: bool):
+    if settings.METRICS_ENABLED:
+        circuit_open.labels(dependency).set(1 if is_open else 0)
+
+def observe_chain_depth(depth: int, status: str):
+    if settings.METRICS_ENABLED:
+        cname_chain_depth.labels(status).observe(depth)
+
+def observe_purge(stats):
+    if not settings.METRICS_ENABLED:
+        return
+    ttl_purge_runs.inc()
+    ttl_purge_deleted.inc(stats.deleted)
+    ttl_purge_batches.inc(stats.batches)
+    ttl_purge_duration.observe(stats.duration_seconds)
+
+def render_metrics() -> tuple[bytes, str]:
+    return generate_latest(registry), CONTENT_TYPE_LATEST
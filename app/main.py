@@ -1,29 +1,57 @@
 from fastapi import FastAPI
-from app.auth.rate_limiter import limiter
-from slowapi.middleware import SlowAPIMiddleware
-from slowapi.errors import RateLimitExceeded
+from app.auth.rate_limiter import RateLimitExceeded
 from fastapi.responses import JSONResponse
 from app.services.ttl_cleanup import start_cleanup_task
-from app.api import dns_routes
+from app.services.dns_server import start_dns_server
+from app.core.config import settings
+from app.core.metrics import MetricsMiddleware
+from app.storage.db import init_db, read_replicas
+from app.storage.replicas import start_replica_health_checks
+from app.storage.snapshot import start_snapshot_serving
+from app.storage.invalidation import start_invalidation_listener
+from app.storage.resolution_cache import invalidation_bus
+from app.api import dns_routes, health_routes, key_routes, metrics_routes
+from app.auth.api_key import api_key_bus
 from app.core.logger import *
 import os
 
 app = FastAPI()
 
 # Middleware
-app.state.limiter = limiter
-app.add_middleware(SlowAPIMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+@app.on_event("startup")
+async def apply_migrations():
+    await init_db()
 
 if not os.getenv("TESTING", "0") == "1":
     start_cleanup_task(app)
+
+start_invalidation_listener(app, invalidation_bus)
+start_invalidation_listener(app, api_key_bus)
+
+if read_replicas.replicas:
+    start_replica_health_checks(app, read_replicas)
+
+if settings.SERVING_MODE == "snapshot":
+    start_snapshot_serving(app)
+
+if settings.DNS_SERVER_ENABLED:
+    start_dns_server(app)
     
 # Error handler for rate limit
 @app.exception_handler(RateLimitExceeded)
 async def rate_limit_exceeded_handler(request, exc):
     return JSONResponse(
         status_code=429,
-        content={"detail": "Rate limit exceeded. Try again later."}
+        content={"detail": "Rate limit exceeded. Try again later."},
+        headers={"Retry-After": str(exc.retry_after)},
     )
 
 # Routes
 app.include_router(dns_routes.router, prefix="/api/dns")
+app.include_router(health_routes.router, prefix="/health")
+app.include_router(key_routes.router, prefix="/api/keys")
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_routes.router)
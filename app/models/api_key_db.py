@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, DateTime, Integer
+from datetime import datetime
+from app.models.record_db import Base
+
+class ApiKey(Base):
+    __tablename__ = "api_keys"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, unique=True)
+    # SHA-256 of the key; the key itself is only shown once, when it is created
+    key_hash = Column(String(64), nullable=False, unique=True)
+    key_prefix = Column(String, nullable=False)
+    scopes = Column(String, nullable=False)  # comma-separated, e.g. "read,write"
+    created_at = Column(DateTime, default=datetime.utcnow)
+    revoked_at = Column(DateTime, nullable=True)
+
+    @property
+    def scope_list(self) -> list[str]:
+        return self.scopes.split(",")
@@ -0,0 +1,6 @@
+from pydantic import BaseModel, Field
+from typing import List, Literal
+
+class ApiKeyInput(BaseModel):
+    name: str = Field(min_length=1, max_length=100)
+    scopes: List[Literal["read", "write", "admin"]] = Field(default=["read"], min_length=1)
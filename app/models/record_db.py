@@ -1,7 +1,10 @@
-from sqlalchemy import Column, String, Enum, DateTime, JSON, Integer
+from sqlalchemy import Column, String, Enum, DateTime, JSON, Integer, Index, event
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
-from datetime import datetime
+from datetime import datetime, timedelta
+from app.utils.hostname_utils import normalize_hostname, reverse_labels
 import enum
+import ipaddress
 
 Base = declarative_base()
 
@@ -14,10 +17,58 @@ class RecordType(enum.Enum):
 
 class DNSRecord(Base):
     __tablename__ = "dns_records"
+    __table_args__ = (
+        Index("ix_dns_records_hostname_type", "hostname_normalized", "type"),
+        # One row per A/AAAA address; other types leave address NULL, which never conflicts
+        Index("uq_dns_records_address", "hostname_normalized", "type", "address", unique=True),
+    )
 
     hostname = Column(String, nullable=False)  
+    # Lowercased, trailing-dot-free copy of hostname that all lookups filter on. Byte
+    # ordering on Postgres lets prefix ranges (export ?prefix=) use the hostname index.
+    hostname_normalized = Column(String().with_variant(String(collation="C"), "postgresql"), nullable=False)
+    # hostname_normalized with its labels reversed, for wildcard and subtree lookups. Byte
+    # ordering ("C" collation on Postgres) keeps each subtree a contiguous index range.
+    reversed_name = Column(String().with_variant(String(collation="C"), "postgresql"), nullable=False, index=True)
     type = Column(Enum(RecordType), nullable=False)
-    value = Column(JSON, nullable=False) 
+    # Stored natively: single-address list (A/AAAA, see address), target string (CNAME), {"priority", "host"} (MX), list of strings (TXT)
+    value = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+    # Typed copies of the values lookups compare on, derived from value
+    cname_target = Column(String, nullable=True, index=True)
+    mx_priority = Column(Integer, nullable=True)
+    mx_host = Column(String, nullable=True)
+    address = Column(String, nullable=True)
     timestamp_created = Column(DateTime, default=datetime.utcnow)
     ttl_seconds = Column(Integer, default=3600)
+    expires_at = Column(DateTime, nullable=False, index=True)
     id = Column(Integer, primary_key=True, autoincrement=True) 
+
+# Keep the derived columns in step with hostname/ttl on every ORM write
+@event.listens_for(DNSRecord, "before_insert")
+@event.listens_for(DNSRecord, "before_update")
+def set_derived_columns(mapper, connection, record):
+    if record.timestamp_created is None:
+        record.timestamp_created = datetime.utcnow()
+    if record.ttl_seconds is None:
+        record.ttl_seconds = 3600
+    record.hostname_normalized = normalize_hostname(record.hostname)
+    record.reversed_name = reverse_labels(record.hostname_normalized)
+    record.expires_at = record.timestamp_created + timedelta(seconds=record.ttl_seconds)
+    for column, derived in value_columns(record.type, record.value).items():
+        setattr(record, column, derived)
+
+def value_columns(record_type, value) -> dict:
+    """Typed columns derived from a record's native value."""
+    record_type = RecordType(record_type)
+    return {
+        "cname_target": normalize_hostname(value) if record_type == RecordType.CNAME else None,
+        "mx_priority": int(value["priority"]) if record_type == RecordType.MX else None,
+        "mx_host": normalize_hostname(value["host"]) if record_type == RecordType.MX else None,
+        "address": canonical_address(value[0]) if record_type in (RecordType.A, RecordType.AAAA) else None,
+    }
+
+def canonical_address(value: str) -> str:
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        return value
@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field, IPvAnyAddress, validator
 from typing import List, Union, Literal
 from typing import Annotated
 from app.utils.hostname_utils import validate_hostname_or_raise,validate_non_empty_strings
+from app.models.record_db import RecordType
 
 class MXValue(BaseModel):
     priority: int
@@ -61,4 +62,20 @@ DNSRecordInput = Annotated[
     Field(discriminator="type")
 ]
 
+class BatchResolveInput(BaseModel):
+    hostnames: List[str] = Field(..., min_length=1, max_length=1000)
 
+class BatchAddOperation(BaseModel):
+    action: Literal["add"]
+    record: DNSRecordInput
+
+class BatchDeleteOperation(BaseModel):
+    action: Literal["delete"]
+    hostname: str
+    type: RecordType
+    value: str
+
+class BatchWriteInput(BaseModel):
+    operations: List[
+        Annotated[Union[BatchAddOperation, BatchDeleteOperation], Field(discriminator="action")]
+    ] = Field(..., min_length=1, max_length=1000)
@@ -1,84 +1,219 @@
 from app.models.record_db import DNSRecord
 from app.models.record_schema import DNSRecordInput
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime
-import json
+from datetime import datetime, timedelta
 import logging
-from app.utils.hostname_utils import is_regex_hostname
+from app.utils.hostname_utils import is_regex_hostname, normalize_hostname, reverse_labels
 from app.core.errors import ErrorCode, raise_error
-from sqlalchemy import select
+from sqlalchemy import delete, select
+from fastapi import HTTPException
 from pydantic import BaseModel
-from app.models.record_db import DNSRecord, RecordType
+from app.models.record_db import DNSRecord, RecordType, canonical_address, value_columns
+from app.storage.db import dialect_insert
+from app.storage.resolution_cache import invalidate_resolutions
+from app.utils.record_utils import check_for_duplicate_records, has_cname_cycle
 
 logger = logging.getLogger(__name__)
 
 async def validate_hostname(hostname: str, db):
     if not is_regex_hostname(hostname):
-        logger.error(f"Invalid hostname: {hostname}")
+        logger.error("Invalid hostname: %s", hostname)
         raise_error(ErrorCode.INVALID_HOSTNAME, status_code=400)
 
-    result = await db.execute(select(DNSRecord).where(DNSRecord.hostname == hostname))
+    result = await db.execute(select(DNSRecord).where(DNSRecord.hostname_normalized == normalize_hostname(hostname)))
     existing_records = result.scalars().all()
 
     return existing_records
 
 async def fetch_by_hostname(db: AsyncSession, hostname: str):
-    result = await db.execute(select(DNSRecord).where(DNSRecord.hostname == hostname.lower()))
+    result = await db.execute(select(DNSRecord).where(DNSRecord.hostname_normalized == normalize_hostname(hostname)))
     return result.scalars().all()
 
-async def insert_new_record(record: DNSRecordInput, db):
-    value = (
-        [str(ip) for ip in record.value]
-        if isinstance(record.value, list)
-        else record.value.dict() if isinstance(record.value, BaseModel)
-        else str(record.value)
-    )
-
-    new_record = DNSRecord(
-        hostname=record.hostname,
-        type=record.type,
-        value=json.dumps(value),
-        ttl_seconds=record.ttl_seconds,
-        timestamp_created=datetime.utcnow(),
-    )
-    db.add(new_record)
-    await db.commit()
-    logger.info(f"Record added for {record.hostname}")
-    return new_record
-
-async def delete_record_by_value(hostname: str, type: RecordType, value: str, db):
-    logger.info(f"Attempting to delete record for {hostname} of type {type} with value {value}")
-    result = await db.execute(
-        select(DNSRecord).where(DNSRecord.hostname == hostname, DNSRecord.type == type)
-    )
-    records = result.scalars().all()
-
-    if not records:
-        logger.error(f"No records found for {hostname} with type {type}")
-        raise_error(ErrorCode.RECORD_NOT_FOUND, status_code=404)
+def native_record_value(record):
+    """Value of an input record in the form it is stored in the value column."""
+    if isinstance(record.value, list):
+        return [str(item) for item in record.value]
+    if isinstance(record.value, BaseModel):
+        return record.value.dict()
+    return str(record.value)
 
-    for record in records:
-        record_value = json.loads(record.value) if isinstance(record.value, str) else record.value
-        if type in [RecordType.A, RecordType.AAAA]:
-            if isinstance(record_value, list):
-                if value in record_value:
-                    if len(record_value) == 1:
-                        logger.info(f"Deleting record {hostname} (only value {value})")
-                        await db.delete(record)
-                        await db.commit()
-                        return {"message": f"Record deleted (only value): {value}"}
-                    else:
-                        logger.info(f"Removing value {value} from record for {hostname}")
-                        record_value.remove(value)
-                        record.value = json.dumps(record_value)
-                        await db.commit()
-                        return {"message": f"Value {value} removed from record"}
+def new_record_rows(record) -> list[dict]:
+    """Column values for a new record, including the derived columns, for Core inserts.
+
+    A/AAAA records become one row per distinct address."""
+    created = datetime.utcnow()
+    ttl_seconds = record.ttl_seconds or 3600
+    value = native_record_value(record)
+    record_type = RecordType(record.type)
+    hostname = normalize_hostname(record.hostname)
+    if record_type in (RecordType.A, RecordType.AAAA):
+        values = [[address] for address in dict.fromkeys(value)]
+    else:
+        values = [value]
+    return [
+        {
+            "hostname": record.hostname,
+            "hostname_normalized": hostname,
+            "reversed_name": reverse_labels(hostname),
+            "type": record_type,
+            "value": row_value,
+            "ttl_seconds": ttl_seconds,
+            "timestamp_created": created,
+            "expires_at": created + timedelta(seconds=ttl_seconds),
+            **value_columns(record_type, row_value),
+        }
+        for row_value in values
+    ]
+
+class UnitOfWork:
+    """Stages record writes in the transaction of `db`; the caller decides when to commit.
+
+    Writes are sent to the database as they are staged, so later checks in the same
+    unit see them. Used as `async with`, the unit commits on success and rolls back
+    on any error. Cached resolutions of the touched hostnames are invalidated only
+    after a commit, never for changes that were rolled back."""
+
+    def __init__(self, db):
+        self.db = db
+        self.touched = set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.commit()
         else:
-            if str(record_value).strip('"') == value:
-                logger.info(f"Deleting record for {hostname} with value {value}")
-                await db.delete(record)
-                await db.commit()
+            await self.rollback()
+
+    async def add(self, record: DNSRecordInput) -> list[int]:
+        """Validate a record like the add endpoint does, then stage it."""
+        existing_records = await validate_hostname(record.hostname, self.db)
+        if existing_records:
+            await check_for_duplicate_records(existing_records, record)
+
+        if record.type == RecordType.CNAME.value:
+            if await has_cname_cycle(record.hostname, record.value, self.db):
+                logger.error("CNAME loop detected for %s", record.hostname)
+                raise_error(ErrorCode.CNAME_LOOP, status_code=400)
+
+        return await self.insert(record)
+
+    async def insert(self, record: DNSRecordInput) -> list[int]:
+        """Stage a record and return the new row ids.
+
+        Duplicate addresses are caught by the unique (hostname, type, address) index
+        rather than a read beforehand, so concurrent writers can't both insert one."""
+        rows = new_record_rows(record)
+        result = await self.db.execute(
+            dialect_insert(self.db, DNSRecord.__table__).on_conflict_do_nothing().returning(DNSRecord.id),
+            rows,
+        )
+        ids = result.scalars().all()
+        if len(ids) < len(rows):
+            logger.error("Duplicate record for %s", record.hostname)
+            raise_error(ErrorCode.DUPLICATE_RECORD, status_code=409)
+        self.touched.add(normalize_hostname(record.hostname))
+        return ids
+
+    async def insert_rows(self, rows: list[dict]) -> set[tuple]:
+        """Stage prepared rows in one multi-row INSERT, skipping any that already exist.
+
+        Returns the (hostname_normalized, type, address) of the rows actually inserted;
+        only A/AAAA rows have an address, and only they can be skipped."""
+        if not rows:
+            return set()
+        result = await self.db.execute(
+            dialect_insert(self.db, DNSRecord.__table__)
+            .on_conflict_do_nothing()
+            .returning(DNSRecord.hostname_normalized, DNSRecord.type, DNSRecord.address),
+            rows,
+        )
+        self.touched.update(row["hostname_normalized"] for row in rows)
+        return {tuple(row) for row in result.all()}
+
+    async def delete(self, hostname: str, type: RecordType, value: str) -> dict:
+        logger.debug("Attempting to delete record for %s of type %s with value %s", hostname, type, value)
+        hostname = normalize_hostname(hostname)
+        if type in [RecordType.A, RecordType.AAAA]:
+            # Each address is its own row, so this is one indexed DELETE
+            result = await self.db.execute(
+                delete(DNSRecord)
+                .where(
+                    DNSRecord.hostname_normalized == hostname,
+                    DNSRecord.type == type,
+                    DNSRecord.address == canonical_address(str(value)),
+                )
+                .returning(DNSRecord.id)
+            )
+            if result.first() is None:
+                logger.error("Value %s not found in any record for %s", value, hostname)
+                raise_error(ErrorCode.RECORD_NOT_FOUND, status_code=404)
+            logger.info("Deleted %s %s for %s", type.value, value, hostname)
+            self.touched.add(hostname)
+            return {"message": f"Record deleted for {hostname} with value {value}"}
+
+        result = await self.db.execute(
+            select(DNSRecord).where(DNSRecord.hostname_normalized == hostname, DNSRecord.type == type)
+        )
+        records = result.scalars().all()
+
+        if not records:
+            logger.error("No records found for %s with type %s", hostname, type)
+            raise_error(ErrorCode.RECORD_NOT_FOUND, status_code=404)
+
+        for record in records:
+            matches = (
+                record.cname_target == normalize_hostname(str(value))
+                if type == RecordType.CNAME
+                else str(record.value) == value
+            )
+            if matches:
+                logger.info("Deleting record for %s with value %s", hostname, value)
+                await self.db.delete(record)
+                await self.db.flush()
+                self.touched.add(hostname)
                 return {"message": f"Record deleted for {hostname} with value {value}"}
 
-    logger.error(f"Value {value} not found in any record for {hostname}")
-    raise_error(ErrorCode.RECORD_NOT_FOUND, status_code=404)
\ No newline at end of file
+        logger.error("Value %s not found in any record for %s", value, hostname)
+        raise_error(ErrorCode.RECORD_NOT_FOUND, status_code=404)
+
+    async def commit(self):
+        await self.db.commit()
+        touched, self.touched = self.touched, set()
+        if touched:
+            await invalidate_resolutions(touched)
+
+    async def rollback(self):
+        await self.db.rollback()
+        self.touched = set()
+
+async def insert_new_record(record: DNSRecordInput, db) -> list[int]:
+    """Insert a record in a transaction of its own and return the new row ids."""
+    async with UnitOfWork(db) as uow:
+        ids = await uow.insert(record)
+    logger.info("Record added for %s", record.hostname)
+    return ids
+
+async def delete_record_by_value(hostname: str, type: RecordType, value: str, db) -> dict:
+    async with UnitOfWork(db) as uow:
+        return await uow.delete(hostname, type, value)
+
+async def apply_batch(operations, db) -> dict:
+    """Apply adds and deletes in order in a single transaction.
+
+    The first failing operation rolls back every one before it, and its index is
+    reported with the error."""
+    async with UnitOfWork(db) as uow:
+        for index, operation in enumerate(operations):
+            try:
+                if operation.action == "add":
+                    await uow.add(operation.record)
+                else:
+                    await uow.delete(operation.hostname, operation.type, operation.value)
+            except HTTPException as e:
+                logger.error("Batch operation %s failed, rolling back: %s", index, e.detail)
+                raise HTTPException(status_code=e.status_code, detail={"index": index, "error": e.detail})
+        hostnames = sorted(uow.touched)
+    logger.info("Applied batch of %s operations", len(operations))
+    return {"message": "Batch applied", "operations": len(operations), "hostnames": hostnames}
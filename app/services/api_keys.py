@@ -0,0 +1,51 @@
+import secrets
+import logging
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth.api_key import hash_key, invalidate_api_keys
+from app.models.api_key_db import ApiKey
+
+logger = logging.getLogger(__name__)
+
+def describe(api_key: ApiKey) -> dict:
+    return {
+        "id": api_key.id,
+        "name": api_key.name,
+        "prefix": api_key.key_prefix,
+        "scopes": api_key.scope_list,
+        "created_at": api_key.created_at,
+        "revoked_at": api_key.revoked_at,
+    }
+
+async def create_api_key(name: str, scopes: list[str], db: AsyncSession) -> dict:
+    """Store a new key by its hash; the returned dict is the only place the key itself appears."""
+    key = "dns_" + secrets.token_urlsafe(32)
+    api_key = ApiKey(name=name, key_hash=hash_key(key), key_prefix=key[:8], scopes=",".join(dict.fromkeys(scopes)))
+    db.add(api_key)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="An API key with this name already exists")
+    # Clears a cached "not found" in case the key was presented before it existed
+    await invalidate_api_keys([api_key.key_hash])
+    logger.info("Created API key %s with scopes %s", name, api_key.scopes)
+    return {**describe(api_key), "key": key}
+
+async def list_api_keys(db: AsyncSession) -> list[dict]:
+    result = await db.execute(select(ApiKey).order_by(ApiKey.id))
+    return [describe(api_key) for api_key in result.scalars().all()]
+
+async def revoke_api_key(key_id: int, db: AsyncSession) -> dict:
+    api_key = await db.get(ApiKey, key_id)
+    if api_key is None:
+        raise HTTPException(status_code=404, detail="API key not found")
+    if api_key.revoked_at is None:
+        api_key.revoked_at = datetime.utcnow()
+        await db.commit()
+        await invalidate_api_keys([api_key.key_hash])
+        logger.info("Revoked API key %s", api_key.name)
+    return describe(api_key)
@@ -1,116 +1,277 @@
 from fastapi import HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 import json
 import logging
-from app.models.record_db import DNSRecord, RecordType
+from app.core.config import settings
+from app.models.record_db import DNSRecord, RecordType, canonical_address
 from app.models.record_schema import DNSRecordInput
-from pydantic import ValidationError
-from app.services.CRUD import validate_hostname,insert_new_record,delete_record_by_value
-from app.services.CRUD import validate_hostname,fetch_by_hostname,insert_new_record,delete_record_by_value
-from app.utils.record_utils import (
-    check_for_duplicate_records,
-    has_cname_cycle
-)
+from pydantic import TypeAdapter, ValidationError
+from app.services.CRUD import UnitOfWork, new_record_rows
+from app.services.cname_chain import fetch_cname_chain
+from app.storage.db import read_session
+from app.utils.hostname_utils import is_regex_hostname, normalize_hostname
+from app.utils.json_stream import JSONStreamError, iter_json_records
+from app.utils.record_utils import check_for_duplicate_records
 from app.core.errors import ErrorCode, raise_error
 
 logger = logging.getLogger(__name__)
 
-async def export_dns_records(db: AsyncSession):
-    from sqlalchemy import select
-    result = await db.execute(select(DNSRecord))
-    records = result.scalars().all()
-    return [
-        {
-            "hostname": r.hostname,
-            "type": r.type.value,
-            "value": r.value,
-            "ttl_seconds": r.ttl_seconds,
-            "timestamp_created": r.timestamp_created.isoformat(),
-        }
-        for r in records
-    ]
+EXPORT_COLUMNS = (
+    DNSRecord.id,
+    DNSRecord.hostname,
+    DNSRecord.type,
+    DNSRecord.value,
+    DNSRecord.ttl_seconds,
+    DNSRecord.timestamp_created,
+)
 
-async def bulk_import(file, db):
-    try:
-        # Read and clean file contents
-        contents = await file.read()
-        logger.info(f"Raw file contents: {contents[:200]}...")  # Log first 200 chars
-        cleaned_contents = contents.decode("utf-8").replace("\r\n", "\n").strip()
-        logger.info(f"Cleaned file contents: {cleaned_contents[:500]}...")
+def _export_row(r) -> str:
+    return json.dumps({
+        "id": r.id,
+        "hostname": r.hostname,
+        "type": r.type.value,
+        "value": r.value,
+        "ttl_seconds": r.ttl_seconds,
+        "timestamp_created": r.timestamp_created.isoformat(),
+    })
 
-        # Parse the cleaned contents to get the list of records
-        try:
-            raw_records = json.loads(cleaned_contents)
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {str(e)}")
-            raise HTTPException(status_code=400, detail="Invalid JSON format")
+async def export_dns_records(
+    session_factory=read_session,
+    format: str = "json",
+    after_id: int = None,
+    limit: int = None,
+    hostname_prefix: str = None,
+):
+    """Yield the export as encoded text, one batch of EXPORT_BATCH_SIZE rows at a time.
 
-        if not isinstance(raw_records, list):
-            raise HTTPException(status_code=400, detail="JSON must be a list of DNS records")
+    Rows are read through a server-side cursor in id order, so `after_id` (the last id
+    of the previous page) and `limit` give keyset pagination. The generator opens its
+    own session because a streamed response outlives the request's dependencies."""
+    query = select(*EXPORT_COLUMNS).order_by(DNSRecord.id)
+    if after_id is not None:
+        query = query.where(DNSRecord.id > after_id)
+    # Only lowercased: normalize_hostname would drop a trailing "." ("www." matching
+    # "wwwfoo.com") and IDNA-encode a partial label
+    prefix = hostname_prefix.lower() if hostname_prefix else ""
+    if prefix:
+        # A range rather than LIKE, so the hostname index serves it
+        query = query.where(
+            DNSRecord.hostname_normalized >= prefix,
+            DNSRecord.hostname_normalized < prefix[:-1] + chr(ord(prefix[-1]) + 1),
+        )
+    if limit is not None:
+        query = query.limit(limit)
+    query = query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
 
-        # Initialize counters for success, skipped, and error records
-        success = 0
-        skipped = 0
-        errors = []
+    ndjson = format == "ndjson"
+    first = True
+    if not ndjson:
+        yield "["
+    async with session_factory() as db:
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            lines = [_export_row(r) for r in rows]
+            if ndjson:
+                yield "\n".join(lines) + "\n"
+            else:
+                yield ("" if first else ",") + ",".join(lines)
+            first = False
+    if not ndjson:
+        yield "]"
 
-        # Iterate through each record and process it
-        for idx, item in enumerate(raw_records, start=1):
-            try:
-                logger.info(f"Processing record at index {idx}: {item}")
+record_adapter = TypeAdapter(DNSRecordInput)
+
+async def _load_existing(hostnames: set[str], db) -> dict[str, list]:
+    """One query for every hostname a chunk touches, used for its duplicate checks."""
+    existing = {hostname: [] for hostname in hostnames}
+    if hostnames:
+        result = await db.execute(
+            select(DNSRecord).where(DNSRecord.hostname_normalized.in_(hostnames))
+        )
+        for record in result.scalars().all():
+            existing[record.hostname_normalized].append(record)
+    return existing
 
-                # Validate the hostname - here since json processing must be careful
-                hostname = item.get("hostname").lower()
-                logger.info("Hostname %s",hostname)
-                existing_records = await validate_hostname(hostname, db)
-                logger.info(f"Existing records for {hostname}: {existing_records}")
+async def _creates_cname_cycle(start: str, target: str, staged_cnames: dict[str, str], db) -> bool:
+    # Follow CNAMEs staged in this chunk in memory and the committed ones with one chain query each
+    current = target
+    seen = set()
+    while current not in seen:
+        if current == start:
+            return True
+        seen.add(current)
+        if current in staged_cnames:
+            current = staged_cnames[current]
+            continue
+        chain = await fetch_cname_chain(current, db)
+        if start in chain.names:
+            return True
+        staged = [name for name in chain.names[1:] if name in staged_cnames]
+        if not staged:
+            return False
+        current = staged[0]
+    return False
+
+async def _import_chunk(chunk, db):
+    """Validate a chunk of (index, item) pairs and write it in a single transaction.
+
+    Returns (records_imported, records_skipped, errors) for the chunk."""
+    skipped = 0
+    errors = []
+    pending = []   # (index, rows) waiting for the next multi-row INSERT
+    written = []   # indexes already sent to the database in this transaction
+    staged_cnames = {}
+    uow = UnitOfWork(db)
+
+    hostnames = {
+        normalize_hostname(item["hostname"])
+        for _, item in chunk
+        if isinstance(item, dict) and isinstance(item.get("hostname"), str)
+    }
+
+    async def flush_pending():
+        nonlocal skipped
+        if pending:
+            # The unique address index absorbs duplicates from concurrent writers
+            inserted = await uow.insert_rows([row for _, rows in pending for row in rows])
+            for idx, rows in pending:
+                dropped = [
+                    row["address"] for row in rows
+                    if row["address"] is not None
+                    and (row["hostname_normalized"], row["type"], row["address"]) not in inserted
+                ]
+                if not dropped:
+                    written.append(idx)
+                    continue
+                # An item goes in whole or not at all: take back its addresses that did go in
+                hostname, record_type = rows[0]["hostname_normalized"], rows[0]["type"]
+                kept = [row["address"] for row in rows if row["address"] not in dropped]
+                if kept:
+                    await db.execute(delete(DNSRecord).where(
+                        DNSRecord.hostname_normalized == hostname,
+                        DNSRecord.type == record_type,
+                        DNSRecord.address.in_(kept),
+                    ))
+                    existing[hostname] = [
+                        r for r in existing.get(hostname, []) if r.type != record_type or r.address not in kept
+                    ]
+                errors.append({"index": idx, "error": f"Duplicate address already exists: {', '.join(dropped)}"})
+                skipped += 1
+            pending.clear()
+
+    try:
+        existing = await _load_existing(hostnames, db)
+
+        for idx, item in chunk:
+            try:
+                if not isinstance(item, dict) or not isinstance(item.get("hostname"), str):
+                    raise HTTPException(status_code=400, detail="Each record must be an object with a hostname")
+                hostname = normalize_hostname(item["hostname"])
+                if not is_regex_hostname(hostname):
+                    raise_error(ErrorCode.INVALID_HOSTNAME, status_code=400)
 
                 # Handle delete operation for action delete
                 if item.get("action") == "delete":
                     record_type = item.get("type")
-                    record_value = item.get("value")
                     if record_type not in [e.value for e in RecordType]:
                         raise HTTPException(status_code=400, detail="Invalid record type for delete operation")
-                    result = await delete_record_by_value(hostname, record_type, record_value, db)
+                    record_type = RecordType(record_type)
+                    value = item.get("value")
+                    # Earlier adds in this chunk must be visible to the delete
+                    await flush_pending()
+                    if record_type in (RecordType.A, RecordType.AAAA) and isinstance(value, list):
+                        # Same shape as an add: every address must exist, then each row goes
+                        addresses = [canonical_address(str(address)) for address in value]
+                        present = {r.address for r in existing.get(hostname, []) if r.type == record_type}
+                        if not addresses or not set(addresses) <= present:
+                            raise_error(ErrorCode.RECORD_NOT_FOUND, status_code=404)
+                        for address in dict.fromkeys(addresses):
+                            await uow.delete(hostname, record_type, address)
+                    else:
+                        await uow.delete(hostname, record_type, value)
+                    existing[hostname] = (await _load_existing({hostname}, db))[hostname]
                     skipped += 1
                     continue
-                record = DNSRecord()
-                record.hostname = item.get("hostname")
-                record.type = item.get("type")
-                record.value = item.get("value")
-                record.ttl_seconds = item.get("ttl_seconds")
-                #Same logic as addition
-                existing_records = await validate_hostname(hostname, db)
 
-                if existing_records:
-                    await check_for_duplicate_records(existing_records, record)
+                #Same logic as addition
+                record = record_adapter.validate_python({k: v for k, v in item.items() if k != "action"})
+                if existing.get(hostname):
+                    await check_for_duplicate_records(existing[hostname], record)
 
                 if record.type == RecordType.CNAME.value:
-                    logger.info(f"Checking CNAME cycle for {record.hostname}")
-                    has_cycle = await has_cname_cycle(record.hostname, record.value.strip('"').lower(), db)
-                    if has_cycle:
-                        logger.error(f"CNAME loop detected for {record.hostname}")
+                    target = normalize_hostname(record.value)
+                    if await _creates_cname_cycle(hostname, target, staged_cnames, db):
+                        logger.error("CNAME loop detected for %s", hostname)
                         raise_error(ErrorCode.CNAME_LOOP, status_code=400)
+                    staged_cnames[hostname] = target
 
-                new_record = await insert_new_record(record, db)
-                logger.info(f"New Record inserted {new_record.hostname}")
-                success += 1
+                rows = new_record_rows(record)
+                pending.append((idx, rows))
+                # Later items in the chunk are checked against this one as well
+                existing.setdefault(hostname, []).extend(DNSRecord(**row) for row in rows)
+            except SQLAlchemyError:
+                raise
             except ValidationError as e:
-                logger.error(f"Validation error for record at index {idx}: {e.errors()}")
                 errors.append({"index": idx, "error": f"Validation error: {e.errors()}"})
                 skipped += 1
             except HTTPException as e:
                 errors.append({"index": idx, "error": e.detail})
                 skipped += 1
             except Exception as e:
+                logger.error("Error processing record at index %s: %s", idx, e)
                 errors.append({"index": idx, "error": str(e)})
                 skipped += 1
 
-            except Exception as e:
-                logger.error(f"Error processing record at index {idx}: {e}")
-                errors.append({"index": idx, "error": str(e)})
-                skipped += 1
+        await flush_pending()
+        await uow.commit()
+    except SQLAlchemyError as e:
+        await uow.rollback()
+        logger.error("Bulk import chunk ending at index %d failed: %s", chunk[-1][0], e)
+        failed = written + [idx for idx, _ in pending]
+        errors.extend({"index": idx, "error": f"Database error: {e.__class__.__name__}"} for idx in failed)
+        return 0, skipped + len(failed), errors
+
+    return len(written), skipped, errors
+
+async def bulk_import(file, db):
+    """Import a JSON array or NDJSON upload in chunks of BULK_IMPORT_CHUNK_SIZE records.
+
+    The upload is parsed incrementally and each chunk is validated against one
+    preloaded view of its hostnames and written with one multi-row INSERT."""
+    success = 0
+    skipped = 0
+    errors = []
+    chunk = []
+    last_index = 0
+
+    async def import_chunk():
+        nonlocal success, skipped
+        imported, chunk_skipped, chunk_errors = await _import_chunk(chunk, db)
+        success += imported
+        skipped += chunk_skipped
+        errors.extend(chunk_errors)
+        logger.info("Imported chunk ending at index %s: %s added, %s skipped", chunk[-1][0], imported, chunk_skipped)
+        chunk.clear()
+
+    try:
+        try:
+            async for item in iter_json_records(file):
+                last_index += 1
+                chunk.append((last_index, item))
+                if len(chunk) >= settings.BULK_IMPORT_CHUNK_SIZE:
+                    await import_chunk()
+        except JSONStreamError as e:
+            logger.error("JSON decode error after record %s: %s", last_index, e)
+            if last_index == 0:
+                detail = str(e) if str(e) == "JSON must be a list of DNS records" else "Invalid JSON format"
+                raise HTTPException(status_code=400, detail=detail)
+            # Records before the malformed part are still imported
+            errors.append({"index": last_index + 1, "error": f"Invalid JSON format: {e}"})
 
-        await db.commit()
+        if chunk:
+            await import_chunk()
 
         return {
             "message": "Bulk import completed",
@@ -119,6 +280,8 @@ async def bulk_import(file, db):
             "errors": errors,
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error during bulk import: {str(e)}")
+        logger.error("Error during bulk import: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -0,0 +1,163 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from sqlalchemy import and_, exists, literal, or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.record_db import DNSRecord, RecordType
+from app.utils.hostname_utils import normalize_hostname, reverse_labels
+
+@dataclass
+class CnameChain:
+    names: list[str] = field(default_factory=list)  # start name, then each CNAME target in order
+    loop: bool = False
+    depth_exceeded: bool = False
+
+def cname_edges_cte(start: str, max_depth: int):
+    """WITH RECURSIVE walk of CNAME edges from `start`, stopping after max_depth + 1 hops.
+
+    Loops are bounded by the depth limit and detected in Python from the edges."""
+    target = DNSRecord.cname_target
+    base = select(
+        DNSRecord.hostname_normalized.label("hostname"),
+        target.label("target"),
+        literal(1).label("depth"),
+    ).where(DNSRecord.hostname_normalized == start, DNSRecord.type == RecordType.CNAME)
+    chain = base.cte("cname_chain", recursive=True)
+
+    step = select(
+        DNSRecord.hostname_normalized,
+        target,
+        chain.c.depth + 1,
+    ).join(chain, DNSRecord.hostname_normalized == chain.c.target).where(
+        DNSRecord.type == RecordType.CNAME,
+        chain.c.depth <= max_depth,
+    )
+    return chain.union(step)
+
+def walk_cname_edges(start: str, edges: dict[str, str], max_depth: int) -> CnameChain:
+    chain = CnameChain(names=[start])
+    seen = {start}
+    current = start
+    while current in edges:
+        target = edges[current]
+        if target in seen:
+            chain.loop = True
+            break
+        if len(chain.names) > max_depth:
+            chain.depth_exceeded = True
+            break
+        chain.names.append(target)
+        seen.add(target)
+        current = target
+    return chain
+
+async def fetch_cname_chain(start: str, db: AsyncSession, max_depth: int = None) -> CnameChain:
+    """Follow the CNAME chain starting at `start` in a single query."""
+    max_depth = settings.MAX_CNAME_DEPTH if max_depth is None else max_depth
+    start = normalize_hostname(start)
+    chain = cname_edges_cte(start, max_depth)
+    result = await db.execute(
+        select(chain.c.hostname, chain.c.target).order_by(chain.c.depth)
+    )
+
+    edges = {}
+    for hostname, target in result.all():
+        edges.setdefault(hostname, target)
+    return walk_cname_edges(start, edges, max_depth)
+
+async def fetch_chain_records(
+    start: str, db: AsyncSession, max_depth: int = None, types: list[RecordType] = None,
+) -> dict[str, list[DNSRecord]]:
+    """Load every record of every name reachable from `start` through CNAMEs in a single query.
+
+    With `types`, only records of those types (and the CNAMEs) are loaded."""
+    max_depth = settings.MAX_CNAME_DEPTH if max_depth is None else max_depth
+    start = normalize_hostname(start)
+    chain = cname_edges_cte(start, max_depth)
+    query = select(DNSRecord).where(
+        or_(
+            DNSRecord.hostname_normalized == start,
+            DNSRecord.hostname_normalized.in_(select(chain.c.target)),
+        )
+    )
+    if types is not None:
+        query = query.where(DNSRecord.type.in_({*types, RecordType.CNAME}))
+    result = await db.execute(query.order_by(DNSRecord.id))
+
+    records = {}
+    for record in result.scalars().all():
+        records.setdefault(record.hostname_normalized, []).append(record)
+    return records
+
+async def fetch_name_exists(name: str, db: AsyncSession, now: datetime) -> bool:
+    """Whether `name` has any unexpired record, of any type."""
+    return await db.scalar(select(exists().where(
+        DNSRecord.hostname_normalized == name, DNSRecord.expires_at >= now,
+    )))
+
+def _subtree_exists(name: str):
+    """EXISTS for any record at `name` or below it, as one or two ranges of the reversed-name index."""
+    reversed_name = reverse_labels(name)
+    return exists().where(or_(
+        DNSRecord.reversed_name == reversed_name,
+        and_(DNSRecord.reversed_name > reversed_name + ".", DNSRecord.reversed_name < reversed_name + "/"),
+    ))
+
+def wildcard_levels(hostname: str) -> list[tuple[str, str]]:
+    """(name on the path, its parent) from `hostname` upwards, for the closest-encloser walk."""
+    labels = normalize_hostname(hostname).split(".")
+    return [(".".join(labels[i:]), ".".join(labels[i + 1:])) for i in range(len(labels) - 1)]
+
+def wildcard_candidates(hostname: str) -> list[str]:
+    """Reversed names of every wildcard that could answer for `hostname`."""
+    return [reverse_labels(f"*.{parent}") for _, parent in wildcard_levels(hostname)]
+
+def closest_wildcard(levels, wildcards: dict, occupied) -> list[DNSRecord]:
+    """Records of the first wildcard on the path, unless an occupied name comes before it."""
+    for name, parent in levels:
+        if name in occupied:
+            return []
+        if f"*.{parent}" in wildcards:
+            return wildcards[f"*.{parent}"]
+    return []
+
+async def fetch_wildcard_records(hostname: str, db: AsyncSession) -> list[DNSRecord]:
+    """Records of the wildcard that answers for `hostname` (RFC 4592), in a single query.
+
+    For callers that found no records at `hostname` itself. Only the wildcard directly
+    under the closest existing ancestor (the closest encloser) applies, so a wildcard
+    is skipped when a name between it and `hostname` exists, even with no records of
+    its own. The query fetches every candidate wildcard and, as uncorrelated EXISTS
+    columns, whether each name on the path has anything at or below it."""
+    levels = wildcard_levels(hostname)
+    if not levels:
+        return []
+
+    result = await db.execute(
+        select(DNSRecord, *(_subtree_exists(name).label(f"occupied_{i}") for i, (name, _) in enumerate(levels)))
+        .where(DNSRecord.reversed_name.in_(wildcard_candidates(hostname)))
+        .order_by(DNSRecord.id)
+    )
+    rows = result.all()
+    if not rows:
+        return []
+
+    wildcards = {}
+    for row in rows:
+        wildcards.setdefault(row[0].hostname_normalized, []).append(row[0])
+    occupied = {name for (name, _), is_occupied in zip(levels, rows[0][1:]) if is_occupied}
+    return closest_wildcard(levels, wildcards, occupied)
+
+OCCUPIED_NAMES_PER_QUERY = 200  # below SQLite's limit of 500 terms in a compound SELECT
+
+async def fetch_occupied_names(names, db: AsyncSession) -> set[str]:
+    """Which of `names` have any record at or below them, one UNION ALL per OCCUPIED_NAMES_PER_QUERY names."""
+    names = list(names)
+    occupied = set()
+    for start in range(0, len(names), OCCUPIED_NAMES_PER_QUERY):
+        batch = names[start:start + OCCUPIED_NAMES_PER_QUERY]
+        result = await db.execute(union_all(
+            *(select(literal(i)).where(_subtree_exists(name)) for i, name in enumerate(batch))
+        ))
+        occupied.update(batch[i] for i in result.scalars())
+    return occupied
@@ -0,0 +1,195 @@
+import asyncio
+import ipaddress
+import logging
+import time
+from fastapi import FastAPI
+from app.core.config import settings
+from app.models.record_db import RecordType
+from app.services.resolver import resolve_answers, NO_DATA, RESOLVED
+from app.storage.db import read_session
+from app.utils.hostname_utils import normalize_hostname
+from app.utils.dns_wire import (
+    CLASS_IN, FLAG_QR, MAX_UDP_SIZE, OPCODE_QUERY, UINT16,
+    RCODE_FORMERR, RCODE_NOERROR, RCODE_NOTIMP, RCODE_NXDOMAIN, RCODE_REFUSED, RCODE_SERVFAIL,
+    TYPE_A, TYPE_AAAA, TYPE_CNAME, TYPE_MX, TYPE_SOA, TYPE_TXT,
+    DNSFormatError, Message, ResourceRecord, decode_message, encode_response,
+)
+
+logger = logging.getLogger(__name__)
+
+QTYPE_TO_RECORD_TYPE = {
+    TYPE_A: RecordType.A,
+    TYPE_AAAA: RecordType.AAAA,
+    TYPE_CNAME: RecordType.CNAME,
+    TYPE_MX: RecordType.MX,
+    TYPE_TXT: RecordType.TXT,
+}
+MAX_TCP_SIZE = 65535
+TCP_IDLE_TIMEOUT = 10
+
+SOA_SERIAL = 1
+SOA_REFRESH, SOA_RETRY, SOA_EXPIRE = 3600, 600, 86400
+
+def to_resource_records(owner: str, record_type: RecordType, data, ttl: float) -> list[ResourceRecord]:
+    """Wire records for one cached answer entry (see resolve_answers)."""
+    ttl = max(int(ttl), 0)
+    if record_type in (RecordType.A, RecordType.AAAA):
+        rtype, version = (TYPE_A, 4) if record_type == RecordType.A else (TYPE_AAAA, 6)
+        if ipaddress.ip_address(data).version != version:
+            return []
+        return [ResourceRecord(owner, rtype, ttl, data)]
+    if record_type == RecordType.CNAME:
+        return [ResourceRecord(owner, TYPE_CNAME, ttl, data)]
+    if record_type == RecordType.MX:
+        return [ResourceRecord(owner, TYPE_MX, ttl, (data["priority"], data["host"]))]
+    if record_type == RecordType.TXT:
+        return [ResourceRecord(owner, TYPE_TXT, ttl, data if isinstance(data, list) else [str(data)])]
+    return []
+
+def parse_zones(value: str) -> list[str]:
+    """Zones from a comma-separated setting, longest first so the closest zone wins."""
+    zones = {normalize_hostname(zone) for zone in value.split(",") if zone.strip()}
+    return sorted(zones, key=len, reverse=True)
+
+def zone_for(name: str, zones: list[str]):
+    """The closest of `zones` that `name` is in, or None."""
+    for zone in zones:
+        if name == zone or name.endswith("." + zone):
+            return zone
+    return None
+
+def soa_record(zone: str, ttl: float) -> ResourceRecord:
+    """SOA for the authority section of a negative answer in `zone` (RFC 2308).
+
+    Resolvers cache the negative answer for the smaller of its TTL and minimum."""
+    mname = settings.DNS_SOA_MNAME or f"ns.{zone}"
+    rname = settings.DNS_SOA_RNAME or f"hostmaster.{zone}"
+    ttl = max(min(int(ttl), settings.NEGATIVE_TTL), 0)
+    return ResourceRecord(
+        zone, TYPE_SOA, ttl, (mname, rname, SOA_SERIAL, SOA_REFRESH, SOA_RETRY, SOA_EXPIRE, settings.NEGATIVE_TTL),
+    )
+
+class DNSServer:
+    """Authoritative DNS frontend (UDP with TCP fallback) over the DNSRecord store."""
+
+    def __init__(self, host: str = None, port: int = None, session_factory=read_session, zones: str = None):
+        self.host = host if host is not None else settings.DNS_SERVER_HOST
+        self.port = port if port is not None else settings.DNS_SERVER_PORT
+        # Negative answers are cached against the SOA's zone, so it can't be guessed from the name
+        self.zones = parse_zones(zones if zones is not None else settings.DNS_SOA_ZONE)
+        if not self.zones:
+            raise ValueError("DNS_SOA_ZONE must name the zone(s) the DNS server is authoritative for")
+        self.session_factory = session_factory
+        self.udp_port = None
+        self.tcp_port = None
+        self._udp_transport = None
+        self._tcp_server = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._udp_transport, _ = await loop.create_datagram_endpoint(
+            lambda: _UDPProtocol(self), local_addr=(self.host, self.port)
+        )
+        self.udp_port = self._udp_transport.get_extra_info("sockname")[1]
+        # With port 0 both sockets get their own ephemeral port
+        self._tcp_server = await asyncio.start_server(self._handle_tcp, self.host, self.port or 0)
+        self.tcp_port = self._tcp_server.sockets[0].getsockname()[1]
+        logger.info("DNS server listening on %s udp/%d tcp/%d", self.host, self.udp_port, self.tcp_port)
+
+    async def stop(self):
+        if self._udp_transport is not None:
+            self._udp_transport.close()
+        if self._tcp_server is not None:
+            self._tcp_server.close()
+            await self._tcp_server.wait_closed()
+
+    async def answer(self, data: bytes, max_size: int):
+        try:
+            query = decode_message(data)
+        except DNSFormatError:
+            if len(data) < 2:
+                return None
+            return encode_response(Message(id=UINT16.unpack_from(data)[0], flags=0), data, RCODE_FORMERR)
+
+        if query.flags & FLAG_QR:
+            return None
+        if query.opcode != OPCODE_QUERY:
+            return encode_response(query, data, RCODE_NOTIMP)
+        if len(query.questions) != 1:
+            return encode_response(query, data, RCODE_FORMERR)
+        question = query.questions[0]
+        if question.qclass != CLASS_IN:
+            return encode_response(query, data, RCODE_REFUSED)
+
+        # Hostnames are ASCII (IDNs arrive as punycode), so anything else can't be answered
+        if not question.name.isascii():
+            return encode_response(query, data, RCODE_FORMERR)
+        if zone_for(normalize_hostname(question.name), self.zones) is None:
+            return encode_response(query, data, RCODE_REFUSED)
+
+        try:
+            async with self.session_factory() as db:
+                status, answers, expires_at = await resolve_answers(
+                    question.name, QTYPE_TO_RECORD_TYPE.get(question.qtype), db
+                )
+        except Exception as e:
+            logger.error("DNS lookup failed for %s: %s", question.name, e)
+            return encode_response(query, data, RCODE_SERVFAIL)
+
+        now = time.time()
+        records = [
+            rr for owner, rtype, rdata, record_expires_at in answers
+            for rr in to_resource_records(owner, RecordType(rtype), rdata, record_expires_at - now)
+        ]
+        if status == RESOLVED:
+            return encode_response(query, data, RCODE_NOERROR, records, max_size)
+        # The SOA belongs to the name the CNAMEs, if any, led to; none when that is outside our zones
+        last_name = answers[-1][2] if answers else normalize_hostname(question.name)
+        zone = zone_for(last_name, self.zones)
+        authority = [soa_record(zone, expires_at - now)] if zone is not None else []
+        rcode = RCODE_NOERROR if status == NO_DATA else RCODE_NXDOMAIN
+        return encode_response(query, data, rcode, records, max_size, authority)
+
+    async def _handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                prefix = await asyncio.wait_for(reader.readexactly(2), TCP_IDLE_TIMEOUT)
+                data = await asyncio.wait_for(reader.readexactly(UINT16.unpack(prefix)[0]), TCP_IDLE_TIMEOUT)
+                response = await self.answer(data, MAX_TCP_SIZE)
+                if response:
+                    writer.write(UINT16.pack(len(response)) + response)
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+class _UDPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: DNSServer):
+        self.server = server
+        self.transport = None
+        self._pending = set()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        task = asyncio.ensure_future(self._reply(data, addr))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _reply(self, data: bytes, addr):
+        response = await self.server.answer(data, MAX_UDP_SIZE)
+        if response and not self.transport.is_closing():
+            self.transport.sendto(response, addr)
+
+def start_dns_server(app: FastAPI):
+    server = DNSServer()
+
+    @app.on_event("startup")
+    async def start_server():
+        await server.start()
+
+    @app.on_event("shutdown")
+    async def stop_server():
+        await server.stop()
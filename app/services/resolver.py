@@ -1,55 +1,367 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import or_, select
+from app.core.config import settings
+from app.core.metrics import observe_chain_depth, observe_resolution_lookups
 from app.models.record_db import DNSRecord, RecordType
-from datetime import datetime, timedelta
-import json
+from app.services.cname_chain import (
+    closest_wildcard, fetch_chain_records, fetch_name_exists, fetch_occupied_names, fetch_wildcard_records,
+    wildcard_candidates, wildcard_levels,
+)
+from app.utils.hostname_utils import covering_wildcards, normalize_hostname
+from app.storage.resolution_cache import (
+    cache_resolution, cache_resolutions, fill_generation, get_cached_resolution, get_cached_resolutions,
+)
+from app.storage.snapshot import zone_snapshot
+from datetime import datetime, timezone
+import time
 
-async def resolve_hostname(hostname: str, db: AsyncSession):
-    visited = set()
-    original_hostname = hostname.lower()
-    current = original_hostname
-    cname_chain = []
+RESOLVED = "ok"
+NOT_FOUND = "not_found"
+EXPIRED = "expired"
+NO_DATA = "no_data"
 
-    while True:
-        if current in visited:
-            return None
-        visited.add(current)
+class ChainWalk:
+    """Resolution state of one hostname, advanced one CNAME hop at a time."""
+
+    __slots__ = ("hostname", "current", "visited", "cname_chain", "wildcards", "expiries", "status", "answer", "expires_at")
+
+    def __init__(self, hostname: str):
+        self.hostname = hostname
+        self.current = hostname
+        self.visited = set()
+        self.cname_chain = []
+        self.wildcards = []  # wildcard names that answered for names in the chain
+        self.expiries = []
+        self.status = None
+        self.answer = None
+        self.expires_at = None
+
+    @property
+    def chain(self) -> list[str]:
+        return [self.hostname] + self.cname_chain
 
-        result = await db.execute(
-            select(DNSRecord).where(DNSRecord.hostname == current)
-        )
-        records = result.scalars().all()
-        now = datetime.utcnow()
-        valid_records = [
-            r for r in records
-            if (r.timestamp_created + timedelta(seconds=r.ttl_seconds)) >= now
-        ]
+    @property
+    def dependencies(self) -> list[str]:
+        """Names whose records the answer was built from, for cache invalidation."""
+        return self.chain + self.wildcards
+
+    def step(self, records, now: datetime) -> bool:
+        """Apply the records of `self.current`; returns True once the walk has finished."""
+        if self.current in self.visited or len(self.cname_chain) > settings.MAX_CNAME_DEPTH:
+            self.status = NOT_FOUND
+            return True
+        self.visited.add(self.current)
+
+        valid_records = [r for r in records if r.expires_at >= now]
         if not valid_records:
-            return None
+            self.status = EXPIRED if records else NOT_FOUND
+            return True
 
-        aaaa_records = [
-            json.loads(r.value) if isinstance(r.value, str) else r.value
-            for r in valid_records if r.type in [RecordType.A, RecordType.AAAA]
-        ]
-        flat_ips = [ip for sublist in aaaa_records for ip in sublist]
+        address_records = [r for r in valid_records if r.type in [RecordType.A, RecordType.AAAA]]
+        flat_ips = [r.address for r in address_records]
 
         if flat_ips:
-            return {
-                "hostname": original_hostname,
+            self.status = RESOLVED
+            self.answer = {
+                "hostname": self.hostname,
                 "resolvedIps": flat_ips,
-                "recordType": "CNAME" if cname_chain else "A/AAAA",
-                "pointsTo": cname_chain[-1] if cname_chain else original_hostname
+                "recordType": "CNAME" if self.cname_chain else "A/AAAA",
+                "pointsTo": self.cname_chain[-1] if self.cname_chain else self.hostname
             }
+            self.expires_at = min(self.expiries + [record_expiry(r) for r in address_records])
+            return True
 
         # CNAME chain
         cname_record = next((r for r in valid_records if r.type == RecordType.CNAME), None)
         if cname_record:
-            cname_target = cname_record.value.strip('"').lower()
-            cname_chain.append(cname_target)
-            current = cname_target
+            cname_target = cname_record.cname_target
+            self.cname_chain.append(cname_target)
+            self.current = cname_target
+            self.expiries.append(record_expiry(cname_record))
+            return False
+
+        self.status = NO_DATA
+        return True
+
+    def cache_entry(self):
+        """(result, expires_at, dependencies) to cache once the walk has finished.
+
+        Failures are cached too, as {"status": ...}, for at most NEGATIVE_TTL seconds.
+        A wildcard added above the last name could make it resolve, so those wildcard
+        names are dependencies of a negative answer as well."""
+        if self.status == RESOLVED:
+            return self.answer, self.expires_at, self.dependencies
+        expires_at = min(self.expiries + [time.time() + settings.NEGATIVE_TTL])
+        return {"status": self.status}, expires_at, self.dependencies + covering_wildcards(self.current)
+
+def cached_status(cached) -> tuple:
+    """(status, answer) for a resolution cache entry, which is either an answer or a negative marker."""
+    if "status" in cached:
+        return cached["status"], None
+    return RESOLVED, cached
+
+# In snapshot serving mode (see app.storage.snapshot) records come from memory instead
+# of the database, and answers skip the resolution cache since they are already cheap.
+async def load_chain_records(hostname: str, db: AsyncSession, types: list[RecordType] = None) -> dict:
+    if zone_snapshot.ready:
+        return zone_snapshot.chain_records(hostname)
+    return await fetch_chain_records(hostname, db, types=types)
+
+async def load_wildcard_records(hostname: str, db: AsyncSession) -> list:
+    if zone_snapshot.ready:
+        return zone_snapshot.wildcard_records(hostname)
+    return await fetch_wildcard_records(hostname, db)
+
+async def name_exists(hostname: str, db: AsyncSession, now: datetime) -> bool:
+    if zone_snapshot.ready:
+        return any(r.expires_at >= now for r in zone_snapshot.records(hostname))
+    return await fetch_name_exists(hostname, db, now)
+
+async def resolve_hostname(hostname: str, db: AsyncSession):
+    _, answer = await resolve_hostname_status(hostname, db)
+    return answer
+
+async def resolve_hostname_status(hostname: str, db: AsyncSession):
+    """Returns (status, answer); the answer is None unless the status is RESOLVED."""
+    original_hostname = normalize_hostname(hostname)
+    from_snapshot = zone_snapshot.ready
+    if not from_snapshot:
+        cached = await get_cached_resolution(original_hostname)
+        if cached is None:
+            observe_resolution_lookups(misses=1)
+        else:
+            status, answer = cached_status(cached)
+            observe_resolution_lookups(hits=int(answer is not None), negative_hits=int(answer is None))
+            return status, answer
+
+    generation = fill_generation(db)
+    chain_records = await load_chain_records(original_hostname, db)
+    walk = ChainWalk(original_hostname)
+    now = datetime.utcnow()
+    while True:
+        records = chain_records.get(walk.current)
+        if records is None:
+            records = await wildcard_chain_records(walk.current, chain_records, db)
+            if records:
+                walk.wildcards.append(records[0].hostname_normalized)
+        if walk.step(records, now):
+            break
+    observe_chain_depth(len(walk.cname_chain), walk.status)
+
+    if not from_snapshot:
+        await cache_resolution(original_hostname, *walk.cache_entry(), generation)
+    return walk.status, walk.answer
+
+async def wildcard_chain_records(
+    name: str, chain_records: dict, db: AsyncSession, types: list[RecordType] = None,
+) -> list[DNSRecord]:
+    """Wildcard records for a name that has none of its own, kept in chain_records.
+
+    The chain of a wildcard CNAME's target is loaded as well so the walk can go on."""
+    records = chain_records[name] = await load_wildcard_records(name, db)
+    for record in records:
+        if record.type == RecordType.CNAME and record.cname_target not in chain_records:
+            chain_records.update(await load_chain_records(record.cname_target, db, types))
+    return records
+
+async def resolve_hostnames(hostnames: list[str], db: AsyncSession) -> dict[str, dict]:
+    """Resolve many hostnames together with one query per CNAME depth level (two when
+    wildcards are involved, see fetch_level_records).
+
+    Returns a dict keyed by normalized hostname; each value carries a `status` of
+    "ok" (plus the same fields as resolve_hostname), "not_found", "no_data" or "expired"."""
+    results = {}
+    walks = []
+    from_snapshot = zone_snapshot.ready
+    hostnames = list(dict.fromkeys(normalize_hostname(h) for h in hostnames))
+    cached = {} if from_snapshot else await get_cached_resolutions(hostnames)
+    negative_hits = 0
+    for hostname in hostnames:
+        if hostname in cached:
+            status, answer = cached_status(cached[hostname])
+            results[hostname] = {"status": status, **(answer or {})}
+            negative_hits += answer is None
+        else:
+            walks.append(ChainWalk(hostname))
+    if not from_snapshot:
+        observe_resolution_lookups(len(cached) - negative_hits, negative_hits, len(walks))
+
+    generation = fill_generation(db)
+    now = datetime.utcnow()
+    resolved = []
+    while walks:
+        names = {walk.current for walk in walks}
+        if from_snapshot:
+            records_by_name = {name: records for name in names if (records := zone_snapshot.records(name))}
+            wildcard_records = {
+                name: zone_snapshot.wildcard_records(name) for name in names if name not in records_by_name
+            }
+        else:
+            records_by_name, wildcard_records = await fetch_level_records(names, db)
+
+        unfinished = []
+        for walk in walks:
+            records = records_by_name.get(walk.current)
+            if records is None:
+                # Targets of a wildcard CNAME are picked up by the next level's query
+                records = wildcard_records.get(walk.current, [])
+                if records:
+                    walk.wildcards.append(records[0].hostname_normalized)
+            if not walk.step(records, now):
+                unfinished.append(walk)
+                continue
+            observe_chain_depth(len(walk.cname_chain), walk.status)
+            results[walk.hostname] = {"status": walk.status, **(walk.answer or {})}
+            resolved.append((walk.hostname, *walk.cache_entry()))
+        walks = unfinished
+
+    if resolved and not from_snapshot:
+        await cache_resolutions(resolved, generation)
+    return results
+
+async def fetch_level_records(names: set[str], db: AsyncSession) -> tuple[dict, dict]:
+    """Records of every name in one CNAME depth level, and the wildcard records answering
+    for the names that have none: (records_by_name, wildcard_records).
+
+    Every candidate wildcard comes back with the level's own records, so wildcards
+    cost one more query per level, for whether the names between a miss and its
+    wildcard are occupied, and only when some miss has a wildcard above it."""
+    candidates = {candidate for name in names for candidate in wildcard_candidates(name)}
+    result = await db.execute(
+        select(DNSRecord)
+        .where(or_(DNSRecord.hostname_normalized.in_(names), DNSRecord.reversed_name.in_(candidates)))
+        .order_by(DNSRecord.id)
+    )
+    records_by_name, wildcards = {}, {}
+    for record in result.scalars().all():
+        if record.hostname_normalized in names:
+            records_by_name.setdefault(record.hostname_normalized, []).append(record)
+        if record.reversed_name in candidates:
+            wildcards.setdefault(record.hostname_normalized, []).append(record)
+
+    levels = {name: wildcard_levels(name) for name in names if name not in records_by_name}
+    to_check = set()
+    for name_levels in levels.values():
+        # Only the names below the nearest wildcard decide whether it applies
+        for index, (_, parent) in enumerate(name_levels):
+            if f"*.{parent}" in wildcards:
+                to_check.update(name for name, _ in name_levels[:index + 1])
+                break
+    occupied = await fetch_occupied_names(to_check, db) if to_check else set()
+    wildcard_records = {name: closest_wildcard(name_levels, wildcards, occupied) for name, name_levels in levels.items()}
+    return records_by_name, wildcard_records
+
+async def resolve_records(hostname: str, record_type: RecordType, db: AsyncSession):
+    """Records of `record_type` for hostname, following CNAMEs like resolve_hostname.
+
+    Returns (status, answers) where answers are (owner, record) pairs: the CNAMEs that
+    were followed and the matching records at the end of the chain, in answer order.
+    The owner is the name that was asked for, which differs from the record's own name
+    when a wildcard answered. A record_type of None matches nothing, which reports
+    only whether the name exists."""
+    status, answers, _ = await walk_records(hostname, record_type, db)
+    return status, answers
+
+async def walk_records(hostname: str, record_type: RecordType, db: AsyncSession):
+    """resolve_records, plus the names the result depends on: (status, answers, dependencies).
+
+    Only CNAMEs and records of `record_type` are read, so whether a name without
+    either exists at all is checked separately, and only once the walk reaches it."""
+    hostname = normalize_hostname(hostname)
+    types = [record_type] if record_type is not None else []
+    chain_records = await load_chain_records(hostname, db, types)
+    now = datetime.utcnow()
+    answers = []
+    visited = set()
+    dependencies = []
+    current = hostname
+
+    while True:
+        if current in visited or len(visited) > settings.MAX_CNAME_DEPTH:
+            return NOT_FOUND, answers, dependencies
+        visited.add(current)
+        dependencies.append(current)
+
+        records = chain_records.get(current)
+        if records is None:
+            if await name_exists(current, db, now):
+                return NO_DATA, answers, dependencies
+            records = await wildcard_chain_records(current, chain_records, db, types)
+            if records:
+                dependencies.append(records[0].hostname_normalized)
+            else:
+                return NOT_FOUND, answers, dependencies + covering_wildcards(current)
+        valid_records = [r for r in records if r.expires_at >= now]
+        if not valid_records:
+            if await name_exists(current, db, now):
+                return NO_DATA, answers, dependencies
+            return (EXPIRED if records else NOT_FOUND), answers, dependencies
+
+        matching = [(current, r) for r in valid_records if r.type == record_type]
+        if matching:
+            return RESOLVED, answers + matching, dependencies
+
+        cname_record = next((r for r in valid_records if r.type == RecordType.CNAME), None)
+        if cname_record is None:
+            return NO_DATA, answers, dependencies
+        answers.append((current, cname_record))
+        current = cname_record.cname_target
+
+def record_data(record) -> object:
+    if record.type in (RecordType.A, RecordType.AAAA):
+        return record.address
+    if record.type == RecordType.CNAME:
+        return record.cname_target
+    return record.value
+
+async def resolve_answers(hostname: str, record_type: RecordType, db: AsyncSession):
+    """walk_records through the resolution cache: returns (status, answers, expires_at).
+
+    Answers are [owner, type, data, expires_at] lists, in answer order. The entry is
+    cached under "<hostname>/<type>" until its earliest record expires; a negative
+    one lasts at most NEGATIVE_TTL. A record_type of None is cached under "<hostname>/*"."""
+    hostname = normalize_hostname(hostname)
+    cache_key = f"{hostname}/{record_type.value if record_type else '*'}"
+    from_snapshot = zone_snapshot.ready
+    if not from_snapshot:
+        cached = await get_cached_resolution(cache_key)
+        if cached is None:
+            observe_resolution_lookups(misses=1)
         else:
-            return None
+            resolved = cached["status"] == RESOLVED
+            observe_resolution_lookups(hits=int(resolved), negative_hits=int(not resolved))
+            return cached["status"], cached["answers"], cached["expires_at"]
+
+    generation = fill_generation(db)
+    status, records, dependencies = await walk_records(hostname, record_type, db)
+    answers = [[owner, record.type.value, record_data(record), record_expiry(record)] for owner, record in records]
+    # Every answer record bounds the lifetime: the CNAMEs followed and the records found
+    expiries = [expires_at for *_, expires_at in answers]
+    if status != RESOLVED:
+        expiries.append(time.time() + settings.NEGATIVE_TTL)
+    expires_at = min(expiries)
+    if not from_snapshot:
+        result = {"status": status, "answers": answers, "expires_at": expires_at}
+        await cache_resolution(cache_key, result, expires_at, dependencies, generation)
+    return status, answers, expires_at
+
+async def resolve_type(hostname: str, record_type: RecordType, db: AsyncSession):
+    """Only the `record_type` data for hostname, following CNAMEs: returns (status, answer).
+
+    Shares its cache entries with the DNS frontend, see resolve_answers."""
+    status, answers, _ = await resolve_answers(hostname, record_type, db)
+    if status != RESOLVED:
+        return status, None
+    return status, {
+        "hostname": normalize_hostname(hostname),
+        "type": record_type.value,
+        "values": [data for _, rtype, data, _ in answers if rtype == record_type.value],
+        "pointsTo": answers[-1][0],
+    }
+
+def record_expiry(record: DNSRecord) -> float:
+    """Expiry of a record as a unix timestamp (timestamps are stored as naive UTC)."""
+    return record.expires_at.replace(tzinfo=timezone.utc).timestamp()
 
 def is_expired(record: DNSRecord) -> bool:
-    expiry_time = record.timestamp_created + timedelta(seconds=record.ttl_seconds)
-    return datetime.utcnow() > expiry_time
+    return datetime.utcnow() > record.expires_at
@@ -1,29 +1,79 @@
 from sqlalchemy import delete, select
-from datetime import datetime, timedelta
+from datetime import datetime
+from dataclasses import dataclass, field
 from app.models.record_db import DNSRecord
 from app.storage.db import AsyncSessionLocal
 from app.core.config import settings
+from app.core.metrics import observe_purge
+from app.storage.resolution_cache import invalidate_resolutions
 import asyncio
+import time
 from fastapi import FastAPI
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def purge_expired_records():
-    async with AsyncSessionLocal() as db:
-        result = await db.execute(select(DNSRecord))
-        records = result.scalars().all()
+@dataclass
+class PurgeStats:
+    deleted: int = 0
+    batches: int = 0
+    duration_seconds: float = 0.0
+    hostnames: set[str] = field(default_factory=set)
 
-        for record in records:
-            expiry = record.timestamp_created + timedelta(seconds=record.ttl_seconds)
-            if datetime.utcnow() > expiry:
-                logger.info(f"Deleting expired record: {record.hostname}")
-                await db.execute(delete(DNSRecord).where(DNSRecord.hostname == record.hostname))
-        await db.commit()
+async def purge_expired_records(session_factory=AsyncSessionLocal, batch_size: int = None) -> PurgeStats:
+    """Delete expired rows in bounded batches using the expires_at index.
+
+    Only the expired rows themselves are removed, each batch is committed on its own
+    and the loop yields to the event loop between batches."""
+    batch_size = batch_size or settings.TTL_PURGE_BATCH_SIZE
+    stats = PurgeStats()
+    started = time.perf_counter()
+    cutoff = datetime.utcnow()
+
+    async with session_factory() as db:
+        while True:
+            expired_ids = (
+                select(DNSRecord.id)
+                .where(DNSRecord.expires_at < cutoff)
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                delete(DNSRecord)
+                .where(DNSRecord.id.in_(expired_ids))
+                .returning(DNSRecord.hostname_normalized)
+                .execution_options(synchronize_session=False)
+            )
+            purged = result.scalars().all()
+            await db.commit()
+
+            if not purged:
+                break
+            deleted = len(purged)
+            hostnames = set(purged)
+            stats.batches += 1
+            stats.deleted += deleted
+            stats.hostnames.update(hostnames)
+            await invalidate_resolutions(hostnames)
+            if deleted < batch_size:
+                break
+            await asyncio.sleep(0)
+
+    stats.duration_seconds = time.perf_counter() - started
+    observe_purge(stats)
+    if stats.deleted:
+        logger.info(
+            "Purged %d expired records for %d hostnames in %d batches (%.3fs)",
+            stats.deleted, len(stats.hostnames), stats.batches, stats.duration_seconds,
+        )
+    return stats
 
 async def periodic_cleanup():
     while True:
-        await purge_expired_records()
+        try:
+            await purge_expired_records()
+        except Exception as e:
+            logger.error("TTL purge failed: %s", e)
         await asyncio.sleep(settings.TTL_CLEANUP_INTERVAL)
 
 def start_cleanup_task(app: FastAPI):
@@ -0,0 +1,50 @@
+import time
+import logging
+from redis.exceptions import RedisError
+from app.core.metrics import observe_circuit
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(RedisError):
+    """Raised instead of calling Redis while the breaker is open."""
+
+class CircuitBreaker:
+    """Stops calling a failing dependency after `failure_threshold` consecutive failures.
+
+    While open, a single trial call is let through every `reset_timeout` seconds;
+    the first one to succeed closes the breaker again."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.reset_timeout:
+            return False
+        # Re-arm before the trial so concurrent callers keep failing fast meanwhile
+        self.opened_at = now
+        return True
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("%s circuit closed", self.name)
+            observe_circuit(self.name, False)
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is None and self.failures >= self.failure_threshold:
+            logger.warning("%s circuit opened after %d consecutive failures", self.name, self.failures)
+            observe_circuit(self.name, True)
+            self.opened_at = time.monotonic()
@@ -1,11 +1,29 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.storage.pool import InstrumentedQueuePool
+from app.storage.replicas import ReplicaSet
 from contextlib import asynccontextmanager
 
 DATABASE_URL = settings.DATABASE_URL
 
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+def engine_options(url: str) -> dict:
+    options = {"echo": settings.DB_ECHO, "future": True}
+    # SQLite (tests, local runs) keeps SQLAlchemy's default pool
+    if not url.startswith("sqlite"):
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+    return options
+
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 
 # Create sessionmaker bound to the async engine
 AsyncSessionLocal = sessionmaker(
@@ -14,12 +32,46 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False,
 )
 
+def _read_only(engine):
+    return engine.execution_options(postgresql_readonly=True) if engine.dialect.name == "postgresql" else engine
+
+replica_engines = [
+    create_async_engine(url, **engine_options(url)) for url in settings.replica_urls
+]
+if settings.METRICS_ENABLED:
+    for e in [engine, *replica_engines]:
+        instrument_engine(e)
+
+read_replicas = ReplicaSet(_read_only(engine), [_read_only(e) for e in replica_engines])
+
+# Sessions for read-only routes, bound to a replica (or the primary when none is
+# healthy) when they are opened. Like every session they only check a connection out
+# on their first query, so requests answered from cache never touch the pool, and on
+# Postgres the transaction is opened READ ONLY.
+ReadSessionLocal = sessionmaker(
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autoflush=False,
+)
+
+def read_session() -> AsyncSession:
+    return ReadSessionLocal(bind=read_replicas.choose())
+
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
 
-#Initialize DB 
+async def get_read_db() -> AsyncSession:
+    async with read_session() as session:
+        yield session
+
+def dialect_insert(db: AsyncSession, table):
+    """INSERT for the session's database, which also supports on_conflict_do_nothing()."""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+#Initialize DB: creates missing tables and applies pending schema migrations
 async def init_db():
-    import app.models.record_db 
-    async with engine.begin() as conn:
-        await conn.run_sync(app.models.record_db.Base.metadata.create_all)
+    from app.storage.migrations import run_migrations
+    await run_migrations(engine)
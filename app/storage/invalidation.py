@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import uuid
+from fastapi import FastAPI
+from redis.exceptions import RedisError
+from app.core.config import settings
+from app.storage.redis import publish_invalidation, subscribe_invalidations
+
+logger = logging.getLogger(__name__)
+
+class LocalTransport:
+    """In-process stand-in for the Redis channel; every subscriber gets every message."""
+
+    def __init__(self):
+        self._subscribers = []
+
+    async def publish(self, message: str):
+        for subscriber in self._subscribers:
+            subscriber.put_nowait(message)
+
+    async def subscribe(self):
+        subscriber = asyncio.Queue()
+        self._subscribers.append(subscriber)
+        try:
+            while True:
+                yield await subscriber.get()
+        finally:
+            self._subscribers.remove(subscriber)
+
+class RedisTransport:
+    def __init__(self, channel: str):
+        self.channel = channel
+
+    async def publish(self, message: str):
+        await publish_invalidation(self.channel, message)
+
+    def subscribe(self):
+        return subscribe_invalidations(self.channel)
+
+def default_transport(channel: str):
+    return LocalTransport() if settings.INVALIDATION_BUS == "local" else RedisTransport(channel)
+
+class InvalidationBus:
+    """Broadcasts changed hostnames so every worker can evict them from its in-process `cache`.
+
+    Names are buffered for up to `flush_interval` seconds and sent at most
+    `max_batch` to a message, so a bulk import that commits chunk after chunk
+    publishes a few large messages instead of one per record. Each message carries
+    the sender's id; a worker has already evicted its own writes, so it skips them.
+    Names that could not be sent are kept and sent again every
+    INVALIDATION_RETRY_INTERVAL seconds, since other workers would otherwise serve
+    them from cache until they expire."""
+
+    def __init__(self, transport, cache, flush_interval: float, max_batch: int):
+        self.transport = transport
+        self.cache = cache
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.worker_id = uuid.uuid4().hex
+        self.messages_sent = 0
+        self._pending = set()
+        self._flush_task = None
+
+    async def publish(self, names):
+        self._pending.update(names)
+        if len(self._pending) >= self.max_batch:
+            await self.flush()
+        elif not self._flush_scheduled():
+            self._flush_task = asyncio.create_task(self._flush_later(self.flush_interval))
+
+    def _flush_scheduled(self) -> bool:
+        # A task left behind by an event loop that has since closed will never run
+        task = self._flush_task
+        return (
+            task is not None and not task.done() and task is not asyncio.current_task()
+            and task.get_loop() is asyncio.get_running_loop()
+        )
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    async def flush(self):
+        names, self._pending = sorted(self._pending), set()
+        for start in range(0, len(names), self.max_batch):
+            message = json.dumps({"origin": self.worker_id, "names": names[start:start + self.max_batch]})
+            try:
+                await self.transport.publish(message)
+                self.messages_sent += 1
+            except RedisError as e:
+                unsent = names[start:]
+                logger.warning("Publishing %s invalidations failed, retrying: %s", len(unsent), e)
+                self._pending.update(unsent)
+                if not self._flush_scheduled():
+                    self._flush_task = asyncio.create_task(self._flush_later(settings.INVALIDATION_RETRY_INTERVAL))
+                return
+
+    def receive(self, message: str):
+        data = json.loads(message)
+        if data["origin"] != self.worker_id:
+            self.cache.invalidate(data["names"])
+
+    async def listen(self):
+        """Apply other workers' invalidations until cancelled, resubscribing after errors.
+
+        Messages sent while disconnected are lost, so everything is evicted on reconnect."""
+        while True:
+            try:
+                async for message in self.transport.subscribe():
+                    self.receive(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Invalidation subscription failed: %s", e)
+                await asyncio.sleep(settings.INVALIDATION_RETRY_INTERVAL)
+                self.cache.clear()
+
+def start_invalidation_listener(app: FastAPI, bus: InvalidationBus):
+    tasks = []
+
+    @app.on_event("startup")
+    async def start_task():
+        tasks.append(asyncio.create_task(bus.listen()))
+
+    @app.on_event("shutdown")
+    async def stop_task():
+        for task in tasks:
+            task.cancel()
+        await bus.flush()
@@ -0,0 +1,269 @@
+import asyncio
+import logging
+from sqlalchemy import bindparam, insert, inspect, select, text, update
+from sqlalchemy.dialects.postgresql import JSONB
+from app.models.record_db import Base, DNSRecord, RecordType, canonical_address
+from app.models.api_key_db import ApiKey  # noqa: F401 - registers the table for create_all
+from app.utils.hostname_utils import normalize_hostname, reverse_labels
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 50000
+# Postgres advisory lock key shared by every process that runs migrations
+MIGRATION_LOCK_ID = 7_306_099
+
+# Each migration is idempotent, so it is also safe on a database whose tables were
+# just created from the current models, or on one where a run stopped partway.
+# Backfills commit after every batch, so locks are only held for one batch.
+def _add_column(conn, table: str, column: str, ddl_type: str):
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+def _create_indexes(conn, *names: str):
+    for index in DNSRecord.__table__.indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+def _expiry_sql(dialect: str) -> str:
+    if dialect == "sqlite":
+        return "datetime(timestamp_created, '+' || ttl_seconds || ' seconds')"
+    return "timestamp_created + ttl_seconds * interval '1 second'"
+
+def _index_dns_records(conn):
+    _add_column(conn, "dns_records", "hostname_normalized", "VARCHAR")
+    _add_column(conn, "dns_records", "expires_at", "TIMESTAMP")
+
+    dialect = conn.dialect.name
+    conn.execute(text(
+        "UPDATE dns_records SET timestamp_created = CURRENT_TIMESTAMP WHERE timestamp_created IS NULL"
+    ))
+    conn.execute(text("UPDATE dns_records SET ttl_seconds = 3600 WHERE ttl_seconds IS NULL"))
+
+    # Backfill in id ranges so no single statement rewrites the whole table. Names go
+    # through normalize_hostname, like every ORM write, so lookups find the old rows.
+    records = DNSRecord.__table__
+    max_id = conn.execute(text("SELECT max(id) FROM dns_records")).scalar() or 0
+    for low in range(0, max_id, BACKFILL_BATCH_SIZE):
+        bounds = {"low": low, "high": low + BACKFILL_BATCH_SIZE}
+        conn.execute(
+            text(f"UPDATE dns_records SET expires_at = {_expiry_sql(dialect)} WHERE id > :low AND id <= :high"),
+            bounds,
+        )
+        rows = conn.execute(
+            select(records.c.id, records.c.hostname).where(records.c.id > low, records.c.id <= bounds["high"])
+        ).all()
+        if rows:
+            conn.execute(
+                update(records).where(records.c.id == bindparam("row_id"))
+                .values(hostname_normalized=bindparam("normalized")),
+                [{"row_id": row.id, "normalized": normalize_hostname(row.hostname)} for row in rows],
+            )
+        conn.commit()
+        logger.info("Backfilled dns_records up to id %d of %d", low + BACKFILL_BATCH_SIZE, max_id)
+
+    if dialect != "sqlite":
+        conn.execute(text("ALTER TABLE dns_records ALTER COLUMN hostname_normalized SET NOT NULL"))
+        conn.execute(text("ALTER TABLE dns_records ALTER COLUMN expires_at SET NOT NULL"))
+
+    _create_indexes(conn, "ix_dns_records_hostname_type", "ix_dns_records_expires_at")
+
+def _typed_value_columns(record_type, value) -> dict:
+    """cname_target/mx_priority/mx_host for a legacy value; shapes the API never accepted are left empty."""
+    if record_type == RecordType.CNAME and isinstance(value, str):
+        return {"cname_target": normalize_hostname(value), "mx_priority": None, "mx_host": None}
+    if record_type == RecordType.MX and isinstance(value, dict) and "host" in value:
+        try:
+            priority = int(value.get("priority"))
+        except (TypeError, ValueError):
+            priority = None
+        return {"cname_target": None, "mx_priority": priority, "mx_host": normalize_hostname(str(value["host"]))}
+    return {"cname_target": None, "mx_priority": None, "mx_host": None}
+
+def _native_record_values(conn):
+    """Unwrap values that were stored as JSON-encoded strings and fill the typed value columns."""
+    _add_column(conn, "dns_records", "cname_target", "VARCHAR")
+    _add_column(conn, "dns_records", "mx_priority", "INTEGER")
+    _add_column(conn, "dns_records", "mx_host", "VARCHAR")
+
+    dialect = conn.dialect.name
+    value_type = next(c["type"] for c in inspect(conn).get_columns("dns_records") if c["name"] == "value")
+    if dialect == "postgresql" and not isinstance(value_type, JSONB):
+        # The column type change rewrites the table once, unwrapping each string on the way
+        conn.execute(text(
+            "ALTER TABLE dns_records ALTER COLUMN value TYPE JSONB USING "
+            "CASE WHEN json_typeof(value::json) = 'string' THEN (value::json #>> '{}')::jsonb "
+            "ELSE value::jsonb END"
+        ))
+        conn.commit()
+
+    records = DNSRecord.__table__
+    max_id = conn.execute(text("SELECT max(id) FROM dns_records")).scalar() or 0
+    for low in range(0, max_id, BACKFILL_BATCH_SIZE):
+        bounds = {"low": low, "high": low + BACKFILL_BATCH_SIZE}
+        if dialect == "sqlite":
+            conn.execute(
+                text(
+                    "UPDATE dns_records SET value = json_extract(value, '$') "
+                    "WHERE json_type(value) = 'text' AND json_valid(json_extract(value, '$')) "
+                    "AND id > :low AND id <= :high"
+                ),
+                bounds,
+            )
+        rows = conn.execute(
+            select(records.c.id, records.c.type, records.c.value).where(
+                records.c.type.in_([RecordType.CNAME, RecordType.MX]),
+                records.c.id > low,
+                records.c.id <= bounds["high"],
+            )
+        ).all()
+        if rows:
+            conn.execute(
+                update(records).where(records.c.id == bindparam("row_id")).values(
+                    cname_target=bindparam("cname_target"),
+                    mx_priority=bindparam("mx_priority"),
+                    mx_host=bindparam("mx_host"),
+                ),
+                [{"row_id": row.id, **_typed_value_columns(row.type, row.value)} for row in rows],
+            )
+        conn.commit()
+        logger.info("Converted dns_records values up to id %d of %d", low + BACKFILL_BATCH_SIZE, max_id)
+
+    _create_indexes(conn, "ix_dns_records_cname_target")
+
+def _split_address_rows(conn):
+    """Give every A/AAAA address its own row, then enforce uniqueness per (hostname, type, address)."""
+    _add_column(conn, "dns_records", "address", "VARCHAR")
+    records = DNSRecord.__table__
+
+    max_id = conn.execute(text("SELECT max(id) FROM dns_records")).scalar() or 0
+    for low in range(0, max_id, BACKFILL_BATCH_SIZE):
+        rows = conn.execute(
+            select(
+                records.c.id, records.c.hostname, records.c.hostname_normalized, records.c.type,
+                records.c.value, records.c.timestamp_created, records.c.ttl_seconds, records.c.expires_at,
+            ).where(
+                records.c.type.in_([RecordType.A, RecordType.AAAA]),
+                records.c.id > low,
+                records.c.id <= low + BACKFILL_BATCH_SIZE,
+            )
+        ).all()
+        extra_rows = []
+        for row in rows:
+            addresses = row.value if isinstance(row.value, list) else [row.value]
+            addresses = list(dict.fromkeys(canonical_address(str(a)) for a in addresses)) or [""]
+            conn.execute(
+                update(records).where(records.c.id == row.id).values(value=[addresses[0]], address=addresses[0])
+            )
+            extra_rows.extend(
+                {
+                    "hostname": row.hostname,
+                    "hostname_normalized": row.hostname_normalized,
+                    "type": row.type,
+                    "value": [address],
+                    "address": address,
+                    "timestamp_created": row.timestamp_created,
+                    "ttl_seconds": row.ttl_seconds,
+                    "expires_at": row.expires_at,
+                }
+                for address in addresses[1:]
+            )
+        if extra_rows:
+            conn.execute(insert(records), extra_rows)
+        conn.commit()
+        logger.info("Split address rows up to id %d of %d", low + BACKFILL_BATCH_SIZE, max_id)
+
+    # Keep the oldest row of any address that was stored more than once
+    conn.execute(text(
+        "DELETE FROM dns_records WHERE address IS NOT NULL AND id NOT IN ("
+        "SELECT min(id) FROM dns_records WHERE address IS NOT NULL "
+        "GROUP BY hostname_normalized, type, address)"
+    ))
+    _create_indexes(conn, "uq_dns_records_address")
+
+def _reversed_names(conn):
+    """Fill reversed_name, the label-reversed hostname that wildcard lookups range-scan."""
+    dialect = conn.dialect.name
+    _add_column(conn, "dns_records", "reversed_name", 'VARCHAR COLLATE "C"' if dialect == "postgresql" else "VARCHAR")
+    records = DNSRecord.__table__
+
+    max_id = conn.execute(text("SELECT max(id) FROM dns_records")).scalar() or 0
+    for low in range(0, max_id, BACKFILL_BATCH_SIZE):
+        rows = conn.execute(
+            select(records.c.id, records.c.hostname_normalized).where(
+                records.c.reversed_name.is_(None),
+                records.c.id > low,
+                records.c.id <= low + BACKFILL_BATCH_SIZE,
+            )
+        ).all()
+        if rows:
+            conn.execute(
+                update(records).where(records.c.id == bindparam("row_id")).values(reversed_name=bindparam("reversed")),
+                [{"row_id": row.id, "reversed": reverse_labels(row.hostname_normalized)} for row in rows],
+            )
+        conn.commit()
+        logger.info("Backfilled reversed names up to id %d of %d", low + BACKFILL_BATCH_SIZE, max_id)
+
+    if dialect != "sqlite":
+        conn.execute(text("ALTER TABLE dns_records ALTER COLUMN reversed_name SET NOT NULL"))
+    _create_indexes(conn, "ix_dns_records_reversed_name")
+
+def _hostname_byte_order(conn):
+    """Give hostname_normalized the "C" collation so prefix ranges are index ranges."""
+    if conn.dialect.name == "postgresql":
+        # Rebuilds the hostname indexes once; equality lookups are unaffected
+        conn.execute(text('ALTER TABLE dns_records ALTER COLUMN hostname_normalized TYPE VARCHAR COLLATE "C"'))
+
+MIGRATIONS = [
+    (1, "index_dns_records", _index_dns_records),
+    (2, "native_record_values", _native_record_values),
+    (3, "split_address_rows", _split_address_rows),
+    (4, "reversed_names", _reversed_names),
+    (5, "hostname_byte_order", _hostname_byte_order),
+]
+
+def _apply_migrations(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+        "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    ))
+    applied = set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+    Base.metadata.create_all(conn)
+    conn.commit()
+
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info("Applying migration %d: %s", version, name)
+        migrate(conn)
+        conn.execute(
+            text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+            {"version": version, "name": name},
+        )
+        conn.commit()
+
+def _apply_migrations_locked(conn):
+    """Apply pending migrations, one worker at a time.
+
+    Workers that boot together wait on a session-level advisory lock, then find the
+    migrations applied. SQLite serializes writers on its own, so it takes no lock."""
+    if conn.dialect.name != "postgresql":
+        return _apply_migrations(conn)
+    conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+    conn.commit()
+    try:
+        _apply_migrations(conn)
+    finally:
+        # A failed migration leaves its transaction aborted; the lock outlives the rollback
+        conn.rollback()
+        conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+        conn.commit()
+
+async def run_migrations(engine):
+    async with engine.connect() as conn:
+        await conn.run_sync(_apply_migrations_locked)
+
+if __name__ == "__main__":
+    from app.storage.db import engine
+    asyncio.run(run_migrations(engine))
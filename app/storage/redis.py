@@ -1,16 +1,190 @@
+import json
+import asyncio
+import functools
 import redis.asyncio as redis
+from redis.exceptions import ConnectionError, TimeoutError as RedisTimeoutError
 from app.core.config import settings
+from app.core.metrics import redis_timed
+from app.storage.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.loop_local import LoopLocal
 
-redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+def _new_client():
+    return redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(
+        settings.REDIS_URL,
+        decode_responses=True,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    ))
 
-async def cache_resolved_hostname(hostname: str, ips: list[str], ttl: int = 3600):
-    await redis_client.setex(f"dns_cache:{hostname}", ttl, ",".join(ips))
+# Connections belong to the event loop that opened them, so each loop gets its own
+# client and pool. Setting redis_client pins one client instead (tests).
+_clients = LoopLocal(_new_client)
+redis_client = None
 
-async def get_cached_hostname(hostname: str):
-    result = await redis_client.get(f"dns_cache:{hostname}")
-    if result:
-        return result.split(",")
-    return None
+def get_client() -> redis.Redis:
+    return redis_client if redis_client is not None else _clients.get()
 
-async def invalidate_cache(hostname: str):
-    await redis_client.delete(f"dns_cache:{hostname}")
+redis_breaker = CircuitBreaker("redis", settings.REDIS_BREAKER_THRESHOLD, settings.REDIS_BREAKER_RESET_SECONDS)
+
+def guarded(func):
+    """Bound a cache helper by REDIS_COMMAND_TIMEOUT and fail fast while the breaker is open.
+
+    Both surface as RedisError, which callers already treat as a cache miss."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not redis_breaker.allow():
+            raise CircuitOpenError("Redis circuit breaker is open")
+        try:
+            async with asyncio.timeout(settings.REDIS_COMMAND_TIMEOUT):
+                result = await func(*args, **kwargs)
+        except TimeoutError as e:
+            redis_breaker.record_failure()
+            raise RedisTimeoutError(f"{func.__name__} timed out") from e
+        except (ConnectionError, RedisTimeoutError):
+            redis_breaker.record_failure()
+            raise
+        redis_breaker.record_success()
+        return result
+    return wrapper
+
+def encode_value(value) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+def decode_value(raw: str):
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+# Resolution entries are a positional array tagged with a format version, with the
+# expiry in milliseconds. Anything else, such as entries from an older format, reads as a miss.
+RESOLUTION_FORMAT = 1
+
+def encode_resolution(entry: dict) -> str:
+    return encode_value([RESOLUTION_FORMAT, int(entry["expires_at"] * 1000), entry["chain"], entry["result"]])
+
+def decode_resolution(raw: str):
+    data = decode_value(raw) if raw else None
+    if not isinstance(data, list) or len(data) != 4 or data[0] != RESOLUTION_FORMAT:
+        return None
+    _, expires_at, chain, result = data
+    return {"result": result, "expires_at": expires_at / 1000, "chain": chain}
+
+# Resolution results are kept under their own prefix; each name in a chain gets a
+# set of the cached hostnames that pass through it so writes can evict them all.
+def _queue_resolution(pipe, hostname: str, entry: dict, ttl: int):
+    pipe.setex(f"dns_resolve:{hostname}", ttl, encode_resolution(entry))
+    for name in entry["chain"]:
+        deps_key = f"dns_resolve_deps:{name}"
+        pipe.sadd(deps_key, hostname)
+        pipe.expire(deps_key, ttl, nx=True)
+        pipe.expire(deps_key, ttl, gt=True)
+
+@redis_timed("cache_resolution")
+@guarded
+async def cache_resolution_entry(hostname: str, entry: dict, ttl: int):
+    async with get_client().pipeline(transaction=False) as pipe:
+        _queue_resolution(pipe, hostname, entry, ttl)
+        await pipe.execute()
+
+@redis_timed("cache_resolutions")
+@guarded
+async def cache_resolution_entries(entries: list[tuple[str, dict, int]]):
+    """Store many (hostname, entry, ttl) resolutions in one round trip."""
+    async with get_client().pipeline(transaction=False) as pipe:
+        for hostname, entry, ttl in entries:
+            _queue_resolution(pipe, hostname, entry, ttl)
+        await pipe.execute()
+
+@redis_timed("get_resolutions", lookup=True, batch=True)
+@guarded
+async def get_cached_resolution_entries(hostnames: list[str]) -> list:
+    if not hostnames:
+        return []
+    results = await get_client().mget([f"dns_resolve:{hostname}" for hostname in hostnames])
+    return [decode_resolution(result) for result in results]
+
+@redis_timed("invalidate_resolutions")
+@guarded
+async def invalidate_resolution_chains(names: set[str]):
+    deps_keys = [f"dns_resolve_deps:{name}" for name in names]
+    async with get_client().pipeline(transaction=False) as pipe:
+        for key in deps_keys:
+            pipe.smembers(key)
+        dependents = await pipe.execute()
+
+    hostnames = set(names).union(*dependents)
+    await get_client().delete(*[f"dns_resolve:{h}" for h in hostnames], *deps_keys)
+
+# Token buckets for the rate limiter. The bucket is refilled from the time elapsed
+# since its last update (by the Redis clock, so workers' clocks don't matter) and up
+# to `requested` whole tokens are taken. Returns [granted, seconds until the next token].
+TAKE_TOKENS_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+if granted > 0 then
+    return {granted, '0'}
+end
+return {0, tostring((1 - tokens) / rate)}
+"""
+
+@redis_timed("take_tokens")
+@guarded
+async def take_tokens(key: str, capacity: int, rate: float, requested: int) -> tuple[int, float]:
+    granted, retry_after = await get_client().register_script(TAKE_TOKENS_SCRIPT)(
+        keys=[f"rate_limit:{key}"], args=[capacity, rate, requested]
+    )
+    return int(granted), float(retry_after)
+
+# Record change feed for snapshot serving: one stream entry per committed write,
+# listing the hostnames whose records changed.
+@redis_timed("publish_changes")
+@guarded
+async def publish_record_changes(stream: str, names: list[str], maxlen: int):
+    await get_client().xadd(stream, {"names": json.dumps(names)}, maxlen=maxlen, approximate=True)
+
+async def record_changes_position(stream: str) -> str:
+    entries = await get_client().xrevrange(stream, count=1)
+    return entries[0][0] if entries else "0-0"
+
+async def read_record_changes(stream: str, position: str, block_ms: int, count: int = 1000):
+    """Entries after `position`, waiting up to block_ms for one; returns (position, [names, ...])."""
+    response = await get_client().xread({stream: position}, block=block_ms, count=count)
+    batches = []
+    for _, entries in response:
+        for entry_id, fields in entries:
+            position = entry_id
+            batches.append(json.loads(fields["names"]))
+    return position, batches
+
+# Invalidation bus: fire-and-forget broadcast of changed hostnames to every worker
+@redis_timed("publish_invalidation")
+@guarded
+async def publish_invalidation(channel: str, message: str):
+    await get_client().publish(channel, message)
+
+async def subscribe_invalidations(channel: str):
+    pubsub = get_client().pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(channel)
+    try:
+        # Polled with a timeout so an idle channel doesn't trip REDIS_SOCKET_TIMEOUT
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is not None and message["type"] == "message":
+                yield message["data"]
+    finally:
+        await pubsub.unsubscribe(channel)
+        await pubsub.aclose()
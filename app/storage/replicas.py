@@ -0,0 +1,73 @@
+import asyncio
+import itertools
+import logging
+from fastapi import FastAPI
+from sqlalchemy import event, text
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class ReplicaSet:
+    """Round-robin over the healthy read replicas, falling back to the primary.
+
+    Replicas are health checked periodically and dropped from rotation as soon as
+    one of their connections fails, until a later check succeeds again."""
+
+    def __init__(self, primary, replicas=()):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.healthy = list(self.replicas)
+        self._counter = itertools.count()
+        for replica in self.replicas:
+            event.listen(replica.sync_engine, "handle_error", self._error_handler(replica))
+
+    def _error_handler(self, replica):
+        def on_error(context):
+            # No connection on the context means the failure happened while connecting
+            if context.is_disconnect or context.connection is None:
+                self.mark_unhealthy(replica)
+        return on_error
+
+    def mark_unhealthy(self, replica):
+        if replica in self.healthy:
+            logger.warning("Read replica %s taken out of rotation", replica.url.render_as_string())
+            self.healthy = [r for r in self.healthy if r is not replica]
+
+    def is_replica(self, bind) -> bool:
+        return any(bind is replica for replica in self.replicas)
+
+    def choose(self):
+        healthy = self.healthy
+        if not healthy:
+            return self.primary
+        return healthy[next(self._counter) % len(healthy)]
+
+    async def _is_healthy(self, replica) -> bool:
+        try:
+            async with replica.connect() as conn:
+                await asyncio.wait_for(conn.execute(text("SELECT 1")), settings.REPLICA_HEALTH_CHECK_TIMEOUT)
+            return True
+        except Exception as e:
+            logger.warning("Read replica %s failed health check: %s", replica.url.render_as_string(), e)
+            return False
+
+    async def check(self):
+        results = await asyncio.gather(*(self._is_healthy(r) for r in self.replicas))
+        healthy = [replica for replica, ok in zip(self.replicas, results) if ok]
+        if len(healthy) != len(self.healthy):
+            logger.info("%d of %d read replicas healthy", len(healthy), len(self.replicas))
+        self.healthy = healthy
+
+async def periodic_replica_checks(replica_set: ReplicaSet):
+    while True:
+        await asyncio.sleep(settings.REPLICA_HEALTH_CHECK_INTERVAL)
+        try:
+            await replica_set.check()
+        except Exception as e:
+            logger.error("Replica health check failed: %s", e)
+
+def start_replica_health_checks(app: FastAPI, replica_set: ReplicaSet):
+    @app.on_event("startup")
+    async def start_task():
+        await replica_set.check()
+        asyncio.create_task(periodic_replica_checks(replica_set))
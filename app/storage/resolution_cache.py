@@ -0,0 +1,270 @@
+import asyncio
+import time
+import logging
+import weakref
+from collections import OrderedDict
+from redis.exceptions import RedisError
+from app.core.config import settings
+from app.utils.hostname_utils import covering_wildcards, normalize_hostname
+from app.storage.db import read_replicas
+from app.storage.invalidation import InvalidationBus, default_transport
+from app.storage.snapshot import publish_changes
+from app.storage.redis import (
+    cache_resolution_entries,
+    cache_resolution_entry,
+    get_cached_resolution_entries,
+    invalidate_resolution_chains,
+)
+
+logger = logging.getLogger(__name__)
+
+class ResolutionCache:
+    """In-process LRU of resolved answers.
+
+    Every entry remembers the names of the chain it was resolved through and
+    expires at the earliest expiry of the records in that chain, so a write to
+    any name in the chain evicts it.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.generation = 0
+        self.invalidated_at = float("-inf")  # time.monotonic() of the last invalidation
+        self._entries = OrderedDict()  # hostname -> (result, expires_at, chain)
+        self._dependents = {}          # name -> hostnames whose chain passes through it
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, hostname: str):
+        entry = self._entries.get(hostname)
+        if entry is None:
+            return None
+        result, expires_at, _ = entry
+        if expires_at <= time.time():
+            self._evict(hostname)
+            return None
+        self._entries.move_to_end(hostname)
+        return result
+
+    def put(self, hostname: str, result, expires_at: float, chain):
+        self._evict(hostname)
+        chain = tuple(chain)
+        self._entries[hostname] = (result, expires_at, chain)
+        for name in chain:
+            self._dependents.setdefault(name, set()).add(hostname)
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+
+    def invalidate(self, names) -> set[str]:
+        self.generation += 1
+        self.invalidated_at = time.monotonic()
+        evicted = set()
+        for name in names:
+            for hostname in list(self._dependents.get(name, ())):
+                self._evict(hostname)
+                evicted.add(hostname)
+        return evicted
+
+    def clear(self):
+        self.generation += 1
+        self.invalidated_at = time.monotonic()
+        self._entries.clear()
+        self._dependents.clear()
+
+    def _evict(self, hostname: str):
+        entry = self._entries.pop(hostname, None)
+        if entry is None:
+            return
+        for name in entry[2]:
+            dependents = self._dependents.get(name)
+            if dependents is not None:
+                dependents.discard(hostname)
+                if not dependents:
+                    del self._dependents[name]
+
+resolution_cache = ResolutionCache(settings.RESOLUTION_CACHE_SIZE)
+invalidation_bus = InvalidationBus(
+    default_transport(settings.INVALIDATION_CHANNEL),
+    resolution_cache,
+    settings.INVALIDATION_FLUSH_INTERVAL,
+    settings.INVALIDATION_MAX_BATCH,
+)
+
+def fill_generation(db) -> int | None:
+    """Generation to pass to cache_resolution for an answer about to be read through `db`.
+
+    A replica may not have replayed a write yet, so answers read from one within
+    REPLICA_MAX_LAG seconds of an invalidation get None, which is never cached."""
+    if read_replicas.is_replica(db.bind) and time.monotonic() - resolution_cache.invalidated_at < settings.REPLICA_MAX_LAG:
+        return None
+    return resolution_cache.generation
+
+async def get_cached_resolution(hostname: str):
+    result = resolution_cache.get(hostname)
+    if result is not None or not settings.RESOLUTION_CACHE_REDIS:
+        return result
+
+    try:
+        entry = await asyncio.shield(_lookup_entry(hostname))
+    except RedisError as e:
+        logger.warning("Redis lookup failed for %s: %s", hostname, e)
+        return None
+    if entry is None or entry["expires_at"] <= time.time() or _awaiting_redis_invalidation(entry):
+        return None
+
+    resolution_cache.put(hostname, entry["result"], entry["expires_at"], entry["chain"])
+    return entry["result"]
+
+# Local misses from concurrent single-name lookups (each DNS query, each GET) that
+# arrive in the same event loop iteration share one MGET instead of a GET each
+_lookup_batches = weakref.WeakKeyDictionary()  # loop -> {hostname: future}
+_lookup_tasks = set()
+
+def _lookup_entry(hostname: str) -> asyncio.Future:
+    loop = asyncio.get_running_loop()
+    batch = _lookup_batches.get(loop)
+    if batch is None:
+        batch = _lookup_batches[loop] = {}
+        task = loop.create_task(_send_lookups(loop))
+        _lookup_tasks.add(task)
+        task.add_done_callback(_lookup_tasks.discard)
+    future = batch.get(hostname)
+    if future is None:
+        future = batch[hostname] = loop.create_future()
+    return future
+
+async def _send_lookups(loop):
+    batch = _lookup_batches.pop(loop)
+    try:
+        entries = await get_cached_resolution_entries(list(batch))
+    except RedisError as e:
+        for future in batch.values():
+            if not future.done():
+                future.set_exception(e)
+        return
+    for future, entry in zip(batch.values(), entries):
+        if not future.done():
+            future.set_result(entry)
+
+async def get_cached_resolutions(hostnames: list[str]) -> dict:
+    """Cached results for those of `hostnames` that have one, with one MGET for the local misses."""
+    results = {}
+    missing = []
+    for hostname in hostnames:
+        result = resolution_cache.get(hostname)
+        if result is not None:
+            results[hostname] = result
+        else:
+            missing.append(hostname)
+    if not missing or not settings.RESOLUTION_CACHE_REDIS:
+        return results
+
+    try:
+        entries = await get_cached_resolution_entries(missing)
+    except RedisError as e:
+        logger.warning("Redis lookup failed for %d hostnames: %s", len(missing), e)
+        return results
+    now = time.time()
+    for hostname, entry in zip(missing, entries):
+        if entry is not None and entry["expires_at"] > now and not _awaiting_redis_invalidation(entry):
+            resolution_cache.put(hostname, entry["result"], entry["expires_at"], entry["chain"])
+            results[hostname] = entry["result"]
+    return results
+
+async def cache_resolution(hostname: str, result, expires_at: float, chain, generation: int):
+    # A write landed while this answer was being resolved, so it may already be stale.
+    if generation != resolution_cache.generation:
+        return
+    ttl = int(expires_at - time.time())
+    if ttl <= 0:
+        return
+
+    resolution_cache.put(hostname, result, expires_at, chain)
+    if not settings.RESOLUTION_CACHE_REDIS:
+        return
+    try:
+        await cache_resolution_entry(
+            hostname,
+            {"result": result, "expires_at": expires_at, "chain": list(chain)},
+            ttl,
+        )
+    except RedisError as e:
+        logger.warning("Redis write failed for %s: %s", hostname, e)
+
+async def cache_resolutions(resolved: list, generation: int):
+    """cache_resolution for many (hostname, result, expires_at, chain) at once, in one pipeline."""
+    if generation != resolution_cache.generation:
+        return
+    now = time.time()
+    entries = []
+    for hostname, result, expires_at, chain in resolved:
+        ttl = int(expires_at - now)
+        if ttl <= 0:
+            continue
+        resolution_cache.put(hostname, result, expires_at, chain)
+        entries.append((hostname, {"result": result, "expires_at": expires_at, "chain": list(chain)}, ttl))
+    if not entries or not settings.RESOLUTION_CACHE_REDIS:
+        return
+    try:
+        await cache_resolution_entries(entries)
+    except RedisError as e:
+        logger.warning("Redis write failed for %d hostnames: %s", len(entries), e)
+
+_reinvalidations = set()
+
+async def invalidate_resolutions(names):
+    names = {normalize_hostname(name) for name in names}
+    if not names:
+        return
+    # Every committed write ends up here, so this is also where snapshots hear of it
+    await publish_changes(names)
+    # Answers synthesized from a wildcard depend on every name under its parent
+    names.update(wildcard for name in list(names) for wildcard in covering_wildcards(name))
+    await _invalidate_cached(names)
+    if read_replicas.replicas:
+        # A worker that read a lagging replica before hearing of this write may have
+        # cached the old answer since; once the replicas have caught up, evict again
+        task = asyncio.create_task(_invalidate_later(names))
+        _reinvalidations.add(task)
+        task.add_done_callback(_reinvalidations.discard)
+
+async def _invalidate_later(names):
+    await asyncio.sleep(settings.REPLICA_MAX_LAG)
+    await _invalidate_cached(names)
+
+async def _invalidate_cached(names):
+    resolution_cache.invalidate(names)
+    await invalidation_bus.publish(names)
+    if not settings.RESOLUTION_CACHE_REDIS:
+        return
+    try:
+        await invalidate_resolution_chains(names)
+    except RedisError as e:
+        # The entries would be read back as fresh once Redis recovers, so keep trying
+        logger.warning("Redis invalidation failed for %s names, retrying: %s", len(names), e)
+        _redis_pending.update(names)
+        _schedule_redis_retry()
+
+_redis_pending = set()  # names whose Redis entries could not be deleted yet
+_redis_retry = None
+
+def _awaiting_redis_invalidation(entry) -> bool:
+    return bool(_redis_pending) and not _redis_pending.isdisjoint(entry["chain"])
+
+def _schedule_redis_retry():
+    global _redis_retry
+    task = _redis_retry
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+        _redis_retry = asyncio.create_task(_retry_redis_invalidations())
+
+async def _retry_redis_invalidations():
+    while _redis_pending:
+        await asyncio.sleep(settings.INVALIDATION_RETRY_INTERVAL)
+        names = set(_redis_pending)
+        try:
+            await invalidate_resolution_chains(names)
+        except RedisError as e:
+            logger.warning("Redis invalidation retry failed for %s names: %s", len(names), e)
+            continue
+        _redis_pending.difference_update(names)
@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import sys
+import time
+from datetime import datetime
+from fastapi import FastAPI
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from app.core.config import settings
+from app.models.record_db import DNSRecord, RecordType
+from app.storage.db import AsyncSessionLocal
+from app.storage.redis import publish_record_changes, read_record_changes, record_changes_position
+from app.utils.loop_local import LoopLocal
+
+logger = logging.getLogger(__name__)
+
+class SnapshotRecord:
+    """Read-only, slotted copy of a DNSRecord row with the attributes the read paths use."""
+
+    __slots__ = ("id", "hostname", "hostname_normalized", "type", "_value", "cname_target",
+                 "mx_priority", "mx_host", "address", "ttl_seconds", "expires_at")
+
+    def __init__(self, row):
+        self.id = row.id
+        self.hostname_normalized = sys.intern(row.hostname_normalized)
+        self.hostname = self.hostname_normalized if row.hostname == row.hostname_normalized else row.hostname
+        self.type = row.type
+        self.cname_target = sys.intern(row.cname_target) if row.cname_target else None
+        self.mx_priority = row.mx_priority
+        self.mx_host = row.mx_host
+        self.address = row.address
+        # A/AAAA values are just [address], so they are rebuilt instead of stored
+        self._value = None if row.address is not None else row.value
+        self.ttl_seconds = row.ttl_seconds
+        self.expires_at = row.expires_at
+
+    @property
+    def value(self):
+        return [self.address] if self._value is None else self._value
+
+_COLUMNS = [
+    DNSRecord.id, DNSRecord.hostname, DNSRecord.hostname_normalized, DNSRecord.type, DNSRecord.value,
+    DNSRecord.cname_target, DNSRecord.mx_priority, DNSRecord.mx_host, DNSRecord.address,
+    DNSRecord.ttl_seconds, DNSRecord.expires_at,
+]
+
+def _suffixes(hostname: str):
+    labels = hostname.split(".")
+    return (".".join(labels[i:]) for i in range(len(labels)))
+
+class ZoneSnapshot:
+    """Every record keyed by normalized hostname, for answering reads without the database.
+
+    `_names_below` counts the records at or below each name, which is what the
+    RFC 4592 closest-encloser check needs for wildcards."""
+
+    def __init__(self):
+        self.ready = False
+        self._records = {}      # hostname -> [SnapshotRecord]
+        self._names_below = {}  # name -> records at or below it
+        self.load_seconds = 0.0
+        self.loaded_at = None
+        self.approx_bytes = 0
+        self.changes_applied = 0
+        # Refreshes query and apply one at a time, so an older read can't land after a newer one
+        self._refresh_locks = LoopLocal(asyncio.Lock)
+
+    def __len__(self):
+        return sum(len(records) for records in self._records.values())
+
+    def records(self, hostname: str) -> list[SnapshotRecord]:
+        return self._records.get(hostname, [])
+
+    def chain_records(self, hostname: str, max_depth: int = None) -> dict[str, list[SnapshotRecord]]:
+        """Same shape as fetch_chain_records: the records of every name reachable through CNAMEs."""
+        max_depth = settings.MAX_CNAME_DEPTH if max_depth is None else max_depth
+        chain = {}
+        current = hostname
+        while current not in chain and len(chain) <= max_depth + 1:
+            records = self._records.get(current)
+            if not records:
+                break
+            chain[current] = records
+            current = next((r.cname_target for r in records if r.type == RecordType.CNAME), None)
+            if current is None:
+                break
+        return chain
+
+    def wildcard_records(self, hostname: str) -> list[SnapshotRecord]:
+        """In-memory counterpart of fetch_wildcard_records."""
+        labels = hostname.split(".")
+        for i in range(len(labels) - 1):
+            if self._names_below.get(".".join(labels[i:])):
+                return []
+            records = self._records.get("*." + ".".join(labels[i + 1:]))
+            if records:
+                return records
+        return []
+
+    def _add(self, records: dict, names_below: dict, record: SnapshotRecord):
+        records.setdefault(record.hostname_normalized, []).append(record)
+        for name in _suffixes(record.hostname_normalized):
+            names_below[name] = names_below.get(name, 0) + 1
+
+    async def load(self, session_factory=AsyncSessionLocal):
+        """Load every unexpired record, then swap it in at once."""
+        started = time.perf_counter()
+        records, names_below = {}, {}
+        async with session_factory() as db:
+            rows = await db.stream(
+                select(*_COLUMNS)
+                .where(DNSRecord.expires_at >= datetime.utcnow())
+                .order_by(DNSRecord.id)
+                .execution_options(yield_per=settings.SNAPSHOT_LOAD_BATCH_SIZE)
+            )
+            async for partition in rows.partitions():
+                for row in partition:
+                    self._add(records, names_below, SnapshotRecord(row))
+
+        self._records, self._names_below = records, names_below
+        self.load_seconds = time.perf_counter() - started
+        self.loaded_at = datetime.utcnow()
+        self.approx_bytes = self._approx_bytes()
+        self.ready = True
+        stats = self.stats()
+        logger.info(
+            "Loaded snapshot of %d records for %d hostnames in %.2fs (~%.0f MiB per million records)",
+            stats["records"], stats["hostnames"], self.load_seconds, stats["bytes_per_million_records"] / 2**20,
+        )
+
+    async def refresh(self, names, session_factory=AsyncSessionLocal):
+        """Reload the records of `names` after they changed in the database."""
+        names = set(names)
+        async with self._refresh_locks.get():
+            async with session_factory() as db:
+                rows = (await db.execute(select(*_COLUMNS).where(DNSRecord.hostname_normalized.in_(names)))).all()
+
+            for name in names:
+                for _ in self._records.pop(name, ()):
+                    for suffix in _suffixes(name):
+                        remaining = self._names_below[suffix] - 1
+                        if remaining:
+                            self._names_below[suffix] = remaining
+                        else:
+                            del self._names_below[suffix]
+            for row in rows:
+                self._add(self._records, self._names_below, SnapshotRecord(row))
+            self.changes_applied += len(names)
+
+    def reset(self):
+        self.ready = False
+        self._records, self._names_below = {}, {}
+
+    def _approx_bytes(self, sample_size: int = 10000) -> int:
+        """Containers measured exactly, records extrapolated from a sample."""
+        size = sys.getsizeof(self._records) + sys.getsizeof(self._names_below)
+        size += sum(sys.getsizeof(name) + sys.getsizeof(records) for name, records in self._records.items())
+        size += sum(sys.getsizeof(name) for name in self._names_below)
+        sample = []
+        for records in self._records.values():
+            sample.extend(records)
+            if len(sample) >= sample_size:
+                break
+        if sample:
+            per_record = sum(
+                sys.getsizeof(r) + sys.getsizeof(r._value) + sys.getsizeof(r.address) + sys.getsizeof(r.expires_at)
+                for r in sample
+            ) / len(sample)
+            size += int(per_record * len(self))
+        return size
+
+    def stats(self) -> dict:
+        count = len(self)
+        return {
+            "ready": self.ready,
+            "records": count,
+            "hostnames": len(self._records),
+            "load_seconds": round(self.load_seconds, 3),
+            "loaded_at": self.loaded_at,
+            "approx_bytes": self.approx_bytes,
+            "bytes_per_million_records": int(self.approx_bytes / count * 1_000_000) if count else 0,
+            "changes_applied": self.changes_applied,
+        }
+
+class LocalChangeFeed:
+    """In-process change feed, for a single worker and for tests."""
+
+    def __init__(self):
+        self._batches = []
+        self._changed = LoopLocal(asyncio.Event)
+
+    async def position(self) -> int:
+        return len(self._batches)
+
+    async def publish(self, names: list[str]):
+        self._batches.append(names)
+        self._changed.get().set()
+
+    async def read(self, position: int, timeout: float = 1.0):
+        if position >= len(self._batches):
+            changed = self._changed.get()
+            changed.clear()
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return len(self._batches), self._batches[position:]
+
+class RedisChangeFeed:
+    """Change feed on a capped Redis stream shared by every worker."""
+
+    def __init__(self, stream: str, maxlen: int, block_ms: int = 1000):
+        self.stream = stream
+        self.maxlen = maxlen
+        self.block_ms = block_ms
+
+    async def position(self) -> str:
+        return await record_changes_position(self.stream)
+
+    async def publish(self, names: list[str]):
+        await publish_record_changes(self.stream, names, self.maxlen)
+
+    async def read(self, position: str):
+        return await read_record_changes(self.stream, position, self.block_ms)
+
+zone_snapshot = ZoneSnapshot()
+change_feed = (
+    LocalChangeFeed() if settings.SNAPSHOT_CHANGE_FEED == "local"
+    else RedisChangeFeed(settings.SNAPSHOT_STREAM, settings.SNAPSHOT_STREAM_MAXLEN)
+)
+
+async def publish_changes(names):
+    """Tell every snapshot-serving worker that the records of `names` changed.
+
+    This worker's own snapshot is refreshed right away so it reads its own writes."""
+    if settings.SERVING_MODE != "snapshot":
+        return
+    names = sorted(names)
+    if zone_snapshot.ready:
+        await zone_snapshot.refresh(names)
+    try:
+        await change_feed.publish(names)
+    except RedisError as e:
+        logger.warning("Publishing record changes failed for %s: %s", names, e)
+
+async def follow_changes(snapshot: ZoneSnapshot, feed, session_factory=AsyncSessionLocal):
+    """Load the snapshot, then apply the feed from the position taken just before loading.
+
+    Entries that land during the load are applied again, which is harmless. After an
+    error the snapshot is loaded from scratch, so missed entries can't leave it stale."""
+    while True:
+        try:
+            position = await feed.position()
+            await snapshot.load(session_factory)
+            while True:
+                position, batches = await feed.read(position)
+                names = {name for batch in batches for name in batch}
+                if names:
+                    await snapshot.refresh(names, session_factory)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Snapshot change feed failed, reloading: %s", e)
+            await asyncio.sleep(settings.SNAPSHOT_RETRY_INTERVAL)
+
+def start_snapshot_serving(app: FastAPI):
+    @app.on_event("startup")
+    async def start_task():
+        app.state.snapshot_task = asyncio.create_task(follow_changes(zone_snapshot, change_feed))
+
+    @app.on_event("shutdown")
+    async def stop_task():
+        app.state.snapshot_task.cancel()
@@ -0,0 +1,268 @@
+"""RFC 1035 message encoding and decoding for the DNS frontend.
+
+Only what an authoritative answer for A, AAAA, CNAME, MX and TXT needs is
+implemented; the struct layouts are compiled once at import time and names are
+written with message compression.
+"""
+import ipaddress
+import struct
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+HEADER = struct.Struct("!HHHHHH")
+QUESTION_TAIL = struct.Struct("!HH")
+RR_TAIL = struct.Struct("!HHIH")
+RR_FIXED = struct.Struct("!HHI")
+UINT16 = struct.Struct("!H")
+SOA_TIMERS = struct.Struct("!IIIII")
+
+TYPE_A = 1
+TYPE_NS = 2
+TYPE_CNAME = 5
+TYPE_SOA = 6
+TYPE_MX = 15
+TYPE_TXT = 16
+TYPE_AAAA = 28
+CLASS_IN = 1
+
+RCODE_NOERROR = 0
+RCODE_FORMERR = 1
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+RCODE_NOTIMP = 4
+RCODE_REFUSED = 5
+
+FLAG_QR = 0x8000
+FLAG_AA = 0x0400
+FLAG_TC = 0x0200
+FLAG_RD = 0x0100
+OPCODE_MASK = 0x7800
+OPCODE_QUERY = 0
+
+MAX_UDP_SIZE = 512
+MAX_POINTER_HOPS = 64
+
+class DNSFormatError(ValueError):
+    pass
+
+@dataclass(slots=True)
+class Question:
+    name: str
+    qtype: int
+    qclass: int = CLASS_IN
+
+@dataclass(slots=True)
+class ResourceRecord:
+    name: str
+    rtype: int
+    ttl: int
+    # str for A/AAAA/CNAME, (priority, host) for MX, list[str] for TXT,
+    # (mname, rname, serial, refresh, retry, expire, minimum) for SOA, bytes otherwise
+    rdata: object
+    rclass: int = CLASS_IN
+
+@dataclass(slots=True)
+class Message:
+    id: int
+    flags: int
+    questions: list = field(default_factory=list)
+    answers: list = field(default_factory=list)
+    authority: list = field(default_factory=list)
+    question_end: int = HEADER.size
+
+    @property
+    def opcode(self) -> int:
+        return (self.flags & OPCODE_MASK) >> 11
+
+    @property
+    def rcode(self) -> int:
+        return self.flags & 0x000F
+
+def decode_name(data: bytes, offset: int) -> tuple[str, int]:
+    """Read a possibly compressed name; returns the name and the offset just past it."""
+    labels = []
+    end = None
+    hops = 0
+    length = len(data)
+    while True:
+        if offset >= length:
+            raise DNSFormatError("Name runs past the end of the message")
+        size = data[offset]
+        if size & 0xC0 == 0xC0:
+            if offset + 1 >= length:
+                raise DNSFormatError("Truncated compression pointer")
+            if end is None:
+                end = offset + 2
+            hops += 1
+            if hops > MAX_POINTER_HOPS:
+                raise DNSFormatError("Compression pointer loop")
+            offset = ((size & 0x3F) << 8) | data[offset + 1]
+            continue
+        if size & 0xC0:
+            raise DNSFormatError("Unsupported label type")
+        offset += 1
+        if size == 0:
+            break
+        if offset + size > length:
+            raise DNSFormatError("Label runs past the end of the message")
+        labels.append(data[offset:offset + size].decode("ascii", "replace"))
+        offset += size
+    return ".".join(labels), (end if end is not None else offset)
+
+def _decode_rdata(data: bytes, rtype: int, offset: int, rdlength: int):
+    end = offset + rdlength
+    if rtype == TYPE_A and rdlength == 4:
+        return str(ipaddress.IPv4Address(data[offset:end]))
+    if rtype == TYPE_AAAA and rdlength == 16:
+        return str(ipaddress.IPv6Address(data[offset:end]))
+    if rtype == TYPE_CNAME:
+        return decode_name(data, offset)[0]
+    if rtype == TYPE_MX:
+        return UINT16.unpack_from(data, offset)[0], decode_name(data, offset + 2)[0]
+    if rtype == TYPE_SOA:
+        mname, offset = decode_name(data, offset)
+        rname, offset = decode_name(data, offset)
+        return (mname, rname, *SOA_TIMERS.unpack_from(data, offset))
+    if rtype == TYPE_TXT:
+        strings = []
+        while offset < end:
+            size = data[offset]
+            strings.append(data[offset + 1:offset + 1 + size].decode("utf-8", "replace"))
+            offset += 1 + size
+        return strings
+    return bytes(data[offset:end])
+
+def decode_message(data: bytes) -> Message:
+    if len(data) < HEADER.size:
+        raise DNSFormatError("Message shorter than the header")
+    msg_id, flags, qdcount, ancount, nscount, _ = HEADER.unpack_from(data, 0)
+    message = Message(id=msg_id, flags=flags)
+    offset = HEADER.size
+    try:
+        for _ in range(qdcount):
+            name, offset = decode_name(data, offset)
+            qtype, qclass = QUESTION_TAIL.unpack_from(data, offset)
+            offset += QUESTION_TAIL.size
+            message.questions.append(Question(name, qtype, qclass))
+            if len(message.questions) == 1:
+                message.question_end = offset
+        for section, count in ((message.answers, ancount), (message.authority, nscount)):
+            for _ in range(count):
+                name, offset = decode_name(data, offset)
+                rtype, rclass, ttl, rdlength = RR_TAIL.unpack_from(data, offset)
+                offset += RR_TAIL.size
+                if offset + rdlength > len(data):
+                    raise DNSFormatError("RDATA runs past the end of the message")
+                rdata = _decode_rdata(data, rtype, offset, rdlength)
+                offset += rdlength
+                section.append(ResourceRecord(name, rtype, ttl, rdata, rclass))
+    except struct.error as e:
+        raise DNSFormatError(str(e)) from e
+    return message
+
+@lru_cache(maxsize=4096)
+def _labels(name: str) -> tuple[bytes, ...]:
+    labels = tuple(label.encode("idna") if not label.isascii() else label.encode("ascii")
+                   for label in name.rstrip(".").split(".") if label)
+    for label in labels:
+        if len(label) > 63:
+            raise ValueError(f"Label too long in {name}")
+    return labels
+
+def _write_name(buf: bytearray, name: str, offsets: dict):
+    labels = _labels(name)
+    for i in range(len(labels)):
+        suffix = b".".join(labels[i:]).lower()
+        pointer = offsets.get(suffix)
+        if pointer is not None:
+            buf += UINT16.pack(0xC000 | pointer)
+            return
+        if len(buf) < 0x3FFF:
+            offsets[suffix] = len(buf)
+        buf.append(len(labels[i]))
+        buf += labels[i]
+    buf.append(0)
+
+def _write_rdata(buf: bytearray, rtype: int, rdata, offsets: dict):
+    length_at = len(buf)
+    buf += b"\x00\x00"
+    if rtype == TYPE_A:
+        buf += ipaddress.IPv4Address(rdata).packed
+    elif rtype == TYPE_AAAA:
+        buf += ipaddress.IPv6Address(rdata).packed
+    elif rtype == TYPE_CNAME:
+        _write_name(buf, rdata, offsets)
+    elif rtype == TYPE_MX:
+        priority, host = rdata
+        buf += UINT16.pack(priority)
+        _write_name(buf, host, offsets)
+    elif rtype == TYPE_SOA:
+        mname, rname, *timers = rdata
+        _write_name(buf, mname, offsets)
+        _write_name(buf, rname, offsets)
+        buf += SOA_TIMERS.pack(*timers)
+    elif rtype == TYPE_TXT:
+        for text in rdata:
+            encoded = text.encode("utf-8")
+            # character-strings hold at most 255 bytes each
+            for start in range(0, max(len(encoded), 1), 255):
+                piece = encoded[start:start + 255]
+                buf.append(len(piece))
+                buf += piece
+    else:
+        buf += rdata
+    UINT16.pack_into(buf, length_at, len(buf) - length_at - 2)
+
+def encode_query(msg_id: int, name: str, qtype: int, recursion_desired: bool = True) -> bytes:
+    buf = bytearray(HEADER.pack(msg_id, FLAG_RD if recursion_desired else 0, 1, 0, 0, 0))
+    _write_name(buf, name, {})
+    buf += QUESTION_TAIL.pack(qtype, CLASS_IN)
+    return bytes(buf)
+
+def _question_offsets(raw_query: bytes, end: int) -> dict:
+    """Compression offsets of every suffix of the question name, read from the query's own bytes.
+
+    The name is never decoded and re-encoded, so labels that are not valid
+    hostnames are echoed unchanged. A question that is itself compressed offers none."""
+    labels = []
+    position = HEADER.size
+    while position < end and raw_query[position]:
+        size = raw_query[position]
+        if size & 0xC0:
+            return {}
+        labels.append((position, raw_query[position + 1:position + 1 + size]))
+        position += 1 + size
+    return {
+        b".".join(label for _, label in labels[i:]).lower(): offset
+        for i, (offset, _) in enumerate(labels)
+    }
+
+def _write_records(buf: bytearray, records, offsets: dict):
+    for rr in records:
+        _write_name(buf, rr.name, offsets)
+        buf += RR_FIXED.pack(rr.rtype, rr.rclass, max(int(rr.ttl), 0))
+        _write_rdata(buf, rr.rtype, rr.rdata, offsets)
+
+def encode_response(
+    query: Message, raw_query: bytes, rcode: int, answers=(), max_size: int = None, authority=(),
+) -> bytes:
+    """Build an authoritative response that echoes the query's question section.
+
+    If the answer does not fit in max_size the TC bit is set and only the question
+    is returned, so the client retries over TCP."""
+    flags = FLAG_QR | FLAG_AA | (query.flags & (OPCODE_MASK | FLAG_RD)) | rcode
+    qdcount = 1 if query.questions else 0
+    question = raw_query[HEADER.size:query.question_end] if qdcount else b""
+
+    buf = bytearray(HEADER.pack(query.id, flags, qdcount, len(answers), len(authority), 0))
+    buf += question
+    # Every suffix of the question name can be pointed at by the records
+    offsets = _question_offsets(raw_query, query.question_end) if qdcount else {}
+    _write_records(buf, answers, offsets)
+    _write_records(buf, authority, offsets)
+
+    if max_size is not None and len(buf) > max_size:
+        truncated = bytearray(HEADER.pack(query.id, flags | FLAG_TC, qdcount, 0, 0, 0))
+        truncated += question
+        return bytes(truncated)
+    return bytes(buf)
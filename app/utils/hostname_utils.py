@@ -1,21 +1,60 @@
 import re
+from functools import lru_cache
 from typing import List
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Names repeat heavily (same zones, same bulk files), so results are memoized up to this many names
+HOSTNAME_MEMO_SIZE = 8192
+
+_LABEL = r"[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?"
+# A leading "*" label makes a wildcard owner name (RFC 4592); "*" is not allowed anywhere else
+_HOSTNAME_PATTERN = re.compile(rf"(?:\*\.)?(?:{_LABEL}\.)*{_LABEL}")
+_IPV4_PATTERN = re.compile(r"\d{1,3}(?:\.\d{1,3}){3}")
+
+def _to_ascii(name: str) -> str:
+    """Punycode form of an internationalized name; names IDNA can't encode are returned unchanged."""
+    if name.isascii():
+        return name
+    try:
+        return name.encode("idna").decode("ascii")
+    except UnicodeError:
+        return name
+
+@lru_cache(maxsize=HOSTNAME_MEMO_SIZE)
+def normalize_hostname(hostname: str) -> str:
+    """Canonical form of a hostname: unquoted, without the root dot, punycode and lowercase."""
+    return _to_ascii(hostname.strip().strip('"').rstrip(".")).lower()
+
+@lru_cache(maxsize=HOSTNAME_MEMO_SIZE)
 def is_regex_hostname(hostname: str) -> bool:
-    
-    if len(hostname) > 253:
+    if not hostname or len(hostname) > 253:
         return False
+    name = _to_ascii(hostname).lower()
+    if len(name) > 253:
+        return False
+    return _HOSTNAME_PATTERN.fullmatch(name) is not None
+
+def is_wildcard_hostname(hostname: str) -> bool:
+    return hostname.startswith("*.")
+
+def reverse_labels(hostname: str) -> str:
+    """Labels of a normalized hostname in reverse order ("www.example.com" -> "com.example.www").
+
+    Names under a common parent then share a prefix, so a subtree is a range of an index."""
+    return ".".join(reversed(hostname.split(".")))
 
-    pattern = r"^(?=.{1,253}$)(?!-)[A-Za-z0-9]([A-Za-z0-9\-]{0,61}[A-Za-z0-9])?(?:\.(?!-)[A-Za-z0-9]([A-Za-z0-9\-]{0,61}[A-Za-z0-9])?)*$"
-    return re.match(pattern, hostname) is not None
+def covering_wildcards(hostname: str) -> list[str]:
+    """Wildcard names that could answer for hostname: "*." under each of its ancestors."""
+    labels = hostname.split(".")
+    return ["*." + ".".join(labels[i:]) for i in range(1, len(labels))]
 
 def validate_hostname_or_raise(v: str, field_name: str = "value") -> str:
-    ip_pattern = r"^\d{1,3}(\.\d{1,3}){3}$"
-    if re.match(ip_pattern, v):
+    if _IPV4_PATTERN.fullmatch(v):
         raise ValueError(f"{field_name} must be a hostname, not an IP address")
+    if "*" in v:
+        raise ValueError(f"{field_name} must not be a wildcard name")
     return v
 
 def validate_non_empty_strings(lst: List[str]) -> List[str]:
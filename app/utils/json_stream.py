@@ -0,0 +1,87 @@
+import codecs
+import json
+
+READ_SIZE = 64 * 1024
+MAX_ITEM_SIZE = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+class JSONStreamError(ValueError):
+    pass
+
+async def iter_json_records(file, read_size: int = READ_SIZE):
+    """Yield the items of an uploaded JSON array or NDJSON document one at a time.
+
+    Only the current read window and the item being parsed are held in memory, so
+    uploads of any size are parsed in constant memory.
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    pos = 0
+    eof = False
+    # start -> array_value -> (array_separator <-> array_next) -> done, or start -> ndjson
+    state = "start"
+
+    async def fill():
+        nonlocal buffer, pos, eof
+        chunk = await file.read(read_size)
+        eof = not chunk
+        buffer = buffer[pos:] + text_decoder.decode(chunk, final=eof)
+        pos = 0
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        if pos >= len(buffer):
+            if eof:
+                break
+            await fill()
+            continue
+
+        char = buffer[pos]
+        if state == "start":
+            if char == "[":
+                state = "array_value"
+                pos += 1
+                continue
+            if char != "{":
+                raise JSONStreamError("JSON must be a list of DNS records")
+            state = "ndjson"
+        elif state == "done":
+            raise JSONStreamError("Unexpected data after the end of the JSON array")
+        elif state == "array_separator":
+            if char not in ",]":
+                raise JSONStreamError(f"Expected ',' or ']' but found {char!r}")
+            state = "array_next" if char == "," else "done"
+            pos += 1
+            continue
+        elif char == "]":
+            if state == "array_next":
+                raise JSONStreamError("Trailing comma in JSON array")
+            state = "done"
+            pos += 1
+            continue
+
+        try:
+            item, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            # The value probably continues in the next read; give up at EOF or when a
+            # single item grows past MAX_ITEM_SIZE so malformed input can't fill memory.
+            if eof or len(buffer) - pos > MAX_ITEM_SIZE:
+                raise JSONStreamError(str(e)) from e
+            await fill()
+            continue
+
+        # A bare number could still be cut off by the read boundary
+        if end == len(buffer) and not eof and isinstance(item, (int, float)):
+            await fill()
+            continue
+
+        pos = end
+        if state in ("array_value", "array_next"):
+            state = "array_separator"
+        yield item
+
+    if state in ("array_value", "array_separator", "array_next"):
+        raise JSONStreamError("Unterminated JSON array")
@@ -0,0 +1,20 @@
+import asyncio
+import weakref
+
+class LoopLocal:
+    """One `factory()` object per running event loop, created on first use.
+
+    asyncio primitives and Redis connections belong to the loop that first uses
+    them, so module-level ones break once a process runs a second loop (each
+    test under pytest-asyncio, several apps in one process)."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._values = weakref.WeakKeyDictionary()  # loop -> value
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        value = self._values.get(loop)
+        if value is None:
+            value = self._values[loop] = self._factory()
+        return value
@@ -1,6 +1,6 @@
 # app/utils/record_utils.py
 
-from app.models.record_db import RecordType, DNSRecord
+from app.models.record_db import RecordType, DNSRecord, canonical_address
 from app.models.record_schema import DNSRecordInput
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -8,57 +8,40 @@ from sqlalchemy import select
 from typing import List
 from pydantic import BaseModel, Field, IPvAnyAddress, validator
 from app.core.errors import ErrorCode, raise_error
+from app.services.cname_chain import fetch_cname_chain
+from app.utils.hostname_utils import normalize_hostname
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 async def check_for_duplicate_records(existing_records, record):
+    new_addresses = (
+        {canonical_address(str(ip)) for ip in record.value}
+        if record.type in [RecordType.A.value, RecordType.AAAA.value]
+        else set()
+    )
     for existing in existing_records:
-        logger.debug(f"Existing Record: {existing.type}, New Record: {record.type}")
+        logger.debug("Existing Record: %s, New Record: %s", existing.type, record.type)
         
         if existing.type.value in [RecordType.A.value, RecordType.AAAA.value] and record.type == existing.type.value:
-            existing_values = json.loads(existing.value)
-            new_values = [str(ip) for ip in record.value]
-            logger.debug(f"Existing values: {existing_values}, New values: {new_values}")
-            
-            intersection = set(existing_values).intersection(set(new_values))
-            if intersection:
-                logger.error(f"Duplicate record found for {record.hostname}")
+            if existing.address in new_addresses:
+                logger.error("Duplicate record found for %s", record.hostname)
                 raise_error(ErrorCode.DUPLICATE_RECORD, status_code=409)
 
         elif existing.type != record.type:
-            logger.error(f"Duplicate record type for {record.hostname}")
+            logger.error("Duplicate record type for %s", record.hostname)
             raise_error(ErrorCode.DUPLICATE_RECORD, status_code=409)
 
 #We can further implement  acname depth reached algo , error code has been mentioned in the error code class.
-async def has_cname_cycle(start: str, target: str, db: AsyncSession, visited: set[str] = None) -> bool:
-    print("In cname cycle")
-    if visited is None:
-        visited = set()
-
-    current = target.lower()
-    start = start.lower()
-
-    if current == start:
-        return True  # Cycle detected(dfs visited approach)
-
-    if current in visited:
-        return False  # Already checked this node
-
-    visited.add(current)
-    print("Current",current)
-    print("Start", start)
-    result = await db.execute(
-        select(DNSRecord).where(
-            DNSRecord.hostname == current,
-            DNSRecord.type == RecordType.CNAME
-        )
-    )
-    record = result.scalar()
-
-    if not record:
-        return False  
+async def has_cname_cycle(start: str, target: str, db: AsyncSession) -> bool:
+    start = normalize_hostname(start)
+    target = normalize_hostname(target)
 
-    return await has_cname_cycle(start, record.value.strip('"').lower(), db, visited)
+    if target == start:
+        return True  # Cycle detected
 
+    # Whole chain from the target in one query; a cycle exists if it leads back to start.
+    chain = await fetch_cname_chain(target, db)
+    logger.debug("CNAME chain from %s: %s", target, chain.names)
+    return start in chain.names
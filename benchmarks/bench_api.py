@@ -0,0 +1,73 @@
+import asyncio
+import itertools
+import json
+import time
+from httpx import AsyncClient
+from benchmarks.stats import BenchResult
+
+HEADERS = {"X-API-Key": "supersecret"}
+HEAVY_RUNS = 10  # export and import runs per zone
+
+async def drive(name: str, send, count: int, concurrency: int) -> BenchResult:
+    """Call `send(i)` for i in range(count) from `concurrency` concurrent workers."""
+    result = BenchResult(name)
+    indexes = iter(range(count))
+
+    async def worker():
+        for i in indexes:
+            started = time.perf_counter()
+            response = await send(i)
+            result.latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                result.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.seconds = time.perf_counter() - started
+    return result
+
+async def run_api_benchmarks(app, zone: str, names: list[str], requests: int, concurrency: int, clear_caches):
+    """Drive the FastAPI app in-process; caches are cleared before each cold pass."""
+    results = []
+    headers = dict(HEADERS)
+    async with AsyncClient(app=app, base_url="http://bench") as client:
+        cold = names[:requests]
+        await clear_caches()
+        results.append(await drive(
+            f"api GET /{{hostname}} cold [{zone}]",
+            lambda i: client.get(f"/api/dns/{cold[i]}", headers=headers), len(cold), concurrency,
+        ))
+        hot = list(itertools.islice(itertools.cycle(names[:100]), requests))
+        results.append(await drive(
+            f"api GET /{{hostname}} warm [{zone}]",
+            lambda i: client.get(f"/api/dns/{hot[i]}", headers=headers), len(hot), concurrency,
+        ))
+        results.append(await drive(
+            f"api GET /{{hostname}}/records [{zone}]",
+            lambda i: client.get(f"/api/dns/{cold[i]}/records", headers=headers), len(cold), concurrency,
+        ))
+
+        batches = [names[start:start + 100] for start in range(0, len(names), 100)]
+        await clear_caches()
+        results.append(await drive(
+            f"api POST /resolve x100 [{zone}]",
+            lambda i: client.post("/api/dns/resolve", json={"hostnames": batches[i % len(batches)]}, headers=headers),
+            min(len(batches), max(requests // 100, 1)), concurrency,
+        ))
+
+        results.append(await drive(
+            f"api GET /bulk/export [{zone}]",
+            lambda i: client.get("/api/dns/bulk/export?format=ndjson", headers=headers), HEAVY_RUNS, 1,
+        ))
+
+        async def import_batch(i):
+            body = "\n".join(
+                json.dumps({"hostname": f"import{i}-{n}.{zone}.bench", "type": "A", "value": [f"10.99.{i % 250}.{n % 250 + 1}"]})
+                for n in range(500)
+            )
+            return await client.post(
+                "/api/dns/bulk/import", headers=headers,
+                files={"file": ("bulk.ndjson", body.encode(), "application/x-ndjson")},
+            )
+        results.append(await drive(f"api POST /bulk/import x500 [{zone}]", import_batch, HEAVY_RUNS, 1))
+    return results
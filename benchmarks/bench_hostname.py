@@ -0,0 +1,47 @@
+"""Microbenchmarks for hostname validation and normalization.
+
+Compares app.utils.hostname_utils with the implementations it replaced:
+
+    python -m benchmarks.bench_hostname
+"""
+import re
+import timeit
+from app.utils import hostname_utils
+
+NAMES = [f"host{i}.zone{i % 50}.example.com" for i in range(1000)]
+INVALID = ["-bad.example.com", "bad..example.com", "under_score.example.com"]
+
+def legacy_is_regex_hostname(hostname: str) -> bool:
+    if len(hostname) > 253:
+        return False
+
+    pattern = r"^(?=.{1,253}$)(?!-)[A-Za-z0-9]([A-Za-z0-9\-]{0,61}[A-Za-z0-9])?(?:\.(?!-)[A-Za-z0-9]([A-Za-z0-9\-]{0,61}[A-Za-z0-9])?)*$"
+    return re.match(pattern, hostname) is not None
+
+def legacy_validate_hostname_or_raise(v: str, field_name: str = "value") -> str:
+    ip_pattern = r"^\d{1,3}(\.\d{1,3}){3}$"
+    if re.match(ip_pattern, v):
+        raise ValueError(f"{field_name} must be a hostname, not an IP address")
+    return v
+
+def legacy_normalize(value: str) -> str:
+    return value.strip('"').lower()
+
+def run(label, fn, names, number):
+    seconds = timeit.timeit(lambda: [fn(name) for name in names], number=number)
+    per_call = seconds / (number * len(names)) * 1e9
+    print(f"{label:<40} {per_call:8.0f} ns/call")
+
+def main(number: int = 200):
+    names = NAMES + INVALID
+    run("legacy is_regex_hostname", legacy_is_regex_hostname, names, number)
+    run("is_regex_hostname (memoized)", hostname_utils.is_regex_hostname, names, number)
+    run("is_regex_hostname (cold)", hostname_utils.is_regex_hostname.__wrapped__, names, number)
+    run("legacy validate_hostname_or_raise", legacy_validate_hostname_or_raise, names, number)
+    run("validate_hostname_or_raise", hostname_utils.validate_hostname_or_raise, names, number)
+    run("legacy .strip('\"').lower()", legacy_normalize, names, number)
+    run("normalize_hostname (memoized)", hostname_utils.normalize_hostname, names, number)
+    run("normalize_hostname (cold)", hostname_utils.normalize_hostname.__wrapped__, names, number)
+
+if __name__ == "__main__":
+    main()
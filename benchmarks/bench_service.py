@@ -0,0 +1,95 @@
+import io
+import json
+import sys
+import time
+from benchmarks.bench_api import HEAVY_RUNS
+from benchmarks.stats import BenchResult
+from app.auth.rate_limiter import LocalBucketStore, Rate, RateLimiter
+from app.core.config import settings
+from app.services.bulk_handler import bulk_import, export_dns_records
+from app.services.cname_chain import fetch_chain_records
+from app.services.resolver import resolve_hostname, resolve_hostnames
+from app.storage.snapshot import ZoneSnapshot, zone_snapshot
+
+class _Upload:
+    """The part of UploadFile that bulk_import reads."""
+
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._buffer.read(size)
+
+async def timed(name: str, calls, count: int) -> BenchResult:
+    result = BenchResult(name)
+    started = time.perf_counter()
+    for i in range(count):
+        call_started = time.perf_counter()
+        await calls(i)
+        result.latencies.append(time.perf_counter() - call_started)
+    result.seconds = time.perf_counter() - started
+    return result
+
+async def run_service_benchmarks(session_factory, zone: str, names: list[str], requests: int, clear_caches):
+    """Call the service layer directly, without HTTP, on one session per benchmark."""
+    results = []
+    count = min(requests, len(names))
+    async with session_factory() as db:
+        results.append(await timed(
+            f"svc fetch_chain_records [{zone}]",
+            lambda i: fetch_chain_records(names[i], db), count,
+        ))
+        await clear_caches()
+        results.append(await timed(
+            f"svc resolve_hostname cold [{zone}]",
+            lambda i: resolve_hostname(names[i], db), count,
+        ))
+        results.append(await timed(
+            f"svc resolve_hostname warm [{zone}]",
+            lambda i: resolve_hostname(names[i % 100], db), count,
+        ))
+        await clear_caches()
+        batches = [names[start:start + 100] for start in range(0, len(names), 100)]
+        results.append(await timed(
+            f"svc resolve_hostnames x100 [{zone}]",
+            lambda i: resolve_hostnames(batches[i % len(batches)], db), min(len(batches), max(count // 100, 1)),
+        ))
+
+        async def import_batch(i):
+            body = "\n".join(
+                json.dumps({"hostname": f"svc{i}-{n}.{zone}.bench", "type": "A", "value": [f"10.98.{i % 250}.{n % 250 + 1}"]})
+                for n in range(500)
+            )
+            await bulk_import(_Upload(body.encode()), db)
+        results.append(await timed(f"svc bulk_import x500 [{zone}]", import_batch, HEAVY_RUNS))
+
+    snapshot = ZoneSnapshot()
+    results.append(await timed(f"svc snapshot load [{zone}]", lambda i: snapshot.load(session_factory), HEAVY_RUNS))
+    stats = snapshot.stats()
+    print(
+        f"snapshot [{zone}]: {stats['records']} records, ~{stats['approx_bytes'] / 2**20:.1f} MiB, "
+        f"~{stats['bytes_per_million_records'] / 2**20:.0f} MiB per million records",
+        file=sys.stderr,
+    )
+    await zone_snapshot.load(session_factory)
+    try:
+        results.append(await timed(
+            f"svc resolve_hostname snapshot [{zone}]",
+            lambda i: resolve_hostname(names[i], None), count,
+        ))
+    finally:
+        zone_snapshot.reset()
+
+    async def export_all(i):
+        async for _ in export_dns_records(session_factory, format="ndjson"):
+            pass
+    results.append(await timed(f"svc export_dns_records [{zone}]", export_all, HEAVY_RUNS))
+
+    # The limiter's own cost per request, spread over 256 clients so leases keep being renewed
+    limiter = RateLimiter(LocalBucketStore(), settings.RATE_LIMIT_PREBUDGET, settings.RATE_LIMIT_LEASE_SECONDS)
+    rate = Rate("6000/minute")
+    results.append(await timed(
+        f"svc rate limiter hit [{zone}]",
+        lambda i: limiter.hit(f"read:ip:10.0.{i % 256}.1", rate), max(count, 1000),
+    ))
+    return results
@@ -0,0 +1,112 @@
+"""Benchmark suite for the HTTP API and the service layer.
+
+Seeds a throwaway SQLite database with each zone shape, drives the app in-process
+through httpx and calls the services directly, then reports p50/p99 latency and
+requests/sec. Runs offline: Redis is replaced by fakeredis unless --redis-url is given.
+
+    python -m benchmarks.run                      # compare against benchmarks/baseline.json
+    python -m benchmarks.run --shape deep --requests 500
+    python -m benchmarks.run --save-baseline --repeat 3   # record a new baseline
+
+Baselines are only comparable on the machine that recorded them.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shape", action="append", choices=["wide", "deep", "fat"],
+                        help="zone shape to run (repeatable, default: all)")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per API benchmark")
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent in-process clients")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed p50 increase against the baseline (default 50%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="ignore p50 increases smaller than this many milliseconds")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="run the suite this many times and report each benchmark's median run")
+    parser.add_argument("--redis-url", help="use this Redis server instead of fakeredis")
+    return parser.parse_args(argv)
+
+def configure_environment(args, workdir: str):
+    # Settings are read at import time, so this has to run before the app is imported
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir}/bench.db"
+    os.environ["TESTING"] = "1"
+    os.environ.setdefault("API_KEY", "supersecret")
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    # Run from the scratch directory so the app's log file stays out of the source tree;
+    # settings expects a .env file in the working directory.
+    Path(workdir, ".env").touch()
+    os.chdir(workdir)
+
+async def run(args) -> int:
+    from sqlalchemy import delete
+    from app.main import app
+    from app.auth.rate_limiter import limiter
+    from app.models.record_db import DNSRecord
+    from app.storage import redis as redis_storage
+    from app.storage.db import AsyncSessionLocal, init_db
+    from app.storage.resolution_cache import resolution_cache
+    from benchmarks.bench_api import run_api_benchmarks
+    from benchmarks.bench_service import run_service_benchmarks
+    from benchmarks.stats import load_baseline, median_run, print_report, regressions, save_baseline
+    from benchmarks.zones import SHAPES, seed_zone
+
+    logging.disable(logging.WARNING)
+    limiter.enabled = False
+    if not args.redis_url:
+        import fakeredis.aioredis
+        redis_storage.redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+    async def clear_caches():
+        resolution_cache.clear()
+        await redis_storage.redis_client.flushdb()
+
+    await init_db()
+    runs = {}
+    for _ in range(args.repeat):
+        for zone in args.shape or list(SHAPES):
+            async with AsyncSessionLocal() as db:
+                await db.execute(delete(DNSRecord))
+                await db.commit()
+            names = await seed_zone(AsyncSessionLocal, zone, SHAPES[zone])
+            print(f"seeded zone {zone!r}: {len(names)} query names", file=sys.stderr)
+            for result in (
+                await run_api_benchmarks(app, zone, names, args.requests, args.concurrency, clear_caches)
+                + await run_service_benchmarks(AsyncSessionLocal, zone, names, args.requests, clear_caches)
+            ):
+                runs.setdefault(result.name, []).append(result)
+    results = [median_run(name_runs) for name_runs in runs.values()]
+
+    baseline = load_baseline(args.baseline)
+    print_report(results, baseline)
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    found = regressions(results, baseline, args.tolerance, args.min_delta_ms)
+    for line in found:
+        print(f"REGRESSION {line}")
+    return 1 if found else 0
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    args.baseline = args.baseline.resolve()
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    with tempfile.TemporaryDirectory(prefix="dns-bench-") as workdir:
+        configure_environment(args, workdir)
+        return asyncio.run(run(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
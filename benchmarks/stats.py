@@ -0,0 +1,87 @@
+import json
+import math
+from dataclasses import dataclass, field
+
+@dataclass
+class BenchResult:
+    name: str
+    seconds: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def p50(self) -> float:
+        return percentile(self.latencies, 50)
+
+    @property
+    def p99(self) -> float:
+        return percentile(self.latencies, 99)
+
+    @property
+    def rps(self) -> float:
+        return self.count / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "p50_ms": round(self.p50 * 1000, 3),
+            "p99_ms": round(self.p99 * 1000, 3),
+            "rps": round(self.rps, 1),
+        }
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+def median_run(runs: list[BenchResult]) -> BenchResult:
+    return sorted(runs, key=lambda r: r.p50)[len(runs) // 2]
+
+def load_baseline(path) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_baseline(path, results: list[BenchResult]):
+    with open(path, "w") as f:
+        json.dump({r.name: r.summary() for r in results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def regressions(results: list[BenchResult], baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    """Benchmarks whose p50 rose by more than `tolerance` (and at least min_delta_ms) against the baseline.
+
+    The absolute floor keeps sub-millisecond benchmarks from flagging scheduler noise."""
+    found = []
+    for result in results:
+        base = baseline.get(result.name)
+        if not base:
+            continue
+        current = result.summary()
+        slower = current["p50_ms"] - base["p50_ms"]
+        if current["p50_ms"] > base["p50_ms"] * (1 + tolerance) and slower >= min_delta_ms:
+            found.append(f"{result.name}: p50 {current['p50_ms']}ms vs baseline {base['p50_ms']}ms")
+        if current["errors"] > base.get("errors", 0):
+            found.append(f"{result.name}: {current['errors']} errors vs baseline {base.get('errors', 0)}")
+    return found
+
+def print_report(results: list[BenchResult], baseline: dict):
+    print(f"{'benchmark':<46} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>10} {'vs base p50':>12}")
+    for result in results:
+        summary = result.summary()
+        base = baseline.get(result.name)
+        delta = f"{summary['p50_ms'] / base['p50_ms'] - 1:+.0%}" if base and base["p50_ms"] else "-"
+        print(
+            f"{result.name:<46} {summary['count']:>7} {summary['p50_ms']:>9.3f} "
+            f"{summary['p99_ms']:>9.3f} {summary['rps']:>10.1f} {delta:>12}"
+            + (f"  ({summary['errors']} errors)" if summary["errors"] else "")
+        )
@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+from pydantic import TypeAdapter
+from app.models.record_db import DNSRecord
+from app.models.record_schema import DNSRecordInput
+from app.services.CRUD import new_record_rows
+from app.storage.db import dialect_insert
+
+SEED_CHUNK_SIZE = 1000
+
+@dataclass
+class ZoneShape:
+    hosts: int
+    chain_depth: int = 0   # CNAMEs in front of each host
+    addresses: int = 1     # A addresses per host, at most 254
+
+SHAPES = {
+    "wide": ZoneShape(hosts=2000),
+    "deep": ZoneShape(hosts=200, chain_depth=8),
+    "fat": ZoneShape(hosts=100, addresses=64),
+}
+
+def zone_items(name: str, shape: ZoneShape) -> tuple[list[dict], list[str]]:
+    """Records for a zone in bulk import format, and the names a client would query."""
+    items = []
+    queried = []
+    for i in range(shape.hosts):
+        host = f"h{i}.{name}.bench"
+        items.append({
+            "hostname": host,
+            "type": "A",
+            "value": [f"10.{i // 250 % 250}.{i % 250}.{a + 1}" for a in range(shape.addresses)],
+            "ttl_seconds": 3600,
+        })
+        target = host
+        for depth in range(shape.chain_depth):
+            alias = f"c{depth}-h{i}.{name}.bench"
+            items.append({"hostname": alias, "type": "CNAME", "value": target, "ttl_seconds": 3600})
+            target = alias
+        queried.append(target)
+    return items, queried
+
+async def seed_zone(session_factory, name: str, shape: ZoneShape) -> list[str]:
+    """Write a zone straight to the database and return its query names."""
+    adapter = TypeAdapter(DNSRecordInput)
+    items, queried = zone_items(name, shape)
+    rows = [row for item in items for row in new_record_rows(adapter.validate_python(item))]
+    async with session_factory() as db:
+        statement = dialect_insert(db, DNSRecord.__table__).on_conflict_do_nothing()
+        for start in range(0, len(rows), SEED_CHUNK_SIZE):
+            await db.execute(statement, rows[start:start + SEED_CHUNK_SIZE])
+        await db.commit()
+    return queried
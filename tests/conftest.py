@@ -1,9 +1,12 @@
 # tests/conftest.py
 
 import pytest
+from datetime import datetime
 from httpx import AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
 from app.main import app
+from app.models.record_db import Base, DNSRecord
 from app.storage.db import get_db, AsyncSessionLocal
 
 # Override DB dependency
@@ -19,3 +22,31 @@ def override_get_db():
 async def client(override_get_db):
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
+
+# A private in-memory SQLite database, for tests that need their own data
+@pytest.fixture
+async def sqlite_engine():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    yield engine
+    await engine.dispose()
+
+# `await seeded_session(rows)` creates the schema in sqlite_engine, stores the rows and
+# returns a session factory. Rows are DNSRecord objects or (hostname, type, value)
+# tuples, which get a 300s TTL starting now.
+@pytest.fixture
+def seeded_session(sqlite_engine):
+    async def seed(rows=()):
+        async with sqlite_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(sqlite_engine, expire_on_commit=False)
+        created = datetime.utcnow()
+        async with factory() as db:
+            for row in rows:
+                if isinstance(row, tuple):
+                    hostname, record_type, value = row
+                    row = DNSRecord(hostname=hostname, type=record_type, value=value,
+                                    ttl_seconds=300, timestamp_created=created)
+                db.add(row)
+            await db.commit()
+        return factory
+    return seed
@@ -1,5 +1,11 @@
 import pytest
 import asyncio
+from fastapi import HTTPException
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from app.models.record_db import DNSRecord
+from app.models.record_schema import DNSRecordInput
+from app.services.CRUD import insert_new_record
 
 HEADERS = {"X-API-Key": "supersecret"}
 
@@ -97,3 +103,22 @@ async def test_add_dns_record_cases(client):
         "ttl_seconds": 300
     }, headers=HEADERS)
     assert response.status_code == 409
+
+@pytest.mark.asyncio
+async def test_duplicate_address_is_rejected_by_the_unique_index(seeded_session):
+    adapter = TypeAdapter(DNSRecordInput)
+    async with (await seeded_session())() as db:
+        ids = await insert_new_record(adapter.validate_python(
+            {"hostname": "race.com", "type": "A", "value": ["1.1.1.1", "2.2.2.2"]}
+        ), db)
+        assert len(ids) == 2
+
+        # No duplicate pre-check here: the insert itself has to refuse the overlap
+        with pytest.raises(HTTPException) as exc:
+            await insert_new_record(adapter.validate_python(
+                {"hostname": "RACE.com", "type": "A", "value": ["3.3.3.3", "2.2.2.2"]}
+            ), db)
+        assert exc.value.status_code == 409
+
+        addresses = (await db.execute(select(DNSRecord.address).order_by(DNSRecord.address))).scalars().all()
+        assert addresses == ["1.1.1.1", "2.2.2.2"]
@@ -0,0 +1,80 @@
+import pytest
+import app.auth.api_key as api_key_module
+from app.auth.api_key import ApiKeyCache, api_key_cache, authenticate, hash_key
+
+ADMIN = {"X-API-Key": "supersecret"}
+
+@pytest.mark.asyncio
+async def test_issue_use_and_revoke_scoped_keys(client):
+    api_key_cache.clear()
+    created = await client.post("/api/keys/", json={"name": "tenant-ro", "scopes": ["read"]}, headers=ADMIN)
+    assert created.status_code == 200
+    body = created.json()
+    key = {"X-API-Key": body["key"]}
+    assert body["prefix"] == body["key"][:8] and body["scopes"] == ["read"]
+
+    listed = await client.get("/api/keys/", headers=ADMIN)
+    assert "key" not in listed.json()["keys"][-1]
+    duplicate = await client.post("/api/keys/", json={"name": "tenant-ro"}, headers=ADMIN)
+    assert duplicate.status_code == 409
+
+    read = await client.get("/api/dns/nothing-here-ro.com", headers=key)
+    write = await client.post("/api/dns/", json={
+        "hostname": "tenant-ro.com", "type": "A", "value": ["10.4.4.4"], "ttl_seconds": 300,
+    }, headers=key)
+    admin = await client.get("/api/keys/", headers=key)
+    assert read.status_code == 404
+    assert write.status_code == 403 and "write" in write.json()["detail"]
+    assert admin.status_code == 403
+
+    revoked = await client.delete(f"/api/keys/{body['id']}", headers=ADMIN)
+    assert revoked.json()["revoked_at"] is not None
+    assert (await client.get("/api/dns/nothing-here-ro.com", headers=key)).status_code == 403
+
+@pytest.mark.asyncio
+async def test_verified_keys_are_served_from_cache(client, monkeypatch):
+    api_key_cache.clear()
+    created = (await client.post("/api/keys/", json={"name": "tenant-rw", "scopes": ["read", "write"]}, headers=ADMIN)).json()
+    assert (await authenticate(created["key"])).name == "tenant-rw"
+    assert await authenticate("dns_not-a-key") is None
+
+    # Both answers are cached, so the database is no longer consulted
+    monkeypatch.setattr(api_key_module, "AsyncSessionLocal", None)
+    assert (await authenticate(created["key"])).scopes == {"read", "write"}
+    assert await authenticate("dns_not-a-key") is None
+    assert (await authenticate("supersecret")).name == "legacy"
+
+@pytest.mark.asyncio
+async def test_higher_scopes_include_lower_ones(client):
+    api_key_cache.clear()
+    writer = {"X-API-Key": (await client.post("/api/keys/", json={"name": "tenant-w", "scopes": ["write"]}, headers=ADMIN)).json()["key"]}
+    admin = {"X-API-Key": (await client.post("/api/keys/", json={"name": "tenant-admin", "scopes": ["admin"]}, headers=ADMIN)).json()["key"]}
+
+    for name, key in [("writer", writer), ("admin", admin)]:
+        added = await client.post("/api/dns/", json={
+            "hostname": f"tenant-{name}.com", "type": "A", "value": ["10.5.5.5"], "ttl_seconds": 300,
+        }, headers=key)
+        assert added.status_code == 200
+        assert (await client.get(f"/api/dns/tenant-{name}.com", headers=key)).status_code == 200
+    assert (await client.get("/api/keys/", headers=writer)).status_code == 403
+    assert (await client.get("/api/keys/", headers=admin)).status_code == 200
+
+def test_cache_entries_expire():
+    cache = ApiKeyCache(ttl=0, max_entries=10)
+    cache.put(hash_key("a"), None)
+    assert cache.get(hash_key("a")) == (False, None)
+
+def test_unknown_keys_cannot_evict_valid_ones():
+    cache = ApiKeyCache(ttl=60, max_entries=2, max_missing=2)
+    cache.put(hash_key("a"), "caller-a")
+    cache.put(hash_key("b"), "caller-b")
+    for i in range(10):
+        cache.put(hash_key(f"garbage-{i}"), None)
+
+    assert cache.get(hash_key("a")) == (True, "caller-a")
+    assert cache.get(hash_key("garbage-9")) == (True, None)
+    assert cache.get(hash_key("garbage-0")) == (False, None)
+    # Full caches evict the least recently used entry, not everything
+    cache.put(hash_key("c"), "caller-c")
+    assert cache.get(hash_key("a")) == (True, "caller-a")
+    assert cache.get(hash_key("b")) == (False, None)
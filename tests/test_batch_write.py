@@ -0,0 +1,57 @@
+import pytest
+import uuid
+
+HEADERS = {"X-API-Key": "supersecret"}
+
+def add(hostname, record_type, value):
+    return {"action": "add", "record": {"hostname": hostname, "type": record_type, "value": value, "ttl_seconds": 300}}
+
+@pytest.mark.asyncio
+async def test_batch_applies_adds_and_deletes_together(client):
+    zone = f"batch-{uuid.uuid4().hex[:8]}.com"
+    await client.post("/api/dns/", json={
+        "hostname": f"old.{zone}", "type": "A", "value": ["10.0.0.1"], "ttl_seconds": 300,
+    }, headers=HEADERS)
+    # Cached before the batch, so the batch has to invalidate it
+    assert (await client.get(f"/api/dns/old.{zone}", headers=HEADERS)).status_code == 200
+
+    response = await client.post("/api/dns/batch", json={"operations": [
+        add(f"new.{zone}", "A", ["10.0.0.2"]),
+        # Checked against the add staged just before it
+        add(f"www.{zone}", "CNAME", f"new.{zone}"),
+        {"action": "delete", "hostname": f"old.{zone}", "type": "A", "value": "10.0.0.1"},
+    ]}, headers=HEADERS)
+
+    assert response.status_code == 200
+    assert response.json()["hostnames"] == [f"new.{zone}", f"old.{zone}", f"www.{zone}"]
+    resolved = await client.get(f"/api/dns/www.{zone}", headers=HEADERS)
+    assert resolved.json()["resolvedIps"] == ["10.0.0.2"]
+    assert (await client.get(f"/api/dns/old.{zone}", headers=HEADERS)).status_code == 404
+
+@pytest.mark.asyncio
+async def test_failing_operation_rolls_back_the_whole_batch(client):
+    zone = f"batch-{uuid.uuid4().hex[:8]}.com"
+    response = await client.post("/api/dns/batch", json={"operations": [
+        add(f"a.{zone}", "A", ["10.0.0.1"]),
+        add(f"b.{zone}", "CNAME", f"c.{zone}"),
+        add(f"c.{zone}", "CNAME", f"b.{zone}"),
+    ]}, headers=HEADERS)
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["index"] == 2
+    for name in ("a", "b"):
+        listed = await client.get(f"/api/dns/{name}.{zone}/records", headers=HEADERS)
+        assert listed.status_code == 404
+
+    missing = await client.post("/api/dns/batch", json={"operations": [
+        add(f"a.{zone}", "A", ["10.0.0.1"]),
+        {"action": "delete", "hostname": f"a.{zone}", "type": "A", "value": "10.9.9.9"},
+    ]}, headers=HEADERS)
+    assert missing.status_code == 404
+    assert missing.json()["detail"]["index"] == 1
+    assert (await client.get(f"/api/dns/a.{zone}", headers=HEADERS)).status_code == 404
+
+@pytest.mark.asyncio
+async def test_batch_must_have_operations(client):
+    empty = await client.post("/api/dns/batch", json={"operations": []}, headers=HEADERS)
+    assert empty.status_code == 422
@@ -59,3 +59,153 @@ async def test_bulk_import_add_and_delete(client):
     assert "errors" in result
     assert result["records_imported"] == 2  # 2 valid records: A + CNAME
     assert result["records_skipped"] >= 1   # 1 skipped due to delete or invalid format
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_ndjson_checks_records_within_upload(client):
+    hostname = random_hostname("ndjson")
+    alias = random_hostname("ndjson-alias")
+    lines = [
+        {"hostname": hostname, "type": "A", "value": ["2.2.2.2"], "ttl_seconds": 300},
+        # Duplicate of the line above, only visible within the same upload
+        {"hostname": hostname, "type": "A", "value": ["2.2.2.2"], "ttl_seconds": 300},
+        {"hostname": alias, "type": "CNAME", "value": hostname, "ttl_seconds": 300},
+        {"hostname": hostname, "type": "A", "value": "2.2.2.2", "action": "delete"},
+        {"hostname": "bad_host!", "type": "A", "value": ["3.3.3.3"]},
+    ]
+    file_content = "\n".join(json.dumps(line) for line in lines)
+    file = io.BytesIO(file_content.encode("utf-8"))
+
+    response = await client.post(
+        "/api/dns/bulk/import",
+        headers=HEADERS,
+        files={"file": ("bulk.ndjson", file, "application/x-ndjson")},
+    )
+
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["records_imported"] == 2
+    assert result["records_skipped"] == 3
+    assert [e["index"] for e in result["errors"]] == [2, 5]
+
+    records = await client.get(f"/api/dns/{hostname}/records", headers=HEADERS)
+    assert records.status_code == 404
+
+async def upload(client, records):
+    file = io.BytesIO(json.dumps(records).encode("utf-8"))
+    response = await client.post(
+        "/api/dns/bulk/import",
+        headers=HEADERS,
+        files={"file": ("bulk.json", file, "application/json")},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+@pytest.mark.asyncio
+async def test_bulk_import_reports_rows_dropped_by_a_concurrent_writer(client, monkeypatch):
+    from app.services import bulk_handler
+
+    hostname = random_hostname("race")
+    await client.post("/api/dns/", json={
+        "hostname": hostname, "type": "A", "value": ["4.4.4.4"], "ttl_seconds": 300,
+    }, headers=HEADERS)
+
+    # Hide the existing row from the pre-check, as if another writer added it meanwhile
+    async def nothing_existing(hostnames, db):
+        return {name: [] for name in hostnames}
+    monkeypatch.setattr(bulk_handler, "_load_existing", nothing_existing)
+
+    result = await upload(client, [
+        {"hostname": hostname, "type": "A", "value": ["4.4.4.4"], "ttl_seconds": 300},
+        {"hostname": random_hostname("race"), "type": "A", "value": ["5.5.5.5"], "ttl_seconds": 300},
+    ])
+    assert result["records_imported"] == 1
+    assert result["records_skipped"] == 1
+    assert result["errors"] == [{"index": 1, "error": "Duplicate address already exists: 4.4.4.4"}]
+
+@pytest.mark.asyncio
+async def test_bulk_import_item_with_a_conflicting_address_is_not_half_written(client, monkeypatch):
+    from app.services import bulk_handler
+
+    hostname = random_hostname("partial")
+    await client.post("/api/dns/", json={
+        "hostname": hostname, "type": "A", "value": ["4.4.4.4"], "ttl_seconds": 300,
+    }, headers=HEADERS)
+
+    async def nothing_existing(hostnames, db):
+        return {name: [] for name in hostnames}
+    monkeypatch.setattr(bulk_handler, "_load_existing", nothing_existing)
+
+    result = await upload(client, [
+        {"hostname": hostname, "type": "A", "value": ["4.4.4.5", "4.4.4.4", "4.4.4.6"], "ttl_seconds": 300},
+    ])
+    records = (await client.get(f"/api/dns/{hostname}/records", headers=HEADERS)).json()["records"]
+
+    assert (result["records_imported"], result["records_skipped"]) == (0, 1)
+    assert result["errors"] == [{"index": 1, "error": "Duplicate address already exists: 4.4.4.4"}]
+    assert records == [{"type": "A", "value": "4.4.4.4"}]
+
+@pytest.mark.asyncio
+async def test_bulk_delete_takes_a_list_of_addresses(client):
+    hostname = random_hostname("multi")
+    await client.post("/api/dns/", json={
+        "hostname": hostname, "type": "A", "value": ["6.6.6.1", "6.6.6.2", "6.6.6.3"], "ttl_seconds": 300,
+    }, headers=HEADERS)
+
+    result = await upload(client, [
+        # One address is missing, so none of them is deleted
+        {"hostname": hostname, "type": "A", "value": ["6.6.6.1", "6.6.6.9"], "action": "delete"},
+        {"hostname": hostname, "type": "A", "value": ["6.6.6.1", "6.6.6.2"], "action": "delete"},
+    ])
+    assert [e["index"] for e in result["errors"]] == [1]
+
+    listed = await client.get(f"/api/dns/{hostname}/records", headers=HEADERS)
+    assert listed.json()["records"] == [{"type": "A", "value": "6.6.6.3"}]
+
+@pytest.mark.asyncio
+async def test_bulk_import_rejects_non_list(client):
+    file = io.BytesIO(b'"hello"')
+    response = await client.post(
+        "/api/dns/bulk/import",
+        headers=HEADERS,
+        files={"file": ("bulk.json", file, "application/json")},
+    )
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_bulk_export_streams_with_prefix_and_keyset_pages(client):
+    prefix = random_hostname("export").removesuffix(".com")
+    for i in range(3):
+        response = await client.post("/api/dns/", json={
+            "hostname": f"{prefix}-{i}.com",
+            "type": "A",
+            "value": [f"10.9.9.{i}"],
+            "ttl_seconds": 300
+        }, headers=HEADERS)
+        assert response.status_code == 200
+
+    ndjson = await client.get(f"/api/dns/bulk/export?format=ndjson&prefix={prefix}", headers=HEADERS)
+    assert ndjson.status_code == 200
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert [r["hostname"] for r in rows] == [f"{prefix}-{i}.com" for i in range(3)]
+
+    first_page = await client.get(f"/api/dns/bulk/export?prefix={prefix}&limit=2", headers=HEADERS)
+    page = first_page.json()
+    assert len(page) == 2
+    next_page = await client.get(
+        f"/api/dns/bulk/export?prefix={prefix}&limit=2&after={page[-1]['id']}", headers=HEADERS
+    )
+    assert [r["hostname"] for r in next_page.json()] == [f"{prefix}-2.com"]
+
+@pytest.mark.asyncio
+async def test_bulk_export_prefix_keeps_its_trailing_dot(client):
+    label = random_hostname("www").removesuffix(".com")
+    for hostname in [f"{label}.example.com", f"{label}foo.com"]:
+        response = await client.post("/api/dns/", json={
+            "hostname": hostname, "type": "A", "value": ["10.8.8.8"], "ttl_seconds": 300,
+        }, headers=HEADERS)
+        assert response.status_code == 200
+
+    exported = await client.get(f"/api/dns/bulk/export?prefix={label.upper()}.", headers=HEADERS)
+    assert [r["hostname"] for r in exported.json()] == [f"{label}.example.com"]
@@ -0,0 +1,76 @@
+import pytest
+from datetime import datetime
+from fastapi import HTTPException
+from app.models.record_db import DNSRecord, RecordType
+from app.services.cname_chain import fetch_cname_chain, fetch_chain_records
+from app.services.validator import check_cname_loop
+from app.utils.record_utils import has_cname_cycle
+
+# These run against in-memory SQLite so the recursive CTE can be checked without Postgres.
+@pytest.fixture
+async def sqlite_db(seeded_session):
+    async with (await seeded_session())() as session:
+        yield session
+
+async def add_cnames(db, *pairs):
+    for hostname, target in pairs:
+        db.add(DNSRecord(
+            hostname=hostname,
+            type=RecordType.CNAME,
+            value=target,
+            ttl_seconds=300,
+            timestamp_created=datetime.utcnow(),
+        ))
+    await db.commit()
+
+@pytest.mark.asyncio
+async def test_chain_is_followed_in_order(sqlite_db):
+    await add_cnames(sqlite_db, ("a.com", "b.com"), ("b.com", "C.com"), ("c.com", "d.com"))
+
+    chain = await fetch_cname_chain("a.com", sqlite_db)
+
+    assert chain.names == ["a.com", "b.com", "c.com", "d.com"]
+    assert not chain.loop
+    assert not chain.depth_exceeded
+
+@pytest.mark.asyncio
+async def test_loop_is_detected(sqlite_db):
+    await add_cnames(sqlite_db, ("x.com", "y.com"), ("y.com", "z.com"), ("z.com", "x.com"))
+
+    chain = await fetch_cname_chain("x.com", sqlite_db)
+
+    assert chain.loop
+    assert chain.names == ["x.com", "y.com", "z.com"]
+    assert await has_cname_cycle("w.com", "x.com", sqlite_db) is False
+    assert await has_cname_cycle("z.com", "x.com", sqlite_db) is True
+    with pytest.raises(HTTPException):
+        await check_cname_loop("y.com", "z.com", sqlite_db)
+
+@pytest.mark.asyncio
+async def test_depth_limit_is_detected(sqlite_db):
+    await add_cnames(sqlite_db, *[(f"h{i}.com", f"h{i + 1}.com") for i in range(6)])
+
+    chain = await fetch_cname_chain("h0.com", sqlite_db, max_depth=3)
+
+    assert chain.depth_exceeded
+    assert chain.names == ["h0.com", "h1.com", "h2.com", "h3.com"]
+    with pytest.raises(HTTPException) as exc:
+        await check_cname_loop("start.com", "h0.com", sqlite_db, max_depth=3)
+    assert exc.value.detail == "CNAME chaining exceeds allowed depth"
+
+@pytest.mark.asyncio
+async def test_chain_records_are_loaded_together(sqlite_db):
+    await add_cnames(sqlite_db, ("www.site.com", "edge.site.com"))
+    sqlite_db.add(DNSRecord(
+        hostname="edge.site.com",
+        type=RecordType.A,
+        value=["1.2.3.4"],
+        ttl_seconds=300,
+        timestamp_created=datetime.utcnow(),
+    ))
+    await sqlite_db.commit()
+
+    records = await fetch_chain_records("www.site.com", sqlite_db)
+
+    assert set(records) == {"www.site.com", "edge.site.com"}
+    assert records["edge.site.com"][0].type == RecordType.A
@@ -43,3 +43,20 @@ async def test_delete_dns_records(client):
         headers=HEADERS
     )
     assert not_found.status_code == 404
+
+@pytest.mark.asyncio
+async def test_delete_one_address_keeps_the_others(client):
+    hostname = f"delete-{uuid.uuid4().hex[:8]}.com"
+    response = await client.post("/api/dns/", json={
+        "hostname": hostname,
+        "type": "A",
+        "value": ["10.0.0.2", "10.0.0.3"],
+        "ttl_seconds": 300
+    }, headers=HEADERS)
+    assert response.status_code == 200
+
+    delete_response = await client.delete(f"/api/dns/{hostname}?type=A&value=10.0.0.2", headers=HEADERS)
+    assert delete_response.status_code == 200
+
+    listed = await client.get(f"/api/dns/{hostname}/records", headers=HEADERS)
+    assert [r["value"] for r in listed.json()["records"]] == ["10.0.0.3"]
@@ -0,0 +1,139 @@
+import pytest
+import asyncio
+import socket
+from app.models.record_db import RecordType
+from app.core.config import settings
+from app.services.dns_server import DNSServer
+from app.storage.resolution_cache import resolution_cache
+from app.utils.dns_wire import (
+    FLAG_TC, RCODE_FORMERR, RCODE_NOERROR, RCODE_NXDOMAIN, RCODE_REFUSED, TYPE_A, TYPE_AAAA, TYPE_CNAME, TYPE_MX, TYPE_SOA, TYPE_TXT,
+    UINT16, ResourceRecord, decode_message, encode_query, encode_response,
+)
+
+@pytest.fixture
+async def dns_server(monkeypatch, seeded_session):
+    # Answers are cached; keep them from leaking between fixtures with the same names
+    monkeypatch.setattr(settings, "RESOLUTION_CACHE_REDIS", False)
+    resolution_cache.clear()
+    session_factory = await seeded_session([
+        ("www.example.com", RecordType.CNAME, "example.com"),
+        ("example.com", RecordType.A, ["1.2.3.4"]),
+        ("example.com", RecordType.A, ["5.6.7.8"]),
+        ("example.com", RecordType.MX, {"priority": 10, "host": "mail.example.com"}),
+        ("big.example.com", RecordType.TXT, ["x" * 200 for _ in range(5)]),
+    ])
+
+    server = DNSServer("127.0.0.1", 0, session_factory=session_factory, zones="example.com,example.co.uk")
+    await server.start()
+    yield server
+    await server.stop()
+
+async def udp_query(port, payload):
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    try:
+        await loop.sock_connect(sock, ("127.0.0.1", port))
+        await loop.sock_sendall(sock, payload)
+        return decode_message(await asyncio.wait_for(loop.sock_recv(sock, 65535), 5))
+    finally:
+        sock.close()
+
+async def tcp_query(port, payload):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(UINT16.pack(len(payload)) + payload)
+        await writer.drain()
+        size = UINT16.unpack(await reader.readexactly(2))[0]
+        return decode_message(await reader.readexactly(size))
+    finally:
+        writer.close()
+
+def test_wire_round_trip_with_compression():
+    raw_query = encode_query(7, "www.example.com", TYPE_A)
+    query = decode_message(raw_query)
+    answers = [
+        ResourceRecord("www.example.com", TYPE_CNAME, 60, "example.com"),
+        ResourceRecord("example.com", TYPE_A, 60, "1.2.3.4"),
+        ResourceRecord("example.com", TYPE_MX, 60, (10, "mail.example.com")),
+    ]
+
+    response = decode_message(encode_response(query, raw_query, RCODE_NOERROR, answers))
+
+    assert response.id == 7
+    assert response.questions[0].name == "www.example.com"
+    assert [(rr.name, rr.rdata) for rr in response.answers] == [
+        ("www.example.com", "example.com"),
+        ("example.com", "1.2.3.4"),
+        ("example.com", (10, "mail.example.com")),
+    ]
+
+@pytest.mark.asyncio
+async def test_udp_follows_cname(dns_server):
+    response = await udp_query(dns_server.udp_port, encode_query(1, "WWW.example.com", TYPE_A))
+
+    assert response.rcode == RCODE_NOERROR
+    assert [(rr.rtype, rr.rdata) for rr in response.answers] == [
+        (TYPE_CNAME, "example.com"), (TYPE_A, "1.2.3.4"), (TYPE_A, "5.6.7.8"),
+    ]
+    assert all(0 < rr.ttl <= 300 for rr in response.answers)
+
+@pytest.mark.asyncio
+async def test_mx_and_nxdomain(dns_server):
+    mx = await udp_query(dns_server.udp_port, encode_query(2, "example.com", TYPE_MX))
+    missing = await udp_query(dns_server.udp_port, encode_query(3, "nope.example.com", TYPE_A))
+
+    assert [rr.rdata for rr in mx.answers] == [(10, "mail.example.com")]
+    assert missing.rcode == RCODE_NXDOMAIN
+    assert missing.answers == []
+    # Served from the resolution cache the second time
+    assert resolution_cache.get("example.com/MX") is not None
+
+@pytest.mark.asyncio
+async def test_negative_answers_carry_an_soa(dns_server):
+    missing = await udp_query(dns_server.udp_port, encode_query(5, "nope.example.com", TYPE_A))
+    no_data = await udp_query(dns_server.udp_port, encode_query(6, "www.example.com", TYPE_AAAA))
+
+    soa = missing.authority[0]
+    assert (soa.name, soa.rtype) == ("example.com", TYPE_SOA)
+    assert soa.rdata[:2] == ("ns.example.com", "hostmaster.example.com")
+    assert 0 < soa.ttl <= settings.NEGATIVE_TTL and soa.rdata[-1] == settings.NEGATIVE_TTL
+    assert no_data.rcode == RCODE_NOERROR
+    assert [(rr.rtype, rr.rdata) for rr in no_data.answers] == [(TYPE_CNAME, "example.com")]
+    assert [rr.rtype for rr in no_data.authority] == [TYPE_SOA]
+
+@pytest.mark.asyncio
+async def test_soa_comes_from_the_closest_configured_zone(dns_server):
+    missing = await udp_query(dns_server.udp_port, encode_query(9, "x.example.co.uk", TYPE_A))
+    outside = await udp_query(dns_server.udp_port, encode_query(10, "example.org", TYPE_A))
+
+    assert missing.rcode == RCODE_NXDOMAIN
+    assert [(rr.name, rr.rtype) for rr in missing.authority] == [("example.co.uk", TYPE_SOA)]
+    assert outside.rcode == RCODE_REFUSED
+
+def test_zone_is_required():
+    with pytest.raises(ValueError):
+        DNSServer("127.0.0.1", 0, zones="")
+
+@pytest.mark.asyncio
+async def test_non_ascii_name_gets_formerr(dns_server):
+    query = bytearray(encode_query(8, "abc.example.com", TYPE_A))
+    query[13] = 0xFF  # first byte of the first label
+    response = await udp_query(dns_server.udp_port, bytes(query))
+
+    assert response.id == 8
+    assert response.rcode == RCODE_FORMERR
+    # The question is echoed byte for byte
+    assert response.questions[0].name == "\ufffdbc.example.com"
+
+@pytest.mark.asyncio
+async def test_large_answer_truncates_over_udp_and_completes_over_tcp(dns_server):
+    query = encode_query(4, "big.example.com", TYPE_TXT)
+
+    over_udp = await udp_query(dns_server.udp_port, query)
+    over_tcp = await tcp_query(dns_server.tcp_port, query)
+
+    assert over_udp.flags & FLAG_TC
+    assert over_udp.answers == []
+    assert not over_tcp.flags & FLAG_TC
+    assert over_tcp.answers[0].rdata == ["x" * 200 for _ in range(5)]
@@ -0,0 +1,34 @@
+from app.utils.hostname_utils import is_regex_hostname, normalize_hostname, validate_hostname_or_raise
+import pytest
+
+def test_normalize_hostname_is_canonical():
+    assert normalize_hostname(' "WWW.Example.COM." ') == "www.example.com"
+    assert normalize_hostname("Bücher.de") == "xn--bcher-kva.de"
+
+@pytest.mark.parametrize("hostname, valid", [
+    ("example.com", True),
+    ("EXAMPLE.com", True),
+    ("a-b.c-d.example", True),
+    ("bücher.de", True),
+    ("x" * 63 + ".com", True),
+    ("x" * 64 + ".com", False),
+    ("-bad.com", False),
+    ("bad-.com", False),
+    ("bad..com", False),
+    ("under_score.com", False),
+    ("example.com\n", False),
+    ("", False),
+    (".".join(["a" * 60] * 5), False),
+    ("*.example.com", True),
+    ("a.*.example.com", False),
+    ("*", False),
+])
+def test_is_regex_hostname(hostname, valid):
+    assert is_regex_hostname(hostname) is valid
+
+def test_validate_hostname_or_raise_rejects_ips():
+    assert validate_hostname_or_raise("mail.example.com") == "mail.example.com"
+    with pytest.raises(ValueError):
+        validate_hostname_or_raise("10.0.0.1", "MX host")
+    with pytest.raises(ValueError):
+        validate_hostname_or_raise("*.example.com", "CNAME value")
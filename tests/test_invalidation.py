@@ -0,0 +1,84 @@
+import pytest
+import asyncio
+import time
+from redis.exceptions import RedisError
+from app.core.config import settings
+from app.storage.invalidation import InvalidationBus, LocalTransport, RedisTransport
+from app.storage.resolution_cache import ResolutionCache
+
+async def wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met")
+
+@pytest.mark.asyncio
+async def test_bulk_writes_reach_other_workers_in_few_messages():
+    transport = LocalTransport()
+    writer = InvalidationBus(transport, ResolutionCache(20000), flush_interval=0.05, max_batch=5000)
+    reader_cache = ResolutionCache(20000)
+    reader = InvalidationBus(transport, reader_cache, flush_interval=0.05, max_batch=5000)
+
+    names = [f"host{i}.example.com" for i in range(12000)]
+    for name in names:
+        reader_cache.put(name, ("resolved", [name]), time.time() + 300, [name])
+        writer.cache.put(name, ("resolved", [name]), time.time() + 300, [name])
+
+    tasks = [asyncio.create_task(bus.listen()) for bus in (writer, reader)]
+    await asyncio.sleep(0)
+    try:
+        for start in range(0, len(names), 100):
+            await writer.publish(names[start:start + 100])
+        await wait_for(lambda: len(reader_cache) == 0)
+
+        assert writer.messages_sent <= 3
+        # The writer evicts its own writes directly and skips its own messages
+        assert len(writer.cache) == 12000
+    finally:
+        for task in tasks:
+            task.cancel()
+
+@pytest.mark.asyncio
+async def test_redis_transport_round_trip():
+    cache = ResolutionCache(10)
+    cache.put("a.com", ("resolved", ["1.1.1.1"]), time.time() + 300, ["a.com"])
+    reader = InvalidationBus(RedisTransport("test_invalidations"), cache, flush_interval=0.01, max_batch=10)
+    writer = InvalidationBus(RedisTransport("test_invalidations"), ResolutionCache(10), flush_interval=0.01, max_batch=10)
+
+    task = asyncio.create_task(reader.listen())
+    try:
+        await asyncio.sleep(0.05)
+        await writer.publish(["a.com"])
+        await wait_for(lambda: len(cache) == 0)
+    finally:
+        task.cancel()
+
+class FlakyTransport(LocalTransport):
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    async def publish(self, message: str):
+        if self.failures:
+            self.failures -= 1
+            raise RedisError("connection lost")
+        await super().publish(message)
+
+@pytest.mark.asyncio
+async def test_unsent_invalidations_are_retried(monkeypatch):
+    monkeypatch.setattr(settings, "INVALIDATION_RETRY_INTERVAL", 0.02)
+    transport = FlakyTransport(failures=2)
+    writer = InvalidationBus(transport, ResolutionCache(10), flush_interval=0.01, max_batch=10)
+    reader_cache = ResolutionCache(10)
+    reader_cache.put("a.com", ("resolved", ["1.1.1.1"]), time.time() + 300, ["a.com"])
+    reader = InvalidationBus(transport, reader_cache, flush_interval=0.01, max_batch=10)
+
+    task = asyncio.create_task(reader.listen())
+    try:
+        await asyncio.sleep(0)
+        await writer.publish(["a.com"])
+        await wait_for(lambda: len(reader_cache) == 0)
+        assert transport.failures == 0 and writer.messages_sent == 1
+    finally:
+        task.cancel()
@@ -0,0 +1,42 @@
+import pytest
+import io
+import json
+from app.utils.json_stream import JSONStreamError, iter_json_records
+
+class AsyncBytesFile:
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._buffer.read(size)
+
+async def collect(data: bytes, read_size: int = 7):
+    return [item async for item in iter_json_records(AsyncBytesFile(data), read_size=read_size)]
+
+RECORDS = [
+    {"hostname": "a.com", "type": "A", "value": ["1.1.1.1"], "ttl_seconds": 300},
+    {"hostname": "b.com", "type": "TXT", "value": ["v=spf1 ~all, \"quoted\" ]"]},
+    {"hostname": "c.com", "type": "MX", "value": {"priority": 10, "host": "mx.c.com"}},
+]
+
+@pytest.mark.asyncio
+async def test_array_is_parsed_across_read_boundaries():
+    data = ("\ufeff" + json.dumps(RECORDS, indent=2)).encode("utf-8")
+    assert await collect(data) == RECORDS
+    assert await collect(b"[]") == []
+
+@pytest.mark.asyncio
+async def test_ndjson_is_parsed():
+    data = "\r\n".join(json.dumps(r) for r in RECORDS).encode("utf-8")
+    assert await collect(data) == RECORDS
+
+@pytest.mark.asyncio
+async def test_malformed_input_is_reported():
+    with pytest.raises(JSONStreamError, match="must be a list"):
+        await collect(b'"not records"')
+    with pytest.raises(JSONStreamError):
+        await collect(b'[{"hostname": "a.com"} {"hostname": "b.com"}]')
+    with pytest.raises(JSONStreamError):
+        await collect(b'[{"hostname": "a.com"},')
+    with pytest.raises(JSONStreamError, match="Trailing comma"):
+        await collect(b'[{"hostname": "a.com"},]')
@@ -0,0 +1,38 @@
+import json
+import logging
+import queue
+from app.core.logger import DroppingQueueHandler, JsonFormatter, SamplingFilter, parse_mapping
+
+def make_record(name="app.api.dns_routes", level=logging.INFO, msg="added %s", args=("a.com",)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+def test_parse_mapping():
+    assert parse_mapping("app.services=DEBUG, sqlalchemy.engine=warning,", str.upper) == {
+        "app.services": "DEBUG",
+        "sqlalchemy.engine": "WARNING",
+    }
+    assert parse_mapping("", float) == {}
+
+def test_sampling_uses_longest_prefix_and_keeps_warnings():
+    sampling = SamplingFilter({"app": 1.0, "app.api": 0.0})
+    assert not sampling.filter(make_record("app.api.dns_routes"))
+    assert sampling.filter(make_record("app.services.CRUD"))
+    assert sampling.filter(make_record("app.api.dns_routes", level=logging.WARNING))
+    assert sampling.filter(make_record("sqlalchemy.engine"))
+
+def test_queue_handler_merges_args_and_drops_when_full():
+    handler = DroppingQueueHandler(queue.Queue(1))
+    record = make_record()
+    handler.emit(record)
+    handler.emit(make_record())
+
+    queued = handler.queue.get_nowait()
+    assert queued.msg == "added a.com" and queued.args is None
+    assert record.args == ("a.com",)
+    assert handler.dropped == 1
+
+def test_json_formatter():
+    entry = json.loads(JsonFormatter().format(make_record()))
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "app.api.dns_routes"
+    assert entry["message"] == "added a.com"
@@ -0,0 +1,55 @@
+import pytest
+from datetime import datetime, timedelta
+from app.core.metrics import registry
+from app.models.record_db import DNSRecord, RecordType
+from app.services.ttl_cleanup import purge_expired_records
+from app.storage.redis import get_cached_resolution_entries, cache_resolution_entry
+
+HEADERS = {"X-API-Key": "supersecret"}
+
+def sample(name, **labels):
+    return registry.get_sample_value(name, labels) or 0
+
+@pytest.mark.asyncio
+async def test_request_latency_and_db_queries_per_route(client):
+    route = "/api/dns/{hostname}"
+    requests_before = sample("dns_http_request_duration_seconds_count", method="GET", route=route, status="200")
+    queries_before = sample("dns_db_queries_per_request_sum", route=route)
+
+    await client.post("/api/dns/", json={"type": "A", "hostname": "metrics.com", "value": ["10.0.0.1"], "ttl_seconds": 300}, headers=HEADERS)
+    response = await client.get("/api/dns/metrics.com", headers=HEADERS)
+    assert response.status_code == 200
+
+    assert sample("dns_http_request_duration_seconds_count", method="GET", route=route, status="200") == requests_before + 1
+    assert sample("dns_db_queries_per_request_sum", route=route) > queries_before
+    assert sample("dns_cname_chain_depth_count", status="ok") >= 1
+
+    body = (await client.get("/metrics")).text
+    assert 'route="/api/dns/{hostname}"' in body
+    assert "metrics.com" not in body
+
+@pytest.mark.asyncio
+async def test_redis_lookups_count_hits_and_misses():
+    hits = sample("dns_redis_lookups_total", operation="get_resolutions", result="hit")
+    misses = sample("dns_redis_lookups_total", operation="get_resolutions", result="miss")
+
+    await cache_resolution_entry("cached.com", {"result": {}, "expires_at": 0, "chain": ["cached.com"]}, 60)
+    assert (await get_cached_resolution_entries(["nothing.com", "cached.com"]))[1] is not None
+
+    assert sample("dns_redis_lookups_total", operation="get_resolutions", result="hit") == hits + 1
+    assert sample("dns_redis_lookups_total", operation="get_resolutions", result="miss") == misses + 1
+    assert sample("dns_redis_command_duration_seconds_count", operation="cache_resolution") >= 1
+
+@pytest.mark.asyncio
+async def test_purge_stats_are_exported(seeded_session):
+    session_factory = await seeded_session([
+        DNSRecord(hostname="stale.com", type=RecordType.TXT, value=["old"], ttl_seconds=60,
+                  timestamp_created=datetime.utcnow() - timedelta(hours=1)),
+    ])
+
+    runs = sample("dns_ttl_purge_runs_total")
+    deleted = sample("dns_ttl_purge_deleted_records_total")
+    await purge_expired_records(session_factory)
+
+    assert sample("dns_ttl_purge_runs_total") == runs + 1
+    assert sample("dns_ttl_purge_deleted_records_total") == deleted + 1
@@ -0,0 +1,120 @@
+import pytest
+import json
+from sqlalchemy import inspect, text
+from app.storage import migrations
+from app.storage.migrations import run_migrations
+from app.utils.hostname_utils import normalize_hostname
+
+LEGACY_SCHEMA = """
+CREATE TABLE dns_records (
+    hostname VARCHAR NOT NULL,
+    type VARCHAR(5) NOT NULL,
+    value JSON NOT NULL,
+    timestamp_created DATETIME,
+    ttl_seconds INTEGER,
+    id INTEGER PRIMARY KEY AUTOINCREMENT
+)
+"""
+
+@pytest.mark.asyncio
+async def test_migration_backfills_legacy_rows(sqlite_engine):
+    async with sqlite_engine.begin() as conn:
+        await conn.execute(text(LEGACY_SCHEMA))
+        await conn.execute(text(
+            "INSERT INTO dns_records (hostname, type, value, timestamp_created, ttl_seconds) VALUES "
+            "('WWW.Example.com.', 'A', '\"[\\\"1.2.3.4\\\", \\\"5.6.7.8\\\"]\"', '2024-01-01 00:00:00', 300), "
+            "('mail.example.com', 'TXT', '\"[\\\"spf\\\"]\"', '2024-01-01 00:00:00', NULL), "
+            "('alias.example.com', 'CNAME', '\"\\\"Target.Example.com.\\\"\"', '2024-01-01 00:00:00', 300), "
+            "('example.com', 'MX', '\"{\\\"priority\\\": 10, \\\"host\\\": \\\"mx.example.com\\\"}\"', "
+            "'2024-01-01 00:00:00', 300)"
+        ))
+
+    await run_migrations(sqlite_engine)
+    await run_migrations(sqlite_engine)  # second run is a no-op
+
+    async with sqlite_engine.connect() as conn:
+        rows = (await conn.execute(text(
+            "SELECT hostname_normalized, expires_at, value, cname_target, mx_priority, mx_host, address, reversed_name "
+            "FROM dns_records ORDER BY id"
+        ))).all()
+        indexes = await conn.run_sync(
+            lambda sync_conn: {i["name"] for i in inspect(sync_conn).get_indexes("dns_records")}
+        )
+        versions = (await conn.execute(text("SELECT version FROM schema_migrations"))).scalars().all()
+
+    assert rows[0][0] == "www.example.com"
+    assert str(rows[0][1]).startswith("2024-01-01 00:05:00")
+    assert rows[1][0] == "mail.example.com"
+    assert str(rows[1][1]).startswith("2024-01-01 01:00:00")
+    assert [json.loads(row[2]) for row in rows] == [
+        ["1.2.3.4"], ["spf"], "Target.Example.com.", {"priority": 10, "host": "mx.example.com"}, ["5.6.7.8"],
+    ]
+    assert rows[2][3] == "target.example.com"
+    assert rows[3][4:6] == (10, "mx.example.com")
+    assert [(row[0], row[6]) for row in rows if row[6]] == [
+        ("www.example.com", "1.2.3.4"), ("www.example.com", "5.6.7.8"),
+    ]
+    assert {
+        "ix_dns_records_hostname_type", "ix_dns_records_expires_at",
+        "ix_dns_records_cname_target", "uq_dns_records_address", "ix_dns_records_reversed_name",
+    } <= indexes
+    assert rows[0][7] == "com.example.www"
+    assert versions == [1, 2, 3, 4, 5]
+
+@pytest.mark.asyncio
+async def test_backfill_normalizes_like_the_orm(sqlite_engine):
+    async with sqlite_engine.begin() as conn:
+        await conn.execute(text(LEGACY_SCHEMA))
+        await conn.execute(
+            text(
+                "INSERT INTO dns_records (hostname, type, value, timestamp_created, ttl_seconds) "
+                "VALUES (:hostname, :type, :value, '2024-01-01 00:00:00', 300)"
+            ),
+            [
+                {"hostname": '"Foo.com"', "type": "A", "value": '["1.2.3.4"]'},
+                {"hostname": "Bücher.example.", "type": "CNAME", "value": '"\\"Bücher.Example\\""'},
+                {"hostname": "example.com", "type": "MX", "value": '{"priority": 5, "host": "Mail.Bücher.example."}'},
+            ],
+        )
+
+    await run_migrations(sqlite_engine)
+
+    async with sqlite_engine.connect() as conn:
+        rows = (await conn.execute(text(
+            "SELECT hostname_normalized, cname_target, mx_host, reversed_name FROM dns_records ORDER BY id"
+        ))).all()
+    assert [row[0] for row in rows] == [
+        normalize_hostname('"Foo.com"'), normalize_hostname("Bücher.example"), "example.com",
+    ] == ["foo.com", "xn--bcher-kva.example", "example.com"]
+    assert rows[1][1] == "xn--bcher-kva.example"
+    assert rows[2][2] == "mail.xn--bcher-kva.example"
+    assert rows[1][3] == "example.xn--bcher-kva"
+
+@pytest.mark.asyncio
+async def test_failed_migration_keeps_earlier_ones(sqlite_engine, monkeypatch):
+    async with sqlite_engine.begin() as conn:
+        await conn.execute(text(LEGACY_SCHEMA))
+        await conn.execute(text(
+            "INSERT INTO dns_records (hostname, type, value, timestamp_created, ttl_seconds) VALUES "
+            "('a.com', 'A', '[\"1.1.1.1\"]', '2024-01-01 00:00:00', 300), "
+            "('b.com', 'A', '[\"2.2.2.2\"]', '2024-01-01 00:00:00', 300)"
+        ))
+
+    def broken(conn):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(migrations, "BACKFILL_BATCH_SIZE", 1)
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS[:3] + [(4, "reversed_names", broken)])
+    with pytest.raises(RuntimeError):
+        await run_migrations(sqlite_engine)
+    async with sqlite_engine.connect() as conn:
+        versions = (await conn.execute(text("SELECT version FROM schema_migrations"))).scalars().all()
+    assert versions == [1, 2, 3]
+
+    monkeypatch.undo()
+    await run_migrations(sqlite_engine)
+    async with sqlite_engine.connect() as conn:
+        versions = (await conn.execute(text("SELECT version FROM schema_migrations"))).scalars().all()
+        names = (await conn.execute(text("SELECT reversed_name FROM dns_records ORDER BY id"))).scalars().all()
+    assert versions == [1, 2, 3, 4, 5]
+    assert names == ["com.a", "com.b"]
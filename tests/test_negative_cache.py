@@ -0,0 +1,64 @@
+import pytest
+import io
+import json
+import random
+import string
+from app.core.metrics import registry
+
+HEADERS = {"X-API-Key": "supersecret"}
+
+def random_zone(prefix):
+    return f"{prefix}-" + "".join(random.choices(string.ascii_lowercase + string.digits, k=6)) + ".com"
+
+def negative_hits():
+    return registry.get_sample_value("dns_resolution_cache_lookups_total", {"result": "negative_hit"}) or 0
+
+@pytest.mark.asyncio
+async def test_nxdomain_is_cached_until_the_name_is_created(client):
+    hostname = random_zone("negative")
+    before = negative_hits()
+
+    first = await client.get(f"/api/dns/{hostname}", headers=HEADERS)
+    second = await client.get(f"/api/dns/{hostname}", headers=HEADERS)
+    assert first.status_code == second.status_code == 404
+    assert second.json()["detail"] == "Record not found or expired"
+    assert negative_hits() == before + 1
+
+    await client.post("/api/dns/", json={
+        "hostname": hostname, "type": "A", "value": ["10.5.5.5"], "ttl_seconds": 300,
+    }, headers=HEADERS)
+    resolved = await client.get(f"/api/dns/{hostname}", headers=HEADERS)
+    assert resolved.json()["resolvedIps"] == ["10.5.5.5"]
+
+@pytest.mark.asyncio
+async def test_nodata_is_distinguished_from_nxdomain(client):
+    hostname = random_zone("nodata")
+    await client.post("/api/dns/", json={
+        "hostname": hostname, "type": "TXT", "value": ["hello"], "ttl_seconds": 300,
+    }, headers=HEADERS)
+
+    for _ in range(2):
+        response = await client.get(f"/api/dns/{hostname}", headers=HEADERS)
+        assert response.status_code == 404
+        assert response.json()["detail"] == "Hostname has no A/AAAA records"
+    batch = await client.post("/api/dns/resolve", json={"hostnames": [hostname, "missing-" + hostname]}, headers=HEADERS)
+    assert batch.json()["results"] == {hostname: {"status": "no_data"}, "missing-" + hostname: {"status": "not_found"}}
+
+@pytest.mark.asyncio
+async def test_cached_nxdomain_is_evicted_by_bulk_import_and_wildcards(client):
+    zone = random_zone("negzone")
+    for hostname in (f"bulk.{zone}", f"shop.{zone}"):
+        assert (await client.get(f"/api/dns/{hostname}", headers=HEADERS)).status_code == 404
+
+    body = json.dumps([{"hostname": f"bulk.{zone}", "type": "A", "value": ["10.6.6.6"], "ttl_seconds": 300}])
+    imported = await client.post(
+        "/api/dns/bulk/import", headers=HEADERS, files={"file": ("bulk.json", io.BytesIO(body.encode()), "application/json")},
+    )
+    assert imported.json()["records_imported"] == 1
+    assert (await client.get(f"/api/dns/bulk.{zone}", headers=HEADERS)).json()["resolvedIps"] == ["10.6.6.6"]
+
+    # shop.<zone> was cached as missing; a wildcard above it now answers for it
+    await client.post("/api/dns/", json={
+        "hostname": f"*.{zone}", "type": "A", "value": ["10.7.7.7"], "ttl_seconds": 300,
+    }, headers=HEADERS)
+    assert (await client.get(f"/api/dns/shop.{zone}", headers=HEADERS)).json()["resolvedIps"] == ["10.7.7.7"]
@@ -0,0 +1,33 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.storage.pool import InstrumentedQueuePool, pool_status
+
+HEADERS = {"X-API-Key": "supersecret"}
+
+@pytest.mark.asyncio
+async def test_instrumented_pool_reports_checkouts(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool, pool_size=2, max_overflow=1,
+    )
+    async with engine.connect() as first:
+        await first.execute(text("SELECT 1"))
+        async with engine.connect() as second:
+            await second.execute(text("SELECT 1"))
+            busy = pool_status(engine)
+
+    idle = pool_status(engine)
+    assert busy["checked_out"] == 2
+    assert busy["overflow"] == 0
+    assert idle["checked_out"] == 0
+    assert idle["checkouts"] == 2
+    assert idle["timeouts"] == 0
+    assert idle["wait_seconds_max"] >= idle["wait_seconds_avg"] >= 0
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_pool_health_endpoint(client):
+    response = await client.get("/health/pool", headers=HEADERS)
+    assert response.status_code == 200
+    assert "pool" in response.json()
@@ -0,0 +1,87 @@
+import pytest
+from types import SimpleNamespace
+from redis.exceptions import ConnectionError
+from app.auth.api_key import Caller, api_key_cache, hash_key
+from app.auth.rate_limiter import LocalBucketStore, Rate, RateLimiter, client_key, limiter, write_limit
+from app.core.config import settings
+
+HEADERS = {"X-API-Key": "supersecret"}
+
+class CountingStore(LocalBucketStore):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    async def take(self, key, rate, requested):
+        self.calls += 1
+        return await super().take(key, rate, requested)
+
+class FailingStore:
+    async def take(self, key, rate, requested):
+        raise ConnectionError("down")
+
+def test_rate_parsing():
+    rate = Rate("120/minute")
+    assert rate.capacity == 120 and rate.per_second == 2
+    assert Rate("5/seconds").per_second == 5
+
+@pytest.mark.asyncio
+async def test_bucket_rejects_past_capacity_with_retry_after():
+    limiter = RateLimiter(LocalBucketStore(), prebudget=0, lease_seconds=1)
+    rate = Rate("3/minute")
+    assert [await limiter.hit("a", rate) for _ in range(3)] == [None, None, None]
+    retry_after = await limiter.hit("a", rate)
+    assert 19 < retry_after <= 20
+    assert await limiter.hit("b", rate) is None
+
+@pytest.mark.asyncio
+async def test_prebudget_spends_leased_tokens_locally():
+    store = CountingStore()
+    limiter = RateLimiter(store, prebudget=0.1, lease_seconds=60)
+    rate = Rate("100/minute")
+    results = [await limiter.hit("a", rate) for _ in range(100)]
+
+    assert results == [None] * 100
+    assert await limiter.hit("a", rate) is not None
+    # 10 tokens per lease: one store call per 10 requests, plus the rejected one
+    assert store.calls == 11
+
+@pytest.mark.asyncio
+async def test_store_failure_falls_back_to_per_worker_buckets():
+    limiter = RateLimiter(FailingStore(), prebudget=0, lease_seconds=1)
+    rate = Rate("1/minute")
+    assert await limiter.hit("a", rate) is None
+    assert await limiter.hit("a", rate) is not None
+
+def test_client_key_behind_proxies(monkeypatch):
+    request = SimpleNamespace(
+        headers={"x-forwarded-for": "203.0.113.7, 10.0.0.2", "x-api-key": "secret"},
+        client=SimpleNamespace(host="10.0.0.1"),
+    )
+    assert client_key(request) == "ip:10.0.0.1"
+    monkeypatch.setattr(settings, "RATE_LIMIT_PROXY_HOPS", 2)
+    assert client_key(request) == "ip:203.0.113.7"
+    monkeypatch.setattr(settings, "RATE_LIMIT_KEY", "api_key")
+    # An unverified key is charged to the client address
+    assert client_key(request) == "ip:203.0.113.7"
+    api_key_cache.put(hash_key("secret"), Caller(42, "ci", ["read"]))
+    try:
+        assert client_key(request) == "key:42"
+    finally:
+        api_key_cache.clear()
+
+@pytest.mark.asyncio
+async def test_write_route_returns_429_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(limiter, "enabled", True)
+    monkeypatch.setattr(limiter, "store", LocalBucketStore())
+    monkeypatch.setattr(write_limit, "rate", Rate("1/minute"))
+
+    payload = {"hostname": "rate-limited.com", "type": "A", "value": ["10.3.3.3"], "ttl_seconds": 300}
+    first = await client.post("/api/dns/", json=payload, headers=HEADERS)
+    second = await client.post("/api/dns/", json=payload, headers=HEADERS)
+    read = await client.get("/api/dns/rate-limited.com", headers=HEADERS)
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert 0 < int(second.headers["retry-after"]) <= 60
+    assert read.status_code == 200
@@ -52,3 +52,18 @@ async def test_list_dns_records(client):
     print(f"TXT Record Response for {hostname_txt}:", data_txt)
     assert data_txt["hostname"] == hostname_txt
     assert any(r["type"] == "TXT" and "spf" in r["value"] for r in data_txt["records"])
+
+@pytest.mark.asyncio
+async def test_leftover_legacy_cache_keys_are_ignored(client):
+    import app.storage.redis as redis_storage
+    hostname = random_hostname("legacy-cache")
+    # A dns_cache: entry written before the resolution cache replaced it
+    await redis_storage.get_client().set(f"dns_cache:{hostname}", '["10.9.9.9"]')
+
+    added = await client.post("/api/dns/", json={
+        "hostname": hostname, "type": "A", "value": ["10.1.1.1"], "ttl_seconds": 300,
+    }, headers=HEADERS)
+    listed = await client.get(f"/api/dns/{hostname}/records", headers=HEADERS)
+
+    assert "cached" not in added.json()
+    assert listed.json()["records"] == [{"type": "A", "value": "10.1.1.1"}]
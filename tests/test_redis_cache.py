@@ -0,0 +1,100 @@
+import pytest
+import time
+import asyncio
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+import app.storage.redis as redis_storage
+from app.storage.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.storage.redis import (
+    cache_resolution_entries, cache_resolution_entry, decode_resolution, encode_resolution, get_cached_resolution_entries,
+)
+from app.storage.resolution_cache import get_cached_resolution, get_cached_resolutions, resolution_cache
+
+HEADERS = {"X-API-Key": "supersecret"}
+
+def test_resolution_codec_is_compact_and_versioned():
+    entry = {
+        "result": {"hostname": "a.com", "resolvedIps": ["1.2.3.4"], "recordType": "A/AAAA", "pointsTo": "a.com"},
+        "expires_at": 1700000000.1234,
+        "chain": ["a.com"],
+    }
+    raw = encode_resolution(entry)
+    assert " " not in raw
+    decoded = decode_resolution(raw)
+    assert decoded["result"] == entry["result"] and decoded["chain"] == ["a.com"]
+    assert decoded["expires_at"] == pytest.approx(1700000000.123)
+    # Entries from the previous dict format, or garbage, read as misses
+    assert decode_resolution('{"result": {}, "expires_at": 0, "chain": []}') is None
+    assert decode_resolution("1.2.3.4,5.6.7.8") is None
+
+@pytest.mark.asyncio
+async def test_batched_helpers_round_trip():
+    expires_at = time.time() + 60
+    await cache_resolution_entries([
+        (f"host{i}.com", {"result": {"i": i}, "expires_at": expires_at, "chain": [f"host{i}.com"]}, 60)
+        for i in range(3)
+    ])
+    entries = await get_cached_resolution_entries(["host0.com", "missing.com", "host2.com"])
+    assert [entry and entry["result"] for entry in entries] == [{"i": 0}, None, {"i": 2}]
+
+    resolution_cache.clear()
+    assert await get_cached_resolutions(["host1.com", "missing.com"]) == {"host1.com": {"i": 1}}
+    assert resolution_cache.get("host1.com") == {"i": 1}
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_share_one_mget(monkeypatch):
+    expires_at = time.time() + 60
+    for i in range(3):
+        await cache_resolution_entry(f"shared{i}.com", {"result": {"i": i}, "expires_at": expires_at, "chain": [f"shared{i}.com"]}, 60)
+    resolution_cache.clear()
+
+    calls = []
+    async def counting(hostnames):
+        calls.append(sorted(hostnames))
+        return await get_cached_resolution_entries(hostnames)
+    monkeypatch.setattr("app.storage.resolution_cache.get_cached_resolution_entries", counting)
+
+    names = ["shared0.com", "shared1.com", "shared1.com", "shared2.com", "missing.com"]
+    results = await asyncio.gather(*(get_cached_resolution(name) for name in names))
+
+    assert results == [{"i": 0}, {"i": 1}, {"i": 1}, {"i": 2}, None]
+    assert calls == [["missing.com", "shared0.com", "shared1.com", "shared2.com"]]
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_falls_back_to_database(client, monkeypatch):
+    breaker = CircuitBreaker("redis", failure_threshold=2, reset_timeout=60)
+    monkeypatch.setattr(redis_storage, "redis_breaker", breaker)
+    monkeypatch.setattr(redis_storage, "redis_client", redis.Redis(port=1, socket_connect_timeout=0.1))
+
+    for _ in range(2):
+        with pytest.raises(RedisError):
+            await get_cached_resolution_entries(["a.com"])
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        await get_cached_resolution_entries(["a.com"])
+
+    added = await client.post("/api/dns/", json={
+        "hostname": "breaker-open.com", "type": "A", "value": ["10.2.2.2"], "ttl_seconds": 300,
+    }, headers=HEADERS)
+    resolved = await client.get("/api/dns/breaker-open.com", headers=HEADERS)
+    assert added.status_code == 200
+    assert resolved.json()["resolvedIps"] == ["10.2.2.2"]
+
+def test_breaker_lets_one_trial_through_after_reset_timeout():
+    breaker = CircuitBreaker("redis", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.is_open
+    assert breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open and breaker.failures == 0
+
+def test_each_event_loop_gets_its_own_client(monkeypatch):
+    monkeypatch.setattr(redis_storage, "redis_client", None)
+
+    async def clients():
+        return redis_storage.get_client(), redis_storage.get_client()
+
+    first, same = asyncio.run(clients())
+    second, _ = asyncio.run(clients())
+    assert first is same
+    assert second is not first
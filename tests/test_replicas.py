@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.storage.replicas import ReplicaSet
+
+@pytest.fixture
+async def engines(tmp_path):
+    primary = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+    replicas = [create_async_engine(f"sqlite+aiosqlite:///{tmp_path / f'replica{i}.db'}") for i in range(2)]
+    broken = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    yield primary, replicas, broken
+    for engine in [primary, broken, *replicas]:
+        await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_round_robin_over_healthy_replicas(engines):
+    primary, replicas, broken = engines
+    replica_set = ReplicaSet(primary, [*replicas, broken])
+
+    await replica_set.check()
+
+    assert replica_set.healthy == replicas
+    assert [replica_set.choose() for _ in range(4)] == [replicas[0], replicas[1], replicas[0], replicas[1]]
+
+@pytest.mark.asyncio
+async def test_falls_back_to_primary(engines):
+    primary, replicas, broken = engines
+    replica_set = ReplicaSet(primary, [broken])
+    assert replica_set.choose() is broken
+
+    # A failing connection takes the replica out of rotation before the next check
+    with pytest.raises(Exception):
+        async with broken.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    assert replica_set.choose() is primary
+    await replica_set.check()
+    assert replica_set.choose() is primary
+
+def test_no_replicas_uses_primary(engines):
+    primary, _, _ = engines
+    assert ReplicaSet(primary).choose() is primary
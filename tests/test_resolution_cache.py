@@ -0,0 +1,128 @@
+import pytest
+import asyncio
+import time
+import random
+import string
+from app.storage.resolution_cache import ResolutionCache
+
+HEADERS = {"X-API-Key": "supersecret"}
+
+def random_hostname(prefix):
+    suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
+    return f"{prefix}-{suffix}.com"
+
+def test_cache_evicts_least_recently_used():
+    cache = ResolutionCache(max_entries=2)
+    expires_at = time.time() + 60
+    cache.put("a.com", {"ip": 1}, expires_at, ["a.com"])
+    cache.put("b.com", {"ip": 2}, expires_at, ["b.com"])
+    assert cache.get("a.com") == {"ip": 1}
+
+    cache.put("c.com", {"ip": 3}, expires_at, ["c.com"])
+    assert cache.get("b.com") is None
+    assert cache.get("a.com") == {"ip": 1}
+    assert len(cache) == 2
+
+def test_cache_entry_expires_with_chain():
+    cache = ResolutionCache(max_entries=10)
+    cache.put("a.com", {"ip": 1}, time.time() - 1, ["a.com"])
+    assert cache.get("a.com") is None
+    assert len(cache) == 0
+
+def test_invalidation_evicts_every_chain_through_name():
+    cache = ResolutionCache(max_entries=10)
+    expires_at = time.time() + 60
+    cache.put("alias2.com", {"ip": 1}, expires_at, ["alias2.com", "alias1.com", "target.com"])
+    cache.put("alias1.com", {"ip": 1}, expires_at, ["alias1.com", "target.com"])
+    cache.put("other.com", {"ip": 2}, expires_at, ["other.com"])
+    generation = cache.generation
+
+    evicted = cache.invalidate({"target.com"})
+
+    assert evicted == {"alias1.com", "alias2.com"}
+    assert cache.get("alias2.com") is None
+    assert cache.get("other.com") == {"ip": 2}
+    assert cache.generation == generation + 1
+
+@pytest.mark.asyncio
+async def test_resolve_is_invalidated_by_write_to_chain_target(client):
+    target = random_hostname("cached-target")
+    alias = random_hostname("cached-alias")
+
+    r1 = await client.post("/api/dns/", json={
+        "hostname": target,
+        "type": "A",
+        "value": ["10.1.1.1"],
+        "ttl_seconds": 300
+    }, headers=HEADERS)
+    assert r1.status_code == 200
+    r2 = await client.post("/api/dns/", json={
+        "hostname": alias,
+        "type": "CNAME",
+        "value": target,
+        "ttl_seconds": 300
+    }, headers=HEADERS)
+    assert r2.status_code == 200
+    await asyncio.sleep(0.05)
+
+    first = await client.get(f"/api/dns/{alias}", headers=HEADERS)
+    assert first.json()["resolvedIps"] == ["10.1.1.1"]
+
+    delete = await client.delete(f"/api/dns/{target}?type=A&value=10.1.1.1", headers=HEADERS)
+    assert delete.status_code == 200
+
+    second = await client.get(f"/api/dns/{alias}", headers=HEADERS)
+    assert second.status_code == 404
+
+@pytest.mark.asyncio
+async def test_replica_reads_are_not_cached_right_after_an_invalidation(monkeypatch, sqlite_engine):
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.core.config import settings
+    from app.storage import resolution_cache as module
+
+    replica = sqlite_engine
+    monkeypatch.setattr(module.read_replicas, "replicas", [replica])
+    monkeypatch.setattr(settings, "REPLICA_MAX_LAG", 0.05)
+    monkeypatch.setattr(settings, "RESOLUTION_CACHE_REDIS", False)
+    hostname = random_hostname("lagging")
+    async with AsyncSession(replica) as from_replica, AsyncSession(module.read_replicas.primary) as from_primary:
+        await module.invalidate_resolutions([hostname])
+        assert module.fill_generation(from_replica) is None
+        assert module.fill_generation(from_primary) == module.resolution_cache.generation
+
+        # Cached from the replica before this worker heard of the write...
+        module.resolution_cache.put(hostname, {"ip": "old"}, time.time() + 60, [hostname])
+        await asyncio.sleep(0.1)
+        # ...and evicted again once the replicas have caught up
+        assert module.resolution_cache.get(hostname) is None
+        assert module.fill_generation(from_replica) == module.resolution_cache.generation
+
+@pytest.mark.asyncio
+async def test_failed_redis_invalidation_is_retried(monkeypatch):
+    from redis.exceptions import RedisError
+    from app.core.config import settings
+    from app.storage import resolution_cache as module
+
+    monkeypatch.setattr(settings, "INVALIDATION_RETRY_INTERVAL", 0.02)
+    hostname = random_hostname("breaker")
+    await module.cache_resolution(hostname, {"ip": "old"}, time.time() + 60, [hostname], module.resolution_cache.generation)
+
+    delete_chains = module.invalidate_resolution_chains
+    calls = []
+    async def flaky(names):
+        calls.append(names)
+        if len(calls) < 3:
+            raise RedisError("circuit open")
+        await delete_chains(names)
+    monkeypatch.setattr(module, "invalidate_resolution_chains", flaky)
+
+    await module.invalidate_resolutions([hostname])
+    # The entry is still in Redis, but this worker won't take it as fresh meanwhile
+    assert await module.get_cached_resolution(hostname) is None
+    for _ in range(100):
+        if not module._redis_pending:
+            break
+        await asyncio.sleep(0.01)
+
+    assert len(calls) == 3 and hostname in calls[-1]
+    assert await module.get_cached_resolution_entries([hostname]) == [None]
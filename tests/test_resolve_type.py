@@ -0,0 +1,74 @@
+import pytest
+import random
+import string
+from datetime import datetime, timedelta
+from app.models.record_db import DNSRecord, RecordType
+from app.services.cname_chain import fetch_chain_records
+from app.services.resolver import NO_DATA, RESOLVED, resolve_records
+
+HEADERS = {"X-API-Key": "supersecret"}
+
+def random_zone(prefix):
+    return f"{prefix}-" + "".join(random.choices(string.ascii_lowercase + string.digits, k=6)) + ".com"
+
+@pytest.fixture
+async def session_factory(seeded_session):
+    return await seeded_session([
+        ("alias.com", RecordType.CNAME, "target.com"),
+        ("target.com", RecordType.A, ["1.2.3.4"]),
+        ("target.com", RecordType.MX, {"priority": 10, "host": "mail.target.com"}),
+        ("target.com", RecordType.TXT, ["v=spf1 -all"]),
+        DNSRecord(hostname="stale.com", type=RecordType.A, value=["9.9.9.9"], ttl_seconds=60,
+                  timestamp_created=datetime.utcnow() - timedelta(hours=1)),
+        ("stale.com", RecordType.TXT, ["still here"]),
+    ])
+
+@pytest.mark.asyncio
+async def test_type_filter_is_pushed_into_the_query(session_factory):
+    async with session_factory() as db:
+        records = await fetch_chain_records("alias.com", db, types=[RecordType.MX])
+    assert {name: [r.type for r in rs] for name, rs in records.items()} == {
+        "alias.com": [RecordType.CNAME],
+        "target.com": [RecordType.MX],
+    }
+
+@pytest.mark.asyncio
+async def test_nodata_when_only_other_types_exist(session_factory):
+    async with session_factory() as db:
+        status, answers = await resolve_records("alias.com", RecordType.AAAA, db)
+        stale, _ = await resolve_records("stale.com", RecordType.A, db)
+        found, mx = await resolve_records("alias.com", RecordType.MX, db)
+    assert status == NO_DATA and [r.type for _, r in answers] == [RecordType.CNAME]
+    # Its A record expired, but the name still has a live TXT record
+    assert stale == NO_DATA
+    assert found == RESOLVED and [(owner, r.type) for owner, r in mx] == [
+        ("alias.com", RecordType.CNAME), ("target.com", RecordType.MX),
+    ]
+
+@pytest.mark.asyncio
+async def test_resolve_with_type_query(client):
+    target = random_zone("typed-target")
+    alias = random_zone("typed-alias")
+    for record in [
+        {"hostname": target, "type": "TXT", "value": ["hello"]},
+        {"hostname": alias, "type": "CNAME", "value": target},
+    ]:
+        assert (await client.post("/api/dns/", json={**record, "ttl_seconds": 300}, headers=HEADERS)).status_code == 200
+
+    txt = await client.get(f"/api/dns/{alias}?type=TXT", headers=HEADERS)
+    cname = await client.get(f"/api/dns/{alias}?type=CNAME", headers=HEADERS)
+    mx = await client.get(f"/api/dns/{alias}?type=MX", headers=HEADERS)
+    assert txt.json() == {"hostname": alias, "type": "TXT", "values": [["hello"]], "pointsTo": target}
+    assert cname.json()["values"] == [target]
+    assert mx.status_code == 404 and mx.json()["detail"] == "Hostname has no MX records"
+    assert (await client.get(f"/api/dns/{alias}?type=SRV", headers=HEADERS)).status_code == 422
+
+    # A cached miss through the chain is evicted once the target is created
+    mail_alias, mail_target = random_zone("typed-mail-alias"), random_zone("typed-mail")
+    await client.post("/api/dns/", json={"hostname": mail_alias, "type": "CNAME", "value": mail_target}, headers=HEADERS)
+    assert (await client.get(f"/api/dns/{mail_alias}?type=MX", headers=HEADERS)).status_code == 404
+    await client.post("/api/dns/", json={
+        "hostname": mail_target, "type": "MX", "value": {"priority": 5, "host": f"mx.{mail_target}"}, "ttl_seconds": 300,
+    }, headers=HEADERS)
+    mx = await client.get(f"/api/dns/{mail_alias}?type=MX", headers=HEADERS)
+    assert mx.json()["values"] == [{"priority": 5, "host": f"mx.{mail_target}"}]
@@ -67,3 +67,38 @@ async def test_dns_resolver_with_cname_chain(client):
     assert data["pointsTo"] == direct_a
     assert data["resolvedIps"] == ["9.9.9.9"]
     assert data["recordType"] == "CNAME"
+
+@pytest.mark.asyncio
+async def test_batch_resolve(client):
+    direct_a = random_hostname("batch-direct")
+    alias = random_hostname("batch-alias")
+    missing = random_hostname("batch-missing")
+
+    r1 = await client.post("/api/dns/", json={
+        "hostname": direct_a,
+        "type": "A",
+        "value": ["8.8.4.4"],
+        "ttl_seconds": 300
+    }, headers=HEADERS)
+    assert r1.status_code == 200
+    r2 = await client.post("/api/dns/", json={
+        "hostname": alias,
+        "type": "CNAME",
+        "value": direct_a,
+        "ttl_seconds": 300
+    }, headers=HEADERS)
+    assert r2.status_code == 200
+
+    await asyncio.sleep(0.05)
+
+    response = await client.post("/api/dns/resolve", json={
+        "hostnames": [alias, direct_a.upper(), missing]
+    }, headers=HEADERS)
+    assert response.status_code == 200
+    results = response.json()["results"]
+
+    assert results[alias]["status"] == "ok"
+    assert results[alias]["resolvedIps"] == ["8.8.4.4"]
+    assert results[alias]["pointsTo"] == direct_a
+    assert results[direct_a]["recordType"] == "A/AAAA"
+    assert results[missing] == {"status": "not_found"}
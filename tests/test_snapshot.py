@@ -0,0 +1,113 @@
+import pytest
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import delete
+from app.core.config import settings
+from app.models.record_db import DNSRecord, RecordType
+from app.storage.db import AsyncSessionLocal
+from app.storage.snapshot import (
+    LocalChangeFeed, RedisChangeFeed, ZoneSnapshot, follow_changes, zone_snapshot,
+)
+
+HEADERS = {"X-API-Key": "supersecret"}
+
+@pytest.fixture
+async def session_factory(seeded_session):
+    return await seeded_session([
+        ("WWW.Example.com", RecordType.CNAME, "example.com"),
+        ("example.com", RecordType.A, ["1.2.3.4"]),
+        ("example.com", RecordType.MX, {"priority": 10, "host": "mail.example.com"}),
+        ("*.example.com", RecordType.A, ["5.6.7.8"]),
+        ("host.sub.example.com", RecordType.TXT, ["x"]),
+        DNSRecord(hostname="old.example.com", type=RecordType.A, value=["9.9.9.9"],
+                  ttl_seconds=60, timestamp_created=datetime.utcnow() - timedelta(hours=1)),
+    ])
+
+@pytest.mark.asyncio
+async def test_load_keeps_unexpired_records_by_hostname(session_factory):
+    snapshot = ZoneSnapshot()
+    await snapshot.load(session_factory)
+
+    assert snapshot.ready
+    assert len(snapshot) == 5
+    assert snapshot.records("old.example.com") == []
+    assert [r.value for r in snapshot.records("example.com")] == [["1.2.3.4"], {"priority": 10, "host": "mail.example.com"}]
+    assert snapshot.records("www.example.com")[0].hostname == "WWW.Example.com"
+    assert list(snapshot.chain_records("www.example.com")) == ["www.example.com", "example.com"]
+    assert [r.address for r in snapshot.wildcard_records("a.example.com")] == ["5.6.7.8"]
+    assert snapshot.wildcard_records("a.sub.example.com") == []
+
+    stats = snapshot.stats()
+    assert stats["hostnames"] == 4
+    assert stats["approx_bytes"] > 0 and stats["bytes_per_million_records"] > 0
+
+@pytest.mark.asyncio
+async def test_change_feed_refreshes_changed_names(session_factory):
+    snapshot = ZoneSnapshot()
+    feed = LocalChangeFeed()
+    task = asyncio.create_task(follow_changes(snapshot, feed, session_factory))
+    try:
+        while not snapshot.ready:
+            await asyncio.sleep(0.01)
+
+        async with session_factory() as db:
+            await db.execute(delete(DNSRecord).where(DNSRecord.hostname_normalized == "host.sub.example.com"))
+            db.add(DNSRecord(hostname="new.example.com", type=RecordType.A, value=["7.7.7.7"], ttl_seconds=300))
+            await db.commit()
+        await feed.publish(["host.sub.example.com", "new.example.com"])
+        while snapshot.changes_applied < 2:
+            await asyncio.sleep(0.01)
+
+        assert snapshot.records("host.sub.example.com") == []
+        assert [r.address for r in snapshot.records("new.example.com")] == ["7.7.7.7"]
+        # Nothing is left under sub.example.com, so the wildcard covers it again
+        assert [r.address for r in snapshot.wildcard_records("a.sub.example.com")] == ["5.6.7.8"]
+    finally:
+        task.cancel()
+
+@pytest.mark.asyncio
+async def test_redis_change_feed_round_trip():
+    feed = RedisChangeFeed("test_changes", maxlen=100, block_ms=10)
+    position = await feed.position()
+    await feed.publish(["a.com", "b.com"])
+    await feed.publish(["c.com"])
+
+    position, batches = await feed.read(position)
+    assert batches == [["a.com", "b.com"], ["c.com"]]
+    assert (await feed.read(position))[1] == []
+
+@pytest.mark.asyncio
+async def test_routes_serve_from_snapshot(client, monkeypatch):
+    monkeypatch.setattr(settings, "SERVING_MODE", "snapshot")
+    await zone_snapshot.load(AsyncSessionLocal)
+    try:
+        added = await client.post("/api/dns/", json={
+            "hostname": "snapshot-served.com", "type": "A", "value": ["10.1.1.1"], "ttl_seconds": 300,
+        }, headers=HEADERS)
+        assert added.status_code == 200
+
+        # The writing worker refreshes its own snapshot before answering
+        resolved = await client.get("/api/dns/snapshot-served.com", headers=HEADERS)
+        listed = await client.get("/api/dns/snapshot-served.com/records", headers=HEADERS)
+        status = await client.get("/health/snapshot", headers=HEADERS)
+
+        assert resolved.json()["resolvedIps"] == ["10.1.1.1"]
+        assert listed.json()["records"] == [{"type": "A", "value": "10.1.1.1"}]
+        assert status.json()["ready"] is True
+    finally:
+        zone_snapshot.reset()
+
+def test_refresh_lock_is_per_event_loop():
+    snapshot = ZoneSnapshot()
+
+    async def contend():
+        lock = snapshot._refresh_locks.get()
+        async with lock:
+            waiter = asyncio.create_task(lock.acquire())
+            await asyncio.sleep(0)
+        await waiter
+        lock.release()
+
+    # A lock shared across loops raises "bound to a different event loop" the second time
+    asyncio.run(contend())
+    asyncio.run(contend())
@@ -0,0 +1,25 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app.models.record_db import DNSRecord, RecordType
+from app.services.ttl_cleanup import purge_expired_records
+
+@pytest.mark.asyncio
+async def test_purge_removes_only_expired_rows_in_batches(seeded_session):
+    old = datetime.utcnow() - timedelta(hours=2)
+    session_factory = await seeded_session([
+        *(DNSRecord(hostname=f"old{i}.com", type=RecordType.A, value=["1.1.1.1"], ttl_seconds=60, timestamp_created=old)
+          for i in range(5)),
+        # Expired and live records sharing a hostname: only the expired one goes
+        DNSRecord(hostname="shared.com", type=RecordType.TXT, value=["old"], ttl_seconds=60, timestamp_created=old),
+        DNSRecord(hostname="shared.com", type=RecordType.A, value=["2.2.2.2"], ttl_seconds=3600),
+    ])
+
+    stats = await purge_expired_records(session_factory, batch_size=2)
+
+    assert stats.deleted == 6
+    assert stats.batches == 3
+    assert stats.hostnames == {f"old{i}.com" for i in range(5)} | {"shared.com"}
+    async with session_factory() as db:
+        remaining = (await db.execute(select(DNSRecord))).scalars().all()
+    assert [(r.hostname, r.type) for r in remaining] == [("shared.com", RecordType.A)]
@@ -0,0 +1,97 @@
+import pytest
+import random
+import string
+from sqlalchemy import event
+from app.models.record_db import RecordType
+from app.services.cname_chain import fetch_wildcard_records
+from app.services.resolver import resolve_hostnames, resolve_records, RESOLVED, NOT_FOUND
+
+HEADERS = {"X-API-Key": "supersecret"}
+
+@pytest.fixture
+async def session_factory(seeded_session):
+    return await seeded_session([
+        ("*.example.com", RecordType.A, ["1.1.1.1"]),
+        ("*.sub.example.com", RecordType.A, ["2.2.2.2"]),
+        ("www.example.com", RecordType.A, ["3.3.3.3"]),
+        # Gives empty.example.com a descendant, so it exists without records of its own
+        ("host.empty.example.com", RecordType.TXT, ["x"]),
+        ("*.alias.com", RecordType.CNAME, "www.example.com"),
+    ])
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("hostname, addresses", [
+    ("a.example.com", ["1.1.1.1"]),
+    ("a.b.example.com", ["1.1.1.1"]),
+    ("a.sub.example.com", ["2.2.2.2"]),
+    # These names exist themselves, or their closest encloser is a name below example.com
+    ("sub.example.com", []),
+    ("a.empty.example.com", []),
+    ("empty.example.com", []),
+    ("a.www.example.com", []),
+    ("example.com", []),
+    ("a.other.com", []),
+])
+async def test_closest_encloser_wildcard(session_factory, hostname, addresses):
+    async with session_factory() as db:
+        records = await fetch_wildcard_records(hostname, db)
+    assert [r.address for r in records] == addresses
+
+@pytest.mark.asyncio
+async def test_wildcard_answers_are_owned_by_the_query_name(session_factory):
+    async with session_factory() as db:
+        status, answers = await resolve_records("mail.alias.com", RecordType.A, db)
+        missing, _ = await resolve_records("x.empty.example.com", RecordType.A, db)
+
+    assert status == RESOLVED
+    assert [(owner, r.type) for owner, r in answers] == [
+        ("mail.alias.com", RecordType.CNAME), ("www.example.com", RecordType.A),
+    ]
+    assert missing == NOT_FOUND
+
+@pytest.mark.asyncio
+async def test_batch_resolve_finds_wildcards_per_level_not_per_name(session_factory):
+    statements = []
+    engine = session_factory.kw["bind"].sync_engine
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    suffix = "".join(random.choices(string.ascii_lowercase, k=6))
+    try:
+        names = [
+            f"a-{suffix}.example.com", f"b-{suffix}.x.example.com", f"c-{suffix}.sub.example.com",
+            f"d-{suffix}.empty.example.com", f"mail-{suffix}.alias.com", f"e-{suffix}.other.com",
+        ]
+        async with session_factory() as db:
+            results = await resolve_hostnames(names, db)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert [results[name].get("resolvedIps") for name in names] == [
+        ["1.1.1.1"], ["1.1.1.1"], ["2.2.2.2"], None, ["3.3.3.3"], None,
+    ]
+    # Level one: records plus candidate wildcards, then occupancy; level two: the CNAME target
+    assert len(statements) == 3
+
+@pytest.mark.asyncio
+async def test_resolve_through_wildcard_and_exact_override(client):
+    zone = "wild-" + "".join(random.choices(string.ascii_lowercase, k=6)) + ".com"
+    response = await client.post("/api/dns/", json={
+        "hostname": f"*.{zone}", "type": "A", "value": ["9.9.9.9"], "ttl_seconds": 300,
+    }, headers=HEADERS)
+    assert response.status_code == 200
+
+    resolved = await client.get(f"/api/dns/shop.{zone}", headers=HEADERS)
+    assert resolved.status_code == 200
+    assert resolved.json()["resolvedIps"] == ["9.9.9.9"]
+
+    # An exact record added later replaces the cached wildcard answer
+    await client.post("/api/dns/", json={
+        "hostname": f"shop.{zone}", "type": "A", "value": ["8.8.8.8"], "ttl_seconds": 300,
+    }, headers=HEADERS)
+    resolved = await client.get(f"/api/dns/shop.{zone}", headers=HEADERS)
+    assert resolved.json()["resolvedIps"] == ["8.8.8.8"]
+
+    invalid = await client.post("/api/dns/", json={
+        "hostname": f"a.*.{zone}", "type": "A", "value": ["9.9.9.9"],
+    }, headers=HEADERS)
+    assert invalid.status_code == 400